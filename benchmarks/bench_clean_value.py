@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# Benchmark for wiktionary.clean_value() against a regular expression based
+# baseline that applies clean_arg3_re, clean_arg2_re, clean_arg1_re and
+# clean_replace_map as separate passes.  The values cleaned are the gloss
+# lines ("# ...") of the pages in the test dump.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import re
+import sys
+import bz2
+import html
+import time
+import argparse
+from wiktextract import wiktionary
+from wiktextract.wiktionary import (clean_arg1_re, clean_arg2_re,
+                                    clean_arg3_re, clean_replace_map,
+                                    arg_re, args_end_re)
+
+# Compiled patterns for clean_replace_map, one per entry.  The first argument
+# is group 2 of arg_re.
+replace_res = [(re.compile(r"(?s)\{\{" + re.escape(k) + arg_re + args_end_re),
+                v.replace("\\1", r"\2"))
+               if "\\1" in v else
+               (re.compile(r"(?s)\{\{" + re.escape(k) + args_end_re), v)
+               for k, v in clean_replace_map.items()]
+
+
+def clean_value_re(title):
+    """Regular expression baseline for clean_value()."""
+    title = re.sub(r"(?s)<!--.*?-->", "", title)
+    title = re.sub(r"(?si)<ref\b[^>]*/>", "", title)
+    title = re.sub(r"(?si)<ref\b[^>]*>.*?</ref\s*>", "", title)
+    title = re.sub(r"(?si)<br\s*/?>\n*", ", ", title)
+    title = re.sub(r"(?si)</?[a-z][^>]*>", "", title)
+    title = clean_arg3_re.sub(r"\9", title)
+    title = clean_arg2_re.sub(r"\6", title)
+    title = clean_arg1_re.sub(r"\3", title)
+    for r, v in replace_res:
+        title = r.sub(v, title)
+    while True:
+        t = re.sub(r"(?s)\{\{[^{}]*\}\}", "", title)
+        if t == title:
+            break
+        title = t
+    title = re.sub(r"(?si)\[\[(category|file|image):[^]]*\]\]", "", title)
+    title = re.sub(r"(?s)\[\[[^]|]*?\|([^]]*)\]\]", r"\1", title)
+    title = re.sub(r"(?s)\[\[([^]]*)\]\]", r"\1", title)
+    title = re.sub(r"(?s)\[(https?:|mailto:)?//[^]\s]+\s*([^]]*)\]", r"\2",
+                   title)
+    title = re.sub(r"''+", r"", title)
+    title = html.unescape(title)
+    title = title.replace("\u2019", "'")
+    title = re.sub(r"\s+", " ", title)
+    title = re.sub(r" ([.,;:!?)])", r"\1", title)
+    return title.strip()
+
+
+def read_values(path, limit):
+    """Returns gloss lines from the pages in the dump file ``path``."""
+    with bz2.open(path, "rt", encoding="utf-8") as f:
+        data = f.read()
+    values = [html.unescape(x) for x in re.findall(r"(?m)^#+ *([^:*].*)$",
+                                                    data)]
+    return values[:limit]
+
+
+def bench(fn, values, repeat):
+    """Returns the best time (seconds) for calling ``fn`` on all values."""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for v in values:
+            fn(v)
+        t = time.perf_counter() - start
+        if best is None or t < best:
+            best = t
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark clean_value() against a regexp baseline")
+    parser.add_argument("path", type=str, nargs="?",
+                        default=("wiktextract/tests/"
+                                 "test-pages-articles.xml.bz2"),
+                        help="Dump file from which to take values")
+    parser.add_argument("--limit", type=int, default=20000,
+                        help="Maximum number of values to clean")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timing runs (best is reported)")
+    args = parser.parse_args()
+
+    values = read_values(args.path, args.limit)
+    if not values:
+        print("No values found in", args.path)
+        sys.exit(1)
+    chars = sum(len(x) for x in values)
+    same = sum(wiktionary.clean_value(v) == clean_value_re(v)
+               for v in values)
+    print("{} values, {} characters, {:.1f}% identical results".format(
+        len(values), chars, 100.0 * same / len(values)))
+    t_re = bench(clean_value_re, values, args.repeat)
+    t_new = bench(wiktionary.clean_value, values, args.repeat)
+    for name, t in (("regexp baseline", t_re), ("clean_value", t_new)):
+        print("{:<16s} {:8.3f} s {:8.2f} us/value {:8.2f} MB/s".format(
+            name, t, 1e6 * t / len(values), chars / t / 1e6))
+    print("speedup {:.1f}x".format(t_re / t_new))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# Benchmark for compressed JSON lines output.  The records extracted from
+# the test dump are written (``--repeat`` times) through
+# CompressedJSONLSink with different numbers of compression threads, and
+# for comparison through a single gzip stream (gzip.GzipFile), which
+# compresses in the writing thread.  Throughput is reported in MB of
+# uncompressed output per second.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import gzip
+import time
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from wiktextract import serializer
+from wiktextract import sinks
+
+
+def write_sink(sink, records, repeat):
+    """Writes ``records`` ``repeat`` times through ``sink``.  Returns the
+    number of seconds used."""
+    start = time.perf_counter()
+    sink.open()
+    for i in range(repeat):
+        for j in range(0, len(records), sink.batch_size):
+            sink.write_batch(records[j:j + sink.batch_size])
+    sink.close()
+    return time.perf_counter() - start
+
+
+def write_gzip_stream(path, records, repeat):
+    """Writes ``records`` ``repeat`` times to a single gzip stream.
+    Returns the number of seconds used."""
+    start = time.perf_counter()
+    with gzip.GzipFile(path, "wb", compresslevel=6) as f:
+        for i in range(repeat):
+            for j in range(0, len(records), 1000):
+                f.write(serializer.dumps_batch(records[j:j + 1000]))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for block-compressed JSON lines output")
+    parser.add_argument("--path", type=str,
+                        default="wiktextract/tests/"
+                        "test-pages-articles.xml.bz2",
+                        help="Dump file from which to extract the records")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of times to write the records")
+    args = parser.parse_args()
+
+    records = []
+    wiktionary.parse_wiktionary(args.path, records.append,
+                                languages=["English", "Finnish",
+                                           "Translingual"],
+                                translations=True, pronunciations=True,
+                                linkages=True, compounds=True,
+                                redirects=True, glosses=True,
+                                conjugations=True)
+    size = len(serializer.dumps_batch(records)) * args.repeat
+    cpus = os.cpu_count() or 1
+    print("{} records, {:.1f} MB uncompressed, {} CPUs".format(
+        len(records), size / 1e6, cpus))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "stream.json.gz")
+        t = write_gzip_stream(path, records, args.repeat)
+        print("{:<6s} {:>11s} {:8.2f} s {:8.1f} MB/s {:8.1f} MB".format(
+            "gzip", "stream", t, size / 1e6 / t,
+            os.path.getsize(path) / 1e6))
+        methods = ["gzip", "xz"]
+        if sinks.zstandard is not None:
+            methods.append("zstd")
+        for method in methods:
+            for threads in sorted(set([1, 2, cpus])):
+                path = os.path.join(tmpdir, "out.json." + method)
+                sink = sinks.CompressedJSONLSink(path, method,
+                                                 threads=threads)
+                t = write_sink(sink, records, args.repeat)
+                print("{:<6s} {:>2d} threads {:8.2f} s {:8.1f} MB/s "
+                      "{:8.1f} MB".format(method, threads, t,
+                                          size / 1e6 / t,
+                                          os.path.getsize(path) / 1e6))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+#
+# Benchmark for the binary relation graph export.  Thesaurus records are
+# parsed from synthetic pages once and exported with GraphSink.  The graph
+# is then loaded with wiktextract.graph.Graph (which memory-maps the
+# files), and compared with loading the same records from JSON lines.
+# Lookup latency is measured for finding the targets of random words.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from wiktextract import serializer
+from wiktextract import sinks
+from wiktextract import graph
+from benchmarks.bench_records import make_page
+
+
+def dir_size(path):
+    """Returns the total size of the files in directory ``path``."""
+    return sum(os.path.getsize(os.path.join(path, x))
+               for x in os.listdir(path))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the CSR relation graph export")
+    parser.add_argument("--pages", type=int, default=50000,
+                        help="Number of synthetic Thesaurus pages")
+    parser.add_argument("--queries", type=int, default=10000,
+                        help="Number of lookups")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(50000)]
+    records = wiktionary.parse_text_many(
+        ("Thesaurus:{}".format(vocab[i % len(vocab)]), make_page(rnd, vocab))
+        for i in range(args.pages))
+    print("{} Thesaurus records".format(len(records)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "graph")
+        sink = sinks.GraphSink(path)
+        start = time.perf_counter()
+        sink.open()
+        for i in range(0, len(records), sink.batch_size):
+            sink.write_batch(records[i:i + sink.batch_size])
+        sink.close()
+        t = time.perf_counter() - start
+        print("export         {:8.2f} s {:8.1f} MB".format(
+            t, dir_size(path) / 1e6))
+
+        start = time.perf_counter()
+        g = graph.Graph(path)
+        t = time.perf_counter() - start
+        edges = sum(len(x[1]) for x in g.relations.values())
+        print("graph load     {:8.2f} ms {:8d} words {:8d} edges".format(
+            t * 1e3, len(g), edges))
+
+        jsonl_path = os.path.join(tmpdir, "records.json")
+        with open(jsonl_path, "wb") as f:
+            f.write(serializer.dumps_batch(records))
+        start = time.perf_counter()
+        with open(jsonl_path, "rb") as f:
+            loaded = [json.loads(line) for line in f]
+        t = time.perf_counter() - start
+        print("JSONL load     {:8.2f} ms {:8.1f} MB".format(
+            t * 1e3, os.path.getsize(jsonl_path) / 1e6))
+        del loaded
+
+        words = [rnd.choice(vocab) for i in range(args.queries)]
+        rows = 0
+        start = time.perf_counter()
+        for word in words:
+            rows += len(g.targets("Synonyms", word))
+        t = time.perf_counter() - start
+        print("lookup         {:8.1f} us/query {:8.1f} targets/query".format(
+            t / len(words) * 1e6, rows / len(words)))
+        g.close()
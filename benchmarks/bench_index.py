@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+# Benchmark for random access to JSON lines output through the sidecar
+# index.  Thesaurus records are parsed from synthetic pages once and
+# written with JSONLFileSink with an index.  The file is then opened with
+# IndexedJSONL (which memory-maps the file and the index), and the latency
+# of looking up random words is compared with finding the records of a
+# word by scanning the file.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from wiktextract import serializer
+from wiktextract import sinks
+from wiktextract import jsonlindex
+from benchmarks.bench_records import make_page
+
+
+def scan(path, word):
+    """Returns the records of ``word`` in the JSON lines file ``path``,
+    found by scanning the file."""
+    ret = []
+    with open(path, "rb") as f:
+        for line in f:
+            data = serializer.loads(line)
+            if data["word"] == word:
+                ret.append(data)
+    return ret
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for indexed lookups in JSON lines output")
+    parser.add_argument("--pages", type=int, default=50000,
+                        help="Number of synthetic Thesaurus pages")
+    parser.add_argument("--queries", type=int, default=10000,
+                        help="Number of indexed lookups")
+    parser.add_argument("--scans", type=int, default=3,
+                        help="Number of lookups by scanning the file")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(50000)]
+    records = wiktionary.parse_text_many(
+        ("Thesaurus:{}".format(vocab[i % len(vocab)]), make_page(rnd, vocab))
+        for i in range(args.pages))
+    print("{} Thesaurus records".format(len(records)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "out.json")
+        sink = sinks.JSONLFileSink(path, index_path=path + ".idx")
+        start = time.perf_counter()
+        sink.open()
+        for i in range(0, len(records), sink.batch_size):
+            sink.write_batch(records[i:i + sink.batch_size])
+        sink.close()
+        t = time.perf_counter() - start
+        print("write          {:8.2f} s {:8.1f} MB {:8.1f} MB index".format(
+            t, os.path.getsize(path) / 1e6,
+            os.path.getsize(path + ".idx") / 1e6))
+
+        start = time.perf_counter()
+        r = jsonlindex.IndexedJSONL(path)
+        t = time.perf_counter() - start
+        print("open           {:8.2f} ms {:8d} records".format(t * 1e3,
+                                                              len(r)))
+
+        words = ["Thesaurus:" + rnd.choice(vocab)
+                 for i in range(args.queries)]
+        found = 0
+        start = time.perf_counter()
+        for word in words:
+            found += len(r.get(word))
+        t = time.perf_counter() - start
+        print("indexed lookup {:8.1f} us/query {:8.1f} records/query".format(
+            t / len(words) * 1e6, found / len(words)))
+        r.close()
+
+        start = time.perf_counter()
+        for word in words[:args.scans]:
+            scan(path, word)
+        t = time.perf_counter() - start
+        print("scan lookup    {:8.1f} ms/query".format(
+            t / args.scans * 1e3))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# Benchmark for writing extracted records to the output file: opening the
+# file in append mode for every record (as Thesaurus pages used to be
+# saved to "Output.txt") versus a single handle opened once with a large
+# buffer, with records passed to word_cb one at a time or to batch_cb in
+# lists through a RecordBatcher (as wiktwords does).  The records are
+# parsed from synthetic Thesaurus pages once, so only the output is timed.
+# The system calls are counted with a raw file object that counts the
+# calls that reach the operating system.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import io
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from benchmarks.bench_records import make_page
+
+
+class CountingFileIO(io.FileIO):
+    """Raw file that counts the open, write and close system calls made
+    through it in the ``counts`` dictionary."""
+
+    def __init__(self, path, mode, counts):
+        super(CountingFileIO, self).__init__(path, mode)
+        self.counts = counts
+        counts["open"] += 1
+
+    def write(self, b):
+        self.counts["write"] += 1
+        return super(CountingFileIO, self).write(b)
+
+    def close(self):
+        if not self.closed:
+            self.counts["close"] += 1
+        super(CountingFileIO, self).close()
+
+
+def open_counting(path, counts, buffering):
+    """Opens ``path`` for appending text, with ``buffering`` bytes of
+    buffer, counting system calls in ``counts``."""
+    raw = CountingFileIO(path, "a", counts)
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffering),
+                            encoding="utf-8")
+
+
+def run(records, path, mode, buffering):
+    """Writes ``records`` to ``path`` using output mode ``mode``
+    ("per-record", "persistent" or "batched").  Returns
+    ``(counts, seconds)``."""
+    counts = {"open": 0, "write": 0, "close": 0}
+    out_f = None
+    if mode == "per-record":
+        def word_cb(data):
+            with open_counting(path, counts, io.DEFAULT_BUFFER_SIZE) as f:
+                f.write(json.dumps(data))
+                f.write("\n")
+    else:
+        out_f = open_counting(path, counts, buffering)
+        if mode == "persistent":
+            def word_cb(data):
+                out_f.write(json.dumps(data))
+                out_f.write("\n")
+        else:
+            def batch_cb(batch):
+                out_f.write("".join([json.dumps(data) + "\n"
+                                     for data in batch]))
+
+            word_cb = wiktionary.RecordBatcher(batch_cb, 1000)
+
+    start = time.perf_counter()
+    for data in records:
+        word_cb(data)
+    if mode == "batched":
+        word_cb.flush()
+    if out_f is not None:
+        out_f.close()
+    return counts, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for per-record, persistent and batched "
+        "output")
+    parser.add_argument("--pages", type=int, default=20000,
+                        help="Number of synthetic Thesaurus pages")
+    parser.add_argument("--buffer", type=int, default=1024 * 1024,
+                        help="Buffer size of the persistent handle")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(5000)]
+    pages = [("Thesaurus:page{}".format(i), make_page(rnd, vocab))
+             for i in range(args.pages)]
+    records = wiktionary.parse_text_many(pages)
+    print("{} Thesaurus records".format(len(records)))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ("per-record", "persistent", "batched"):
+            path = os.path.join(tmpdir, name + ".json")
+            counts, t = run(records, path, name, args.buffer)
+            print("{:<12s} {:8d} open {:8d} write {:8d} close "
+                  "{:8.2f} s {:8.1f} MB".format(
+                      name, counts["open"], counts["write"],
+                      counts["close"], t, os.path.getsize(path) / 1e6))
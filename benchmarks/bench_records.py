@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#
+# Memory benchmark for Thesaurus records kept in memory: dictionaries as
+# returned by parse_thesaurus() versus ThesaurusRecord objects.  Records
+# are generated from a set of synthetic Thesaurus pages with targets drawn
+# from a shared vocabulary.  The size of each record is the total
+# sys.getsizeof() of the containers it owns; strings, and the target tuples
+# memoized by the line cache, are shared between records and not counted.
+# Records are sized one at a time, as a million dictionary records do not
+# fit in memory on many machines.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import sys
+import time
+import random
+import argparse
+from wiktextract import wiktionary
+
+
+def make_page(rnd, vocab):
+    """Returns the text of a random Thesaurus page with one to three senses,
+    each with a few relations."""
+    lines = ["{{ws header|lang=en}}", "==English==", "===Noun==="]
+    for i in range(rnd.randint(1, 3)):
+        lines.append("====Sense: {}====".format(i))
+        lines.append("{{{{ws sense|{}}}}}".format(rnd.choice(vocab)))
+        for rel in rnd.sample(wiktionary.THESAURUS_RELATIONS[:4],
+                              rnd.randint(1, 3)):
+            lines.append("====={}=====".format(rel))
+            lines.append("{{ws beginlist}}")
+            for j in range(rnd.randint(1, 8)):
+                if rnd.random() < 0.1:
+                    lines.append("{{{{ws|{}|q=informal}}}}".format(
+                        rnd.choice(vocab)))
+                else:
+                    lines.append("{{{{ws|{}}}}}".format(rnd.choice(vocab)))
+            lines.append("{{ws endlist}}")
+    return "\n".join(lines) + "\n"
+
+
+def container_size(obj, shared):
+    """Returns the total size of the dicts, lists, tuples and objects with
+    ``__slots__`` in ``obj`` (recursively), except those whose id is in
+    ``shared``."""
+    if id(obj) in shared:
+        return 0
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(container_size(v, shared)
+                                        for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(container_size(v, shared)
+                                        for v in obj)
+    if hasattr(obj, "__slots__"):
+        return sys.getsizeof(obj) + sum(container_size(getattr(obj, k),
+                                                       shared)
+                                        for k in obj.__slots__)
+    return 0
+
+
+def measure(build, count, shared):
+    """Returns ``(bytes, seconds)`` for creating ``count`` records with
+    ``build(i)``, where ``bytes`` is their total container size."""
+    size = 0
+    t = 0.0
+    for i in range(count):
+        start = time.perf_counter()
+        record = build(i)
+        t += time.perf_counter() - start
+        size += container_size(record, shared)
+    return size, t
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory benchmark for dict vs compact Thesaurus records")
+    parser.add_argument("--count", type=int, default=1000000,
+                        help="Number of records to hold in memory")
+    parser.add_argument("--pages", type=int, default=1000,
+                        help="Number of distinct synthetic pages")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(5000)]
+    cache = {}
+    bases = [wiktionary.parse_thesaurus_record("Thesaurus:page{}".format(i),
+                                               make_page(rnd, vocab), cache)
+             for i in range(args.pages)]
+    # Each record gets its own containers; strings and the memoized target
+    # tuples are shared, as they are when parsing with a line cache.
+    shared = set(id(x) for x in cache.values())
+
+    def compact(i):
+        b = bases[i % len(bases)]
+        return wiktionary.ThesaurusRecord(
+            b.word, tuple((g, tuple(t)) for g, t in b.senses))
+
+    runs = [
+        ("dict", lambda i: bases[i % len(bases)].to_dict()),
+        ("ThesaurusRecord", compact),
+    ]
+    print("{} records from {} pages".format(args.count, args.pages))
+    sizes = []
+    for name, build in runs:
+        size, t = measure(build, args.count, shared)
+        sizes.append(size)
+        print("{:<16s} {:10.1f} MB {:8.1f} bytes/record {:8.2f} s".format(
+            name, size / 1e6, size / args.count, t))
+    print("reduction {:.1f}x".format(sizes[0] / sizes[1]))
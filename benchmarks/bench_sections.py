@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Benchmark for extracting word entries with different capture flags.  The
+# cost of wiktionary.parse_entry() with the default flags (nothing but the
+# part-of-speech headers) is compared to just scanning the pages for
+# section headers (page_sections()), to capturing glosses only (which
+# tokenizes and cleans every gloss line, and is most of the cost of
+# capturing everything), to tokenizing the whole pages, and to extracting
+# everything.  The pages are the main namespace pages of the test dump.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import re
+import sys
+import bz2
+import html
+import time
+import argparse
+from wiktextract import wiktionary
+from wiktextract import tokenizer
+
+
+def read_pages(path):
+    """Returns ``(title, text)`` for the main namespace pages in the dump
+    file ``path``."""
+    with bz2.open(path, "rt", encoding="utf-8") as f:
+        data = f.read()
+    pages = []
+    for m in re.finditer(r"(?s)<title>([^<:]*)</title>.*?"
+                         r"<text[^>]*>(.*?)</text>", data):
+        pages.append((html.unescape(m.group(1)), html.unescape(m.group(2))))
+    return pages
+
+
+def bench(fn, pages, repeat):
+    """Returns the best time (seconds) for calling ``fn`` on all pages."""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for title, text in pages:
+            fn(title, text)
+        t = time.perf_counter() - start
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def make_ctx(languages, flags, glosses=None):
+    """Returns a context capturing ``languages``, with all capture flags set
+    to ``flags`` (except glosses, if ``glosses`` is given)."""
+    if glosses is None:
+        glosses = flags
+    return wiktionary.WiktionaryTarget(lambda data: None, None, languages,
+                                       flags, flags, flags, flags, False,
+                                       capture_glosses=glosses,
+                                       capture_conjugations=flags)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark word entry extraction by capture flags")
+    parser.add_argument("path", type=str, nargs="?",
+                        default=("wiktextract/tests/"
+                                 "test-pages-articles.xml.bz2"),
+                        help="Dump file from which to take pages")
+    parser.add_argument("--language", type=str, action="append", default=[],
+                        help="Language to capture (default English and "
+                        "Translingual)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timing runs (best is reported)")
+    args = parser.parse_args()
+
+    pages = read_pages(args.path)
+    if not pages:
+        print("No pages found in", args.path)
+        sys.exit(1)
+    languages = args.language or ["English", "Translingual"]
+    chars = sum(len(x[1]) for x in pages)
+    print("{} pages, {} characters".format(len(pages), chars))
+    default_ctx = make_ctx(languages, False)
+    glosses_ctx = make_ctx(languages, False, glosses=True)
+    all_ctx = make_ctx(languages, True)
+    runs = [
+        ("header scan", lambda title, text: wiktionary.page_sections(text)),
+        ("defaults", lambda title, text: wiktionary.parse_entry(
+            title, text, default_ctx)),
+        ("glosses", lambda title, text: wiktionary.parse_entry(
+            title, text, glosses_ctx)),
+        ("all flags", lambda title, text: wiktionary.parse_entry(
+            title, text, all_ctx)),
+        ("tokenize pages", lambda title, text: tokenizer.tokenize(text)),
+    ]
+    for name, fn in runs:
+        t = bench(fn, pages, args.repeat)
+        print("{:<16s} {:8.3f} s {:8.2f} us/page {:8.2f} MB/s".format(
+            name, t, 1e6 * t / len(pages), chars / t / 1e6))
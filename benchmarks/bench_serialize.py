@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+#
+# Benchmark for serializing extracted records as JSON lines.  The records
+# extracted from the test dump (with all data captured) are serialized in
+# batches with json.dumps() called per record (as wiktwords used to do),
+# with the reused stdlib encoder of wiktextract.serializer, and with orjson
+# (if installed).  Throughput is reported in MB of output per second, and
+# as records per second, since the output sizes differ.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import json
+import time
+import argparse
+from wiktextract import wiktionary
+from wiktextract import serializer
+
+
+def dumps_batch_default(batch):
+    """Serializes ``batch`` by calling json.dumps() for each record."""
+    return "".join([json.dumps(data) + "\n"
+                    for data in batch]).encode("utf-8")
+
+
+def measure(dumps_batch, records, batch_size, repeat):
+    """Returns ``(bytes, seconds)`` for serializing ``records`` in batches
+    of ``batch_size`` records ``repeat`` times."""
+    batches = [records[i:i + batch_size]
+               for i in range(0, len(records), batch_size)]
+    size = 0
+    start = time.perf_counter()
+    for i in range(repeat):
+        for batch in batches:
+            size += len(dumps_batch(batch))
+    return size, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for JSON lines serialization of records")
+    parser.add_argument("--path", type=str,
+                        default="wiktextract/tests/"
+                        "test-pages-articles.xml.bz2",
+                        help="Dump file from which to extract the records")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="Records per serialized batch")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Number of times to serialize the records")
+    args = parser.parse_args()
+
+    records = []
+    wiktionary.parse_wiktionary(args.path, records.append,
+                                languages=["English", "Finnish",
+                                           "Translingual"],
+                                translations=True, pronunciations=True,
+                                linkages=True, compounds=True,
+                                redirects=True)
+    runs = [("json.dumps", dumps_batch_default),
+            ("JSONEncoder", serializer.json_dumps_batch)]
+    if serializer.orjson is not None:
+        runs.append(("orjson", serializer.orjson_dumps_batch))
+    print("{} records, serializer backend {}".format(len(records),
+                                                     serializer.BACKEND))
+    for name, dumps_batch in runs:
+        size, t = measure(dumps_batch, records, args.batch_size,
+                          args.repeat)
+        print("{:<12s} {:8.1f} MB {:8.2f} s {:8.1f} MB/s {:10.0f} records/s"
+              .format(name, size / 1e6, t, size / 1e6 / t,
+                      len(records) * args.repeat / t))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+#
+# Benchmark for the external merge sort of JSON lines output.  Thesaurus
+# records are parsed from synthetic pages once, written in random order to
+# a JSON lines file, and sorted by word with wiktextract.extsort with
+# different memory budgets: one large enough to sort everything in memory,
+# and smaller ones that spill sorted runs to temporary files and merge
+# them (in several passes when there are more runs than the fan-in).
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from wiktextract import serializer
+from wiktextract import extsort
+from benchmarks.bench_records import make_page
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark for sorting JSON lines output by word")
+    parser.add_argument("--pages", type=int, default=50000,
+                        help="Number of synthetic Thesaurus pages")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(50000)]
+    records = wiktionary.parse_text_many(
+        ("Thesaurus:{}".format(rnd.choice(vocab)), make_page(rnd, vocab))
+        for i in range(args.pages))
+    print("{} Thesaurus records".format(len(records)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "in.json")
+        with open(path, "wb") as f:
+            f.write(serializer.dumps_batch(records))
+        size = os.path.getsize(path)
+        del records
+        out = os.path.join(tmpdir, "out.json")
+        for memory, fan_in in ((4 * size, 64), (size // 8, 64),
+                               (size // 64, 8)):
+            start = time.perf_counter()
+            count = extsort.sort_jsonl([path], out, memory=memory,
+                                       tmpdir=tmpdir, fan_in=fan_in)
+            t = time.perf_counter() - start
+            print("memory {:8.1f} MB fan-in {:3d} {:8.2f} s {:8.1f} MB/s "
+                  "{:10.0f} records/s".format(memory / 1e6, fan_in, t,
+                                              size / 1e6 / t, count / t))
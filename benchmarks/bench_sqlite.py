@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+#
+# Benchmark for the SQLite sink.  Thesaurus records are parsed from
+# synthetic pages once, and then loaded into a database with SQLiteSink
+# (executemany() in large transactions, write-ahead log, synchronous
+# writes off, indexes created after the load).  For comparison, a subset
+# of the records is loaded the naive way: indexes created first, one
+# execute() per row and a commit per record with default settings.  Query
+# latency is then measured for looking up the targets of a word and the
+# words having a given target.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from wiktextract import wiktionary
+from wiktextract import sinks
+from wiktextract import serializer
+from benchmarks.bench_records import make_page
+
+# Targets of a word, with relation names
+targets_sql = """
+SELECT r.name, t.word FROM targets
+JOIN relations r ON r.id = targets.relation_id
+JOIN words t ON t.id = targets.target_id
+WHERE targets.word_id = (SELECT id FROM words WHERE word = ?)
+"""
+
+# Words having a word as a target, with relation names
+sources_sql = """
+SELECT r.name, w.word FROM targets
+JOIN relations r ON r.id = targets.relation_id
+JOIN words w ON w.id = targets.word_id
+WHERE targets.target_id = (SELECT id FROM words WHERE word = ?)
+"""
+
+
+def load_naive(path, records):
+    """Loads ``records`` into a database at ``path`` one row and one
+    transaction at a time, with the indexes already in place.  Returns the
+    number of seconds used."""
+    start = time.perf_counter()
+    conn = sqlite3.connect(path)
+    conn.executescript(sinks.sqlite_schema)
+    conn.executescript(sinks.sqlite_indexes)
+    for data in records:
+        word = data["word"][10:]
+
+        def word_id(w):
+            conn.execute("INSERT OR IGNORE INTO words (word) VALUES (?)",
+                         (w,))
+            return conn.execute("SELECT id FROM words WHERE word = ?",
+                                (w,)).fetchone()[0]
+
+        wid = word_id(word)
+        cur = conn.execute("INSERT INTO entries (word_id, data) "
+                           "VALUES (?, ?)",
+                           (wid, serializer.dumps(data).decode("utf-8")))
+        entry_id = cur.lastrowid
+        for sense in data["senses"]:
+            for rel in wiktionary.THESAURUS_RELATIONS:
+                for x in sense.get(rel, ()):
+                    conn.execute("INSERT OR IGNORE INTO relations (name) "
+                                 "VALUES (?)", (rel,))
+                    rid = conn.execute("SELECT id FROM relations "
+                                       "WHERE name = ?", (rel,)).fetchone()[0]
+                    conn.execute("INSERT INTO targets (entry_id, word_id, "
+                                 "relation_id, target_id, sense) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (entry_id, wid, rid, word_id(x["word"]),
+                                  sense.get("sense")))
+        conn.commit()
+    conn.close()
+    return time.perf_counter() - start
+
+
+def query_latency(path, sql, words):
+    """Returns the mean latency in seconds of running ``sql`` for each of
+    ``words``, and the mean number of rows returned."""
+    conn = sqlite3.connect(path)
+    rows = 0
+    start = time.perf_counter()
+    for word in words:
+        rows += len(conn.execute(sql, (word,)).fetchall())
+    t = time.perf_counter() - start
+    conn.close()
+    return t / len(words), rows / len(words)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load and query benchmark for the SQLite sink")
+    parser.add_argument("--pages", type=int, default=50000,
+                        help="Number of synthetic Thesaurus pages")
+    parser.add_argument("--naive", type=int, default=1000,
+                        help="Number of records to load the naive way")
+    parser.add_argument("--queries", type=int, default=2000,
+                        help="Number of queries of each kind")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    vocab = ["word{}".format(i) for i in range(50000)]
+    records = wiktionary.parse_text_many(
+        ("Thesaurus:{}".format(vocab[i % len(vocab)]), make_page(rnd, vocab))
+        for i in range(args.pages))
+    print("{} Thesaurus records".format(len(records)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "naive.db")
+        t = load_naive(path, records[:args.naive])
+        print("naive load    {:8d} records {:8.2f} s {:10.0f} records/s"
+              .format(args.naive, t, args.naive / t))
+
+        path = os.path.join(tmpdir, "sink.db")
+        sink = sinks.SQLiteSink(path)
+        start = time.perf_counter()
+        sink.open()
+        for i in range(0, len(records), sink.batch_size):
+            sink.write_batch(records[i:i + sink.batch_size])
+        sink.close()
+        t = time.perf_counter() - start
+        conn = sqlite3.connect(path)
+        count, = conn.execute("SELECT COUNT(*) FROM targets").fetchone()
+        conn.close()
+        print("SQLiteSink    {:8d} records {:8.2f} s {:10.0f} records/s "
+              "{:10.0f} targets/s {:8.1f} MB".format(
+                  len(records), t, len(records) / t, count / t,
+                  os.path.getsize(path) / 1e6))
+
+        words = [rnd.choice(vocab) for i in range(args.queries)]
+        for name, sql in (("by word", targets_sql),
+                          ("by target", sources_sql)):
+            latency, rows = query_latency(path, sql, words)
+            print("query {:<10s} {:8.1f} us/query {:8.1f} rows/query"
+                  .format(name, latency * 1e6, rows))
@@ -19,7 +19,8 @@ setup(name="wiktextract",
       download_url="https://github.com/tatuylonen/wiktextract",
       scripts=["wiktwords"],
       packages=["wiktextract"],
-      install_requires=["lxml", "wikitextparser"],
+      install_requires=["lxml"],
+      extras_require={"fast": ["orjson"], "arrow": ["pyarrow"]},
       classifiers=[
           "Development Status :: 3 - Alpha",
           "Intended Audience :: Developers",
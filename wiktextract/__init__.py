@@ -3,6 +3,11 @@
 # Copyright (c) 2018 Tatu Ylonen.  See LICENSE and https://ylonen.org
 
 from wiktextract.wiktionary import parse_wiktionary, PARTS_OF_SPEECH
+from wiktextract.wiktionary import iter_wiktionary
+from wiktextract.wiktionary import parse_text_many, THESAURUS_RELATIONS
+from wiktextract.wiktionary import ThesaurusRecord
 from wiktextract import wiktlangs
 
-__all__ = ["parse_wiktionary", "wiktlangs", "PARTS_OF_SPEECH"]
+__all__ = ["parse_wiktionary", "iter_wiktionary", "parse_text_many",
+           "wiktlangs", "PARTS_OF_SPEECH", "THESAURUS_RELATIONS",
+           "ThesaurusRecord"]
@@ -0,0 +1,200 @@
+# Adversarial inputs for the wikitext cleaning code, and a harness for
+# checking that its running time grows linearly with input size.  The
+# corpus consists of unbalanced and ambiguous combinations of "{{", "[[",
+# "[" and "|" that make backtracking regular expressions (such as arg_re
+# and clean_arg1_re in wiktionary.py) take exponential time, and of lines
+# of "=" that are not section headers, on which header patterns with
+# nested repetition take cubic time.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import time
+import random
+from wiktextract import wiktionary
+
+# Template openings used in the corpus, covering templates replaced by their
+# first, second and third argument and by clean_replace_map.
+corpus_prefixes = ["{{w|", "{{l|en|", "{{w2|fi||", "{{given name|"]
+
+# Input families in the corpus.  Each maps a name to a function that returns
+# an input starting with template opening ``prefix`` and containing ``n``
+# repetitions of the problematic unit.
+corpus_patterns = {
+    "single-brackets": lambda prefix, n: prefix + "[a]" * n,
+    "double-brackets": lambda prefix, n: prefix + "[[a]]" * n,
+    "open-brackets": lambda prefix, n: prefix + "[[a" * n,
+    "open-templates": lambda prefix, n: prefix + "{{a" * n,
+    "close-templates": lambda prefix, n: prefix + "a" + "}}" * n,
+    "pipes": lambda prefix, n: prefix + "|" * n + "a",
+    "named-args": lambda prefix, n: prefix + "|a=b" * n,
+    "named-args-open": lambda prefix, n: prefix + "|a=b{{" * n,
+    "nested-templates": lambda prefix, n: prefix * n + "a" + "}}" * (n - 1),
+    "comments": lambda prefix, n: "<!--" * n + prefix + "a",
+    "header-line": lambda prefix, n: prefix + "a}}\n" + "=" * n + "a",
+    "header-lines": lambda prefix, n: prefix + "a}}" + "\n==a=" * n + "a",
+}
+
+# Characters and fragments used when generating random inputs.
+fuzz_alphabet = ["{{", "}}", "[[", "]]", "[", "]", "|", "=", "a", "b c",
+                 "{{w|", "{{w2|", "{{l|", "{{given name|", "<!--", "-->",
+                 "<ref>", "</ref>", "''"]
+
+# Default repetition counts for each input family.  Consecutive sizes grow
+# by a factor of four so that super-linear behavior shows up clearly.
+default_sizes = (4, 16, 64, 256, 1024)
+
+
+def adversarial_corpus(sizes=default_sizes, fuzz_count=20, seed=0):
+    """Returns the adversarial corpus as a list of ``(name, n, text)``
+    tuples, where ``n`` is the repetition count used for generating
+    ``text``.  The corpus contains each family in ``corpus_patterns`` with
+    each prefix in ``corpus_prefixes`` (named "<family> <prefix>"), and
+    ``fuzz_count`` random inputs of each size (named "fuzz-<i>"),
+    generated deterministically from ``seed``."""
+    assert isinstance(sizes, (list, tuple))
+    assert isinstance(fuzz_count, int)
+    ret = []
+    for name, fn in corpus_patterns.items():
+        for prefix in corpus_prefixes:
+            for n in sizes:
+                ret.append((name + " " + prefix, n, fn(prefix, n)))
+    rnd = random.Random(seed)
+    for i in range(fuzz_count):
+        frags = [rnd.choice(fuzz_alphabet) for j in range(max(sizes))]
+        for n in sizes:
+            ret.append(("fuzz-{}".format(i), n, "".join(frags[:n])))
+    return ret
+
+
+def time_call(fn, text, timeout, min_time, rounds):
+    """Returns the time of one call of ``fn(text)``, the best of ``rounds``
+    rounds, each of which repeats the call until the calls have taken at
+    least ``min_time`` seconds in total.  Raises
+    wiktionary.PageTimeoutError if a round uses more than ``timeout``
+    seconds of CPU time."""
+    best = None
+    for i in range(rounds):
+        with wiktionary.page_time_budget(timeout):
+            count = 0
+            start = time.perf_counter()
+            while True:
+                fn(text)
+                count += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+        seconds = elapsed / count
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+
+def time_inputs(fn, corpus, timeout=1.0, min_time=0.0, rounds=1):
+    """Calls ``fn(text)`` for each input in ``corpus`` (as returned by
+    adversarial_corpus()) and returns a list of dictionaries with keys
+    ``name``, ``n``, ``length`` and ``seconds`` (elapsed time of one call,
+    see time_call() for ``min_time`` and ``rounds``).  ``seconds`` is None
+    if a round used more than ``timeout`` seconds of CPU time.  After an
+    input times out, larger inputs of the same family are not tried (they
+    are reported with ``seconds`` None).  The timeout only works in the
+    main thread; see wiktionary.page_time_budget()."""
+    assert callable(fn)
+    assert isinstance(rounds, int) and rounds >= 1
+    ret = []
+    timed_out = set()
+    for name, n, text in corpus:
+        seconds = None
+        if name not in timed_out:
+            try:
+                seconds = time_call(fn, text, timeout, min_time, rounds)
+            except wiktionary.PageTimeoutError:
+                timed_out.add(name)
+        ret.append({"name": name, "n": n, "length": len(text),
+                    "seconds": seconds})
+    return ret
+
+
+def linear_failures(results, slack):
+    """Returns the results from time_inputs() that time out or whose time
+    per character exceeds ``slack`` times the highest time per character
+    of the shorter inputs of the same family."""
+    families = {}
+    for r in results:
+        families.setdefault(r["name"], []).append(r)
+    failures = []
+    for family in families.values():
+        family.sort(key=lambda x: x["length"])
+        base = None
+        for r in family:
+            if r["seconds"] is None:
+                failures.append(r)
+                continue
+            cost = r["seconds"] / max(r["length"], 1)
+            if base is not None and cost > slack * base:
+                failures.append(r)
+            if base is None or cost > base:
+                base = cost
+    return failures
+
+
+def check_linear(fn, corpus=None, timeout=1.0, slack=2.0, min_time=0.002,
+                 rounds=3):
+    """Checks that the running time of ``fn`` on the inputs in ``corpus``
+    (the default adversarial corpus if None) grows at most linearly with
+    input length.  An input fails if its time per character exceeds
+    ``slack`` times the highest time per character of the shorter inputs
+    of its family, or if it times out.  (Comparing with the highest
+    rather than the shortest tolerates random inputs whose prefixes
+    differ in how much work they need.)  Each input is timed repeatedly
+    (see time_call() for ``min_time`` and ``rounds``) so that the times of
+    short inputs are above timer resolution, and families with failures
+    are timed again; only inputs that fail both times are reported.
+    Since the default sizes grow by a factor of four, the time per
+    character of a quadratic function grows past the default ``slack``
+    between consecutive sizes.  Returns a list of the failing results (as
+    returned by time_inputs()), empty if all inputs are within the
+    bound."""
+    assert callable(fn)
+    assert slack >= 1
+    if corpus is None:
+        corpus = adversarial_corpus()
+    failures = linear_failures(time_inputs(fn, corpus, timeout=timeout,
+                                           min_time=min_time,
+                                           rounds=rounds), slack)
+    names = set(r["name"] for r in failures if r["seconds"] is not None)
+    if names:
+        # Rule out measurement noise
+        retry = [x for x in corpus if x[0] in names]
+        again = linear_failures(time_inputs(fn, retry, timeout=timeout,
+                                            min_time=min_time,
+                                            rounds=rounds), slack)
+        confirmed = set((r["name"], r["n"]) for r in again)
+        failures = [r for r in failures if r["seconds"] is None or
+                    (r["name"], r["n"]) in confirmed]
+    return failures
+
+
+# The cleaning functions from wiktionary.py that the corpus is aimed at: the
+# regular expression substitutions and clean_value(), which replaces them.
+clean_targets = {
+    "clean_arg1_re": lambda text: wiktionary.clean_arg1_re.sub(r"\3", text),
+    "clean_arg2_re": lambda text: wiktionary.clean_arg2_re.sub(r"\6", text),
+    "clean_arg3_re": lambda text: wiktionary.clean_arg3_re.sub(r"\9", text),
+    "clean_value": wiktionary.clean_value,
+}
+
+
+if __name__ == "__main__":
+    # Print a timing table for the functions in clean_targets.
+    corpus = adversarial_corpus()
+    for target, fn in clean_targets.items():
+        print(target)
+        for r in time_inputs(fn, corpus, timeout=1.0):
+            if r["name"].startswith("fuzz-"):
+                continue
+            if r["seconds"] is None:
+                t = "   TIMEOUT"
+            else:
+                t = "{:10.6f}".format(r["seconds"])
+            print("  {:<34s} {:>5d} {:>7d} {}".format(r["name"], r["n"],
+                                                      r["length"], t))
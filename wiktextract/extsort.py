@@ -0,0 +1,214 @@
+# External merge sort of JSON lines output by word, in bounded memory.
+# Records from parallel or sharded runs come out in no particular order,
+# but diffing and merging outputs needs them sorted.  The input lines are
+# collected until they reach the memory budget, sorted, and spilled to a
+# temporary run file; the runs are then merged with a k-way heap merge
+# (in several passes if there are more runs than can be merged at once).
+# Records with the same key are ordered by their JSON text, so the output
+# does not depend on the order of the input.  Lines are copied as they
+# are; they are decoded only to find their keys.
+#
+# A run file is a sequence of entries, each consisting of the lengths of
+# the key and of the line (two little-endian 32-bit integers) followed by
+# the key and the line.  The key is the UTF-8 encoded word, optionally
+# followed by a NUL and the UTF-8 encoded relation, so comparing keys as
+# bytes sorts by word (in code point order) and then by relation.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import io
+import os
+import sys
+import gzip
+import lzma
+import heapq
+import struct
+import itertools
+import tempfile
+from array import array
+from wiktextract.serializer import loads
+from wiktextract.jsonlindex import write_index
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Header of an entry in a run file: lengths of the key and of the line
+run_header = struct.Struct("<II")
+
+# Estimated memory used by each line kept in memory in addition to the
+# line and the key (the bytes objects, the tuple and the list slot)
+entry_overhead = 2 * sys.getsizeof(b"") + sys.getsizeof((b"", b"")) + 8
+
+
+def open_jsonl(path):
+    """Opens the JSON lines file ``path`` for reading lines in binary
+    mode, decompressing it if its name ends in ".gz", ".xz" or ".zst"
+    (the latter requires the zstandard module)."""
+    assert isinstance(path, str)
+    suffix = os.path.splitext(path)[1]
+    if suffix == ".gz":
+        return gzip.open(path, "rb")
+    if suffix == ".xz":
+        return lzma.open(path, "rb")
+    if suffix == ".zst":
+        if zstandard is None:
+            raise ImportError("zstandard is required for reading "
+                              "zstd input")
+        f = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            f, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader, 1024 * 1024)
+    return open(path, "rb", buffering=1024 * 1024)
+
+
+def record_key(line, by_relation=False):
+    """Returns the sort key (as bytes) of the JSON line ``line``.  If
+    ``by_relation`` is True, records with the same word are ordered by
+    their ``relation`` field (as in rows written by partitioning by
+    relation); records without one come first."""
+    data = loads(line)
+    key = data["word"].encode("utf-8")
+    if by_relation:
+        key += b"\0" + data.get("relation", "").encode("utf-8")
+    return key
+
+
+def write_run(path, entries):
+    """Writes the ``(key, line)`` pairs from ``entries`` into the run file
+    ``path``."""
+    pack = run_header.pack
+    with open(path, "wb", buffering=1024 * 1024) as f:
+        for key, line in entries:
+            f.write(pack(len(key), len(line)))
+            f.write(key)
+            f.write(line)
+
+
+def read_run(path, buffering):
+    """Iterates over the ``(key, line)`` pairs in the run file ``path``,
+    reading it through a ``buffering`` byte buffer."""
+    unpack = run_header.unpack
+    size = run_header.size
+    with open(path, "rb", buffering=buffering) as f:
+        while True:
+            header = f.read(size)
+            if not header:
+                break
+            klen, llen = unpack(header)
+            key = f.read(klen)
+            line = f.read(llen)
+            yield key, line
+
+
+def iter_sorted(paths, by_relation=False, unique=False,
+                memory=(256 * 1024 * 1024), tmpdir=None, fan_in=64):
+    """Iterates over the lines of the JSON lines files ``paths`` (see
+    open_jsonl()) sorted by word, as ``(key, line)`` pairs (see
+    record_key()).  Each line ends in a newline.  About ``memory`` bytes
+    of lines are sorted in memory at a time; larger inputs are spilled to
+    temporary run files in ``tmpdir`` (by default the system temporary
+    directory), at most ``fan_in`` of which are merged at a time.  If
+    ``unique`` is True, duplicate lines are dropped.  Raises ValueError
+    if a line is not a JSON object with a ``word`` field."""
+    assert isinstance(paths, (list, tuple))
+    assert isinstance(memory, int) and memory > 0
+    assert tmpdir is None or isinstance(tmpdir, str)
+    assert isinstance(fan_in, int) and fan_in >= 2
+    with tempfile.TemporaryDirectory(prefix="wiktsort-",
+                                     dir=tmpdir) as tmp:
+        runs = []
+        names = itertools.count()
+
+        def spill(entries):
+            path = os.path.join(tmp, "run{}".format(next(names)))
+            write_run(path, entries)
+            runs.append(path)
+
+        entries = []
+        used = 0
+        for path in paths:
+            with open_jsonl(path) as f:
+                for lineno, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    if not line.endswith(b"\n"):
+                        line += b"\n"
+                    try:
+                        key = record_key(line, by_relation)
+                    except (ValueError, KeyError, TypeError,
+                            AttributeError):
+                        raise ValueError("{}:{}: invalid record"
+                                         .format(path, lineno))
+                    entries.append((key, line))
+                    used += len(key) + len(line) + entry_overhead
+                    if used >= memory:
+                        entries.sort()
+                        spill(entries)
+                        entries = []
+                        used = 0
+        entries.sort()
+
+        if runs:
+            if entries:
+                spill(entries)
+            entries = None
+            # The read buffers of the runs being merged share the budget
+            buffering = max(64 * 1024, memory // (2 * fan_in))
+            while len(runs) > fan_in:
+                group = runs[:fan_in]
+                del runs[:fan_in]
+                spill(heapq.merge(*[read_run(x, buffering) for x in group]))
+                for path in group:
+                    os.remove(path)
+            merged = heapq.merge(*[read_run(x, buffering) for x in runs])
+        else:
+            merged = entries
+
+        prev = None
+        for entry in merged:
+            if unique and entry == prev:
+                continue
+            prev = entry
+            yield entry
+
+
+def sort_jsonl(paths, out_path, by_relation=False, unique=False,
+               memory=(256 * 1024 * 1024), tmpdir=None, fan_in=64,
+               index_path=None):
+    """Sorts the JSON lines files ``paths`` by word (see iter_sorted()) into
+    ``out_path`` ("-" for standard output).  If ``index_path`` is set, an
+    index of the output (see wiktextract.jsonlindex) is written there.
+    Returns the number of records written."""
+    assert isinstance(out_path, str)
+    assert index_path is None or (isinstance(index_path, str) and
+                                  out_path != "-")
+    if out_path == "-":
+        sys.stdout.flush()
+        f = sys.stdout.buffer
+    else:
+        f = open(out_path, "wb", buffering=1024 * 1024)
+    words = []
+    offsets = array("Q")
+    lengths = array("I")
+    count = 0
+    pos = 0
+    try:
+        for key, line in iter_sorted(paths, by_relation, unique, memory,
+                                     tmpdir, fan_in):
+            f.write(line)
+            if index_path is not None:
+                words.append(key.partition(b"\0")[0].decode("utf-8"))
+                offsets.append(pos)
+                lengths.append(len(line) - 1)
+            pos += len(line)
+            count += 1
+    finally:
+        if f is sys.stdout.buffer:
+            f.flush()
+        else:
+            f.close()
+    if index_path is not None:
+        write_index(index_path, words, offsets, lengths, pos)
+    return count
@@ -0,0 +1,212 @@
+# Binary export of the relations between words as a graph in compressed
+# sparse row (CSR) form.  Every word and relation target is assigned an
+# integer id, which is its index in a sorted string table.  For each
+# relation, ``indptr[i]:indptr[i + 1]`` is the range in ``indices`` holding
+# the (sorted) ids of the targets of word ``i``.  The arrays are written as
+# NumPy .npy files of little-endian 32-bit unsigned integers (without
+# requiring NumPy), and Graph loads them by memory-mapping the files, so
+# loading takes milliseconds regardless of the size of the graph.
+#
+# Files in the graph directory:
+#   graph.json             -- manifest: word count, relations and their files
+#   strings.bin            -- UTF-8 encoded words in sorted order, concatenated
+#   strings.npy            -- offsets of the words in strings.bin (n + 1)
+#   rel<k>.indptr.npy      -- row pointers for the k-th relation (n + 1)
+#   rel<k>.indices.npy     -- target ids for the k-th relation
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import ast
+import sys
+import json
+import mmap
+import itertools
+from array import array
+
+# Magic string at the start of .npy files
+npy_magic = b"\x93NUMPY"
+
+
+def write_npy(path, arr):
+    """Writes ``arr`` (an array('I')) to ``path`` as a version 1.0 .npy file
+    of little-endian 32-bit unsigned integers.  Returns the size of the
+    file."""
+    assert isinstance(arr, array) and arr.typecode == "I"
+    assert arr.itemsize == 4
+    header = "{{'descr': '<u4', 'fortran_order': False, 'shape': ({},), }}" \
+        .format(len(arr))
+    # The data is aligned at 64 bytes, as NumPy does
+    pad = 63 - (len(npy_magic) + 4 + len(header)) % 64
+    header = (header + " " * pad + "\n").encode("latin-1")
+    if sys.byteorder != "little":
+        arr = array("I", arr)
+        arr.byteswap()
+    with open(path, "wb") as f:
+        f.write(npy_magic + b"\x01\x00")
+        f.write(len(header).to_bytes(2, "little"))
+        f.write(header)
+        arr.tofile(f)
+    return len(npy_magic) + 4 + len(header) + 4 * len(arr)
+
+
+def map_file(path):
+    """Returns the contents of the file ``path`` as a read-only mmap (or
+    empty bytes for an empty file)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def npy_view(data):
+    """Returns a memoryview of 32-bit unsigned integers for the .npy file
+    contents ``data`` (as returned by map_file()), without copying the data
+    on little-endian systems."""
+    assert data[:len(npy_magic)] == npy_magic
+    major = data[6]
+    if major == 1:
+        start = 10
+        length = int.from_bytes(data[8:10], "little")
+    else:
+        start = 12
+        length = int.from_bytes(data[8:12], "little")
+    header = ast.literal_eval(data[start:start + length].decode("latin-1"))
+    assert header["descr"] == "<u4" and not header["fortran_order"]
+    view = memoryview(data)[start + length:]
+    if sys.byteorder != "little":
+        arr = array("I", bytes(view))
+        arr.byteswap()
+        return memoryview(arr)
+    return view.cast("I")
+
+
+def write_graph(path, word_ids, edges):
+    """Writes a graph into the directory ``path``.  ``word_ids`` maps each
+    word to a provisional id, and ``edges`` maps each relation name to a
+    pair of arrays of the provisional ids of the source words and targets.
+    The words are renumbered in sorted order, and duplicate edges are
+    stored once.  Returns the total size of the files written."""
+    assert isinstance(path, str)
+    assert isinstance(word_ids, dict)
+    assert isinstance(edges, dict)
+    os.makedirs(path, exist_ok=True)
+    words = sorted(word_ids)
+    n = len(words)
+    rank = array("I", bytes(4 * n))
+    for i, word in enumerate(words):
+        rank[word_ids[word]] = i
+
+    # String table
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = array("I", [0])
+    offsets.extend(itertools.accumulate(len(x) for x in encoded))
+    with open(os.path.join(path, "strings.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    size = offsets[-1]
+    size += write_npy(os.path.join(path, "strings.npy"), offsets)
+
+    # Relations, sorted by source and target id
+    relations = []
+    for k, name in enumerate(sorted(edges)):
+        src, dst = edges[name]
+        keys = sorted(set([(rank[s] << 32) | rank[d]
+                           for s, d in zip(src, dst)]))
+        counts = array("I", bytes(4 * (n + 1)))
+        for key in keys:
+            counts[(key >> 32) + 1] += 1
+        indptr = array("I", itertools.accumulate(counts))
+        indices = array("I", [key & 0xffffffff for key in keys])
+        indptr_name = "rel{}.indptr.npy".format(k)
+        indices_name = "rel{}.indices.npy".format(k)
+        size += write_npy(os.path.join(path, indptr_name), indptr)
+        size += write_npy(os.path.join(path, indices_name), indices)
+        relations.append({"name": name, "edges": len(indices),
+                          "indptr": indptr_name, "indices": indices_name})
+
+    manifest = json.dumps({"words": n, "relations": relations}, indent=1)
+    with open(os.path.join(path, "graph.json"), "w") as f:
+        f.write(manifest)
+    return size + len(manifest)
+
+
+class Graph(object):
+    """Graph written by write_graph() (e.g., through sinks.GraphSink),
+    loaded from the directory ``path`` by memory-mapping its files.  Word
+    ids are indexes in the sorted string table.  close() must be called to
+    release the mappings."""
+
+    def __init__(self, path):
+        assert isinstance(path, str)
+        with open(os.path.join(path, "graph.json")) as f:
+            manifest = json.load(f)
+        self.maps = []
+        self.strings = self.map(path, "strings.bin")
+        self.offsets = npy_view(self.map(path, "strings.npy"))
+        self.count = manifest["words"]
+        assert len(self.offsets) == self.count + 1
+        self.names = []
+        self.relations = {}
+        for rel in manifest["relations"]:
+            indptr = npy_view(self.map(path, rel["indptr"]))
+            indices = npy_view(self.map(path, rel["indices"]))
+            assert len(indptr) == self.count + 1
+            assert len(indices) == rel["edges"]
+            self.names.append(rel["name"])
+            self.relations[rel["name"]] = (indptr, indices)
+
+    def map(self, path, name):
+        data = map_file(os.path.join(path, name))
+        self.maps.append(data)
+        return data
+
+    def __len__(self):
+        return self.count
+
+    def word(self, i):
+        """Returns the word with id ``i``."""
+        offsets = self.offsets
+        return self.strings[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+    def find(self, word):
+        """Returns the id of ``word``, or None if it is not in the graph."""
+        key = word.encode("utf-8")
+        strings = self.strings
+        offsets = self.offsets
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if strings[offsets[mid]:offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and strings[offsets[lo]:offsets[lo + 1]] == key:
+            return lo
+        return None
+
+    def neighbors(self, relation, i):
+        """Returns the ids of the targets of word id ``i`` in ``relation``
+        (as a memoryview into the mapped file)."""
+        indptr, indices = self.relations[relation]
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def targets(self, relation, word):
+        """Returns the list of the targets of ``word`` in ``relation``."""
+        if relation not in self.relations:
+            return []
+        i = self.find(word)
+        if i is None:
+            return []
+        return [self.word(j) for j in self.neighbors(relation, i)]
+
+    def close(self):
+        """Releases the memory mappings."""
+        for view in [self.offsets] + [x for pair in self.relations.values()
+                                      for x in pair]:
+            view.release()
+        self.relations = {}
+        for data in self.maps:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self.maps = []
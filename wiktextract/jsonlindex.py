@@ -0,0 +1,198 @@
+# Sidecar index for JSON lines output, for looking up the records of a word
+# without scanning the file.  The index maps each word (the ``word`` field
+# of the record, so thesaurus entries are under "Thesaurus:WORD") to the
+# byte offsets and lengths of its records in the JSON lines file.  The
+# words are stored sorted by their UTF-8 encoding (which is the same as
+# code point order), and the records of a word in file order, so a word is
+# found by binary search directly in the memory-mapped index.
+#
+# Index file layout (all integers little-endian):
+#   header                 -- magic, record count n, size of the JSON lines
+#                             file and size of the word table (4 x 8 bytes)
+#   offsets                -- byte offset of each record (n x 64 bits)
+#   key offsets            -- offset of each word in the word table
+#                             ((n + 1) x 32 bits)
+#   lengths                -- length of each record without the newline
+#                             (n x 32 bits)
+#   words                  -- UTF-8 encoded words, concatenated
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import sys
+import mmap
+import struct
+import itertools
+from array import array
+from wiktextract.graph import map_file
+from wiktextract.serializer import loads
+
+# Magic string at the start of index files
+index_magic = b"WKTXIDX1"
+
+# Format of the index file header
+index_header = struct.Struct("<8sQQQ")
+
+
+def write_index(path, words, offsets, lengths, data_size):
+    """Writes an index into the file ``path``.  ``words`` is a list of the
+    words of the records, ``offsets`` an array('Q') of their byte offsets
+    and ``lengths`` an array('I') of their lengths in the JSON lines file,
+    all in file order, and ``data_size`` the size of that file.  Returns
+    the number of records."""
+    assert isinstance(path, str)
+    assert isinstance(words, list)
+    assert isinstance(offsets, array) and offsets.typecode == "Q"
+    assert isinstance(lengths, array) and lengths.typecode == "I"
+    assert len(words) == len(offsets) == len(lengths)
+    assert isinstance(data_size, int)
+    # sorted() is stable, so the records of each word stay in file order
+    order = sorted(range(len(words)), key=words.__getitem__)
+    encoded = [words[i].encode("utf-8") for i in order]
+    key_offsets = array("I", [0])
+    key_offsets.extend(itertools.accumulate(len(x) for x in encoded))
+    offsets = array("Q", [offsets[i] for i in order])
+    lengths = array("I", [lengths[i] for i in order])
+    if sys.byteorder != "little":
+        for arr in (offsets, key_offsets, lengths):
+            arr.byteswap()
+    with open(path, "wb") as f:
+        f.write(index_header.pack(index_magic, len(order), data_size,
+                                  key_offsets[-1]))
+        offsets.tofile(f)
+        key_offsets.tofile(f)
+        lengths.tofile(f)
+        f.write(b"".join(encoded))
+    return len(order)
+
+
+def build_index(path, index_path=None):
+    """Builds an index for the existing JSON lines file ``path``, writing
+    it to ``index_path`` (by default ``path + ".idx"``).  Returns the number
+    of records."""
+    assert isinstance(path, str)
+    assert index_path is None or isinstance(index_path, str)
+    if index_path is None:
+        index_path = path + ".idx"
+    words = []
+    offsets = array("Q")
+    lengths = array("I")
+    pos = 0
+    with open(path, "rb") as f:
+        for line in f:
+            data = line.rstrip(b"\n")
+            if data:
+                words.append(loads(data)["word"])
+                offsets.append(pos)
+                lengths.append(len(data))
+            pos += len(line)
+    return write_index(index_path, words, offsets, lengths, pos)
+
+
+def le_view(view, typecode):
+    """Returns ``view`` (of little-endian integers) cast to ``typecode``,
+    without copying on little-endian systems."""
+    if sys.byteorder != "little":
+        arr = array(typecode, bytes(view))
+        arr.byteswap()
+        return memoryview(arr)
+    return view.cast(typecode)
+
+
+class IndexedJSONL(object):
+    """JSON lines file ``path`` with the index ``index_path`` (by default
+    ``path + ".idx"``), both memory-mapped.  Looking up a word decodes
+    only its records.  Raises ValueError if the index is not a valid index
+    or does not match the size of the file.  close() must be called to
+    release the mappings."""
+
+    def __init__(self, path, index_path=None):
+        assert isinstance(path, str)
+        assert index_path is None or isinstance(index_path, str)
+        if index_path is None:
+            index_path = path + ".idx"
+        self.data = map_file(path)
+        self.index = map_file(index_path)
+        if len(self.index) < index_header.size:
+            self.close()
+            raise ValueError("{}: not an index file".format(index_path))
+        magic, count, data_size, keys_size = \
+            index_header.unpack_from(self.index)
+        if magic != index_magic:
+            self.close()
+            raise ValueError("{}: not an index file".format(index_path))
+        if data_size != len(self.data):
+            self.close()
+            raise ValueError("{}: index does not match {}"
+                             .format(index_path, path))
+        self.count = count
+        view = memoryview(self.index)
+        pos = index_header.size
+        self.offsets = le_view(view[pos:pos + 8 * count], "Q")
+        pos += 8 * count
+        self.key_offsets = le_view(view[pos:pos + 4 * (count + 1)], "I")
+        pos += 4 * (count + 1)
+        self.lengths = le_view(view[pos:pos + 4 * count], "I")
+        pos += 4 * count
+        self.keys_start = pos
+        view.release()
+        if len(self.index) != pos + keys_size:
+            self.close()
+            raise ValueError("{}: truncated index".format(index_path))
+
+    def __len__(self):
+        return self.count
+
+    def key(self, i):
+        """Returns the UTF-8 encoded word of the ``i``th index entry."""
+        key_offsets = self.key_offsets
+        start = self.keys_start
+        return self.index[start + key_offsets[i]:start + key_offsets[i + 1]]
+
+    def find(self, word):
+        """Returns the range of index entries for ``word`` as a pair
+        ``(start, end)``; the range is empty if the word is not in the
+        file."""
+        key = word.encode("utf-8")
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = lo
+        while end < self.count and self.key(end) == key:
+            end += 1
+        return lo, end
+
+    def __contains__(self, word):
+        start, end = self.find(word)
+        return start < end
+
+    def raw(self, word):
+        """Returns the list of the records of ``word`` as JSON in bytes, in
+        file order."""
+        start, end = self.find(word)
+        data = self.data
+        ret = []
+        for i in range(start, end):
+            offset = self.offsets[i]
+            ret.append(data[offset:offset + self.lengths[i]])
+        return ret
+
+    def get(self, word):
+        """Returns the list of the records of ``word``, in file order."""
+        return [loads(x) for x in self.raw(word)]
+
+    def close(self):
+        """Releases the memory mappings."""
+        for name in ("offsets", "key_offsets", "lengths"):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        for data in (self.data, self.index):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self.data = self.index = b""
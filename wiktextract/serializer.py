@@ -0,0 +1,58 @@
+# Serialization of extracted records as JSON lines.  This uses orjson if it
+# is installed, and otherwise a single json.JSONEncoder created once and
+# reused for all records, with circular reference checking turned off (the
+# records are trees) and compact separators.  Whole batches are serialized
+# into one bytes object, so that a sink can write them with a single call.
+# The stdlib encoder escapes non-ASCII characters (which makes encoding
+# the result to bytes a plain copy, and is faster overall than producing
+# UTF-8), while orjson writes them as UTF-8; otherwise the output is the
+# same.  ``loads`` decodes a record from bytes with the same backend.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoder used when orjson is not available
+json_encoder = json.JSONEncoder(check_circular=False,
+                                separators=(",", ":"))
+json_encode = json_encoder.encode
+
+
+def json_dumps(data):
+    """Returns the record ``data`` as JSON in bytes, using the json
+    module."""
+    return json_encode(data).encode("ascii")
+
+
+def json_dumps_batch(batch):
+    """Returns the records in ``batch`` as JSON lines in bytes, using the
+    json module."""
+    if not batch:
+        return b""
+    return ("\n".join(map(json_encode, batch)) + "\n").encode("ascii")
+
+
+if orjson is not None:
+    orjson_dumps = orjson.dumps
+    orjson_newline = orjson.OPT_APPEND_NEWLINE
+
+    def orjson_dumps_batch(batch):
+        """Returns the records in ``batch`` as UTF-8 encoded JSON lines,
+        using orjson."""
+        return b"".join([orjson_dumps(data, option=orjson_newline)
+                         for data in batch])
+
+    BACKEND = "orjson"
+    dumps = orjson_dumps
+    dumps_batch = orjson_dumps_batch
+    loads = orjson.loads
+else:
+    BACKEND = "json"
+    dumps = json_dumps
+    dumps_batch = json_dumps_batch
+    loads = json.loads
@@ -0,0 +1,788 @@
+# Output sinks for records extracted from Wiktionary.  A sink receives the
+# records in batches through write_batch() and writes them somewhere (a
+# JSON lines file, standard output, a callback, a multiprocessing queue, an
+# SQLite database, a binary relation graph, or Parquet or Arrow files),
+# serializing them with wiktextract.serializer.  Each sink has its own
+# batching policy (``batch_size`` and ``batch_time``, see
+# wiktionary.RecordBatcher) and counts the records, bytes and batches it
+# has written.  Sinks are passed to parse_wiktionary(), which calls
+# write_batch() and flush(); the caller opens and closes them.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import os
+import re
+import sys
+import gzip
+import json
+import zlib
+import lzma
+import sqlite3
+import functools
+import collections
+import concurrent.futures
+from array import array
+from wiktextract.graph import write_graph
+from wiktextract.jsonlindex import write_index
+from wiktextract.serializer import dumps, dumps_batch, json_encode
+from wiktextract.wiktionary import THESAURUS_RELATIONS, entry_section_map
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class Sink(object):
+    """Base class for output sinks.  Subclasses implement write_batch(),
+    and open(), flush() and close() as needed."""
+
+    def __init__(self, batch_size=1000, batch_time=None):
+        assert isinstance(batch_size, int) and batch_size > 0
+        assert batch_time is None or isinstance(batch_time, (int, float))
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        self.records = 0
+        self.bytes = 0
+        self.batches = 0
+
+    def open(self):
+        """Prepares the sink for writing.  This must be called before
+        write_batch()."""
+        pass
+
+    def write_batch(self, batch):
+        """Writes the records in the list ``batch``."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Pushes out anything buffered by the sink."""
+        pass
+
+    def close(self):
+        """Flushes the sink and releases its resources."""
+        self.flush()
+
+    def foreground(self):
+        """Makes the sink do all its work in the calling thread from now
+        on.  parse_wiktionary() calls this when it has a per-page time
+        budget: the budget's SIGPROF timer counts the CPU time of all
+        threads of the process, so work done by background threads would
+        be charged to the page being parsed."""
+        pass
+
+    def count(self, batch, nbytes):
+        """Updates the counters for a written batch of ``nbytes`` bytes."""
+        self.records += len(batch)
+        self.bytes += nbytes
+        self.batches += 1
+
+    def stats(self):
+        """Returns a dictionary with the number of records, bytes and
+        batches written."""
+        return {"records": self.records, "bytes": self.bytes,
+                "batches": self.batches}
+
+
+class JSONLFileSink(Sink):
+    """Writes records as JSON lines to the file ``path``, which is
+    opened once with a ``buffering`` byte buffer.  Each batch is encoded
+    and written in a single call.  If ``index_path`` is set, the offsets
+    of the records are collected and an index for looking them up by word
+    (see wiktextract.jsonlindex) is written there when the sink is
+    closed."""
+
+    def __init__(self, path, buffering=(1024 * 1024), batch_size=1000,
+                 batch_time=None, index_path=None):
+        super(JSONLFileSink, self).__init__(batch_size, batch_time)
+        assert isinstance(path, str)
+        assert isinstance(buffering, int)
+        assert index_path is None or isinstance(index_path, str)
+        self.path = path
+        self.buffering = buffering
+        self.index_path = index_path
+        self.index = None
+        self.f = None
+
+    def open(self):
+        self.f = open(self.path, "wb", buffering=self.buffering)
+        if self.index_path is not None:
+            self.index = ([], array("Q"), array("I"))
+
+    def write_batch(self, batch):
+        data = dumps_batch(batch)
+        if self.index is not None:
+            words, offsets, lengths = self.index
+            base = self.bytes
+            pos = 0
+            for x in batch:
+                end = data.index(b"\n", pos)
+                words.append(x["word"])
+                offsets.append(base + pos)
+                lengths.append(end - pos)
+                pos = end + 1
+        self.f.write(data)
+        self.count(batch, len(data))
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        if self.index is not None:
+            words, offsets, lengths = self.index
+            self.index = None
+            write_index(self.index_path, words, offsets, lengths,
+                        self.bytes)
+
+
+def zstd_compress(data, level):
+    """Compresses ``data`` into a single zstd frame."""
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# Compression function and default level for each compression method of
+# CompressedJSONLSink.  Each call produces a complete gzip member, xz stream
+# or zstd frame, and the compressors release the GIL while compressing.
+compressors = {
+    "gzip": (lambda data, level: gzip.compress(data, compresslevel=level), 6),
+    "xz": (lambda data, level: lzma.compress(data, preset=level), 6),
+    "zstd": (zstd_compress, 3),
+}
+
+# Compression method for each file name suffix
+compressed_suffixes = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+
+
+class CompressedJSONLSink(JSONLFileSink):
+    """Writes records as JSON lines to the file ``path``, compressed with
+    ``method`` ("gzip", "xz" or "zstd"; zstd requires the zstandard
+    module).  The output is collected into blocks of about ``block_size``
+    bytes, which are compressed independently in a pool of ``threads``
+    threads (by default one per CPU) and written in order as concatenated
+    gzip members, xz streams or zstd frames.  Standard tools decompress
+    such files as a single stream.  At most two blocks per thread are
+    being compressed at a time, which bounds memory use.  With ``threads``
+    0 (or after foreground()), blocks are compressed in the writing
+    thread.  The bytes counted are those of the uncompressed output;
+    stats() also returns ``compressed_bytes``."""
+
+    def __init__(self, path, method, level=None, block_size=(4 * 1024 * 1024),
+                 threads=None, buffering=(1024 * 1024), batch_size=1000,
+                 batch_time=None):
+        super(CompressedJSONLSink, self).__init__(path, buffering,
+                                                  batch_size, batch_time)
+        assert method in compressors
+        assert level is None or isinstance(level, int)
+        assert isinstance(block_size, int) and block_size > 0
+        assert threads is None or (isinstance(threads, int) and threads >= 0)
+        if method == "zstd" and zstandard is None:
+            raise ImportError("zstandard is required for zstd output")
+        compress, default_level = compressors[method]
+        if level is None:
+            level = default_level
+        self.method = method
+        self.compress = functools.partial(compress, level=level)
+        self.block_size = block_size
+        if threads is None:
+            threads = os.cpu_count() or 1
+        self.threads = threads
+        self.pool = None
+        self.blocks = collections.deque()
+        self.pending = []
+        self.pending_size = 0
+        self.compressed_bytes = 0
+
+    def open(self):
+        # Offsets into the compressed file would not be useful
+        assert self.index_path is None
+        super(CompressedJSONLSink, self).open()
+        if self.threads:
+            self.pool = concurrent.futures.ThreadPoolExecutor(self.threads)
+
+    def write_batch(self, batch):
+        data = dumps_batch(batch)
+        self.pending.append(data)
+        self.pending_size += len(data)
+        self.count(batch, len(data))
+        if self.pending_size >= self.block_size:
+            self.submit()
+            while len(self.blocks) > 2 * self.threads:
+                self.write_block()
+
+    def submit(self):
+        """Starts compressing the pending output as a block."""
+        if not self.pending:
+            return
+        block = b"".join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        if self.pool is None:
+            data = self.compress(block)
+            self.f.write(data)
+            self.compressed_bytes += len(data)
+        else:
+            self.blocks.append(self.pool.submit(self.compress, block))
+
+    def write_block(self):
+        """Waits for the oldest block to be compressed and writes it.  The
+        block is removed from the queue only once it has been written, so
+        it is not lost if waiting is interrupted."""
+        data = self.blocks[0].result()
+        self.f.write(data)
+        self.blocks.popleft()
+        self.compressed_bytes += len(data)
+
+    def foreground(self):
+        self.threads = 0
+        if self.pool is not None:
+            while self.blocks:
+                self.write_block()
+            self.pool.shutdown()
+            self.pool = None
+
+    def flush(self):
+        if self.f is None:
+            return
+        self.submit()
+        while self.blocks:
+            self.write_block()
+        self.f.flush()
+
+    def close(self):
+        if self.f is None:
+            return
+        try:
+            self.flush()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            super(CompressedJSONLSink, self).close()
+
+    def stats(self):
+        ret = super(CompressedJSONLSink, self).stats()
+        ret["compressed_bytes"] = self.compressed_bytes
+        return ret
+
+
+class StdoutSink(Sink):
+    """Writes records as JSON lines to standard output.  Output is
+    flushed after every batch, and by default a batch is passed on once a
+    second has passed since its first record (as checked when records
+    arrive and at the start of each page, see RecordBatcher), so that
+    records are seen promptly by a consumer reading a pipe."""
+
+    def __init__(self, batch_size=1000, batch_time=1.0):
+        super(StdoutSink, self).__init__(batch_size, batch_time)
+
+    def write_batch(self, batch):
+        data = dumps_batch(batch)
+        # Anything printed as text must come out before the records
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+        self.count(batch, len(data))
+
+
+class CallableSink(Sink):
+    """Passes each batch of records (a list of dictionaries) to
+    ``batch_cb``.  The records are not serialized, so no bytes are
+    counted."""
+
+    def __init__(self, batch_cb, batch_size=1000, batch_time=None):
+        super(CallableSink, self).__init__(batch_size, batch_time)
+        assert callable(batch_cb)
+        self.batch_cb = batch_cb
+
+    def write_batch(self, batch):
+        self.batch_cb(batch)
+        self.count(batch, 0)
+
+
+class QueueSink(Sink):
+    """Puts each batch of records on the multiprocessing queue ``queue``
+    as a single bytes object containing the records as JSON lines, which
+    is much cheaper to pickle than the dictionaries.  When the sink is
+    closed, None is put on the queue to mark the end of the records."""
+
+    def __init__(self, queue, batch_size=1000, batch_time=None):
+        super(QueueSink, self).__init__(batch_size, batch_time)
+        self.queue = queue
+
+    def write_batch(self, batch):
+        data = dumps_batch(batch)
+        self.queue.put(data)
+        self.count(batch, len(data))
+
+    def close(self):
+        self.queue.put(None)
+
+
+# Fields of word entries that contain linkages to other words.  Their
+# targets are stored as relations by SQLiteSink, like the relations of
+# thesaurus entries.
+linkage_fields = tuple(sorted(set(field for kind, field
+                                  in entry_section_map.values()
+                                  if kind in ("linkage", "compounds"))))
+
+def record_word(data):
+    """Returns the word of the record ``data``.  For thesaurus entries, this
+    is the page title without the "Thesaurus:" prefix."""
+    word = data["word"]
+    if word.startswith("Thesaurus:"):
+        return word[10:]
+    return word
+
+
+def record_targets(data):
+    """Returns a list of ``(relation, target, sense, gloss, tags)`` tuples
+    for the relation targets in the record ``data``.  These are the
+    relations of thesaurus entries (named as in THESAURUS_RELATIONS), the
+    linkages of word entries (named by their fields, e.g. "synonyms") and
+    redirects (named "redirect").  ``sense`` is the sense of the source
+    word, ``gloss`` the gloss given for the target, and ``tags`` its list
+    of tags; each may be None."""
+    ret = []
+    if "redirect" in data:
+        ret.append(("redirect", data["redirect"], None, None, None))
+    elif data["word"].startswith("Thesaurus:"):
+        for sense in data["senses"]:
+            gloss = sense.get("sense")
+            for rel in THESAURUS_RELATIONS:
+                for x in sense.get(rel, ()):
+                    ret.append((rel, x["word"], gloss, x.get("gloss"),
+                                x.get("tags")))
+    else:
+        for field in linkage_fields:
+            for x in data.get(field, ()):
+                ret.append((field, x["word"], x.get("sense"), None,
+                            x.get("tags")))
+    return ret
+
+
+# Schema of the database written by SQLiteSink
+sqlite_schema = """
+CREATE TABLE words (id INTEGER PRIMARY KEY, word TEXT NOT NULL);
+CREATE TABLE relations (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE entries (id INTEGER PRIMARY KEY,
+                      word_id INTEGER NOT NULL REFERENCES words(id),
+                      lang TEXT, pos TEXT, data TEXT NOT NULL);
+CREATE TABLE targets (entry_id INTEGER NOT NULL REFERENCES entries(id),
+                      word_id INTEGER NOT NULL REFERENCES words(id),
+                      relation_id INTEGER NOT NULL REFERENCES relations(id),
+                      target_id INTEGER NOT NULL REFERENCES words(id),
+                      sense TEXT, gloss TEXT, tags TEXT);
+"""
+
+# Indexes created by SQLiteSink once all records have been loaded
+sqlite_indexes = """
+CREATE UNIQUE INDEX words_word ON words(word);
+CREATE UNIQUE INDEX relations_name ON relations(name);
+CREATE INDEX entries_word ON entries(word_id);
+CREATE INDEX targets_word ON targets(word_id, relation_id);
+CREATE INDEX targets_target ON targets(target_id, relation_id);
+"""
+
+
+class SQLiteSink(Sink):
+    """Writes records to the SQLite database ``path``, replacing any
+    existing file.  Each distinct word and relation target is stored once
+    in ``words`` and each relation name once in ``relations``; other
+    tables refer to them by integer id.  ``entries`` has a row for each
+    record, with the record as JSON in ``data``.  ``targets`` has a row
+    for each relation target: the relations of thesaurus entries (named
+    as in THESAURUS_RELATIONS), the linkages of word entries (named by
+    their fields, e.g. "synonyms") and redirects (named "redirect").
+    Thesaurus entries are stored under the word without the "Thesaurus:"
+    prefix, so that they share the word id with the word's entries.
+
+    Rows are inserted with executemany() in transactions of at least
+    ``commit_records`` records, with the write-ahead log enabled and
+    synchronous writes turned off during the load.  The indexes are
+    created when the sink is closed, and the database is left as a single
+    file."""
+
+    def __init__(self, path, batch_size=10000, batch_time=None,
+                 commit_records=100000):
+        super(SQLiteSink, self).__init__(batch_size, batch_time)
+        assert isinstance(path, str)
+        assert isinstance(commit_records, int)
+        self.path = path
+        self.commit_records = commit_records
+        self.conn = None
+        self.word_ids = {}
+        self.relation_ids = {}
+        self.uncommitted = 0
+
+    def open(self):
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.executescript(sqlite_schema)
+        self.conn.execute("BEGIN")
+
+    def write_batch(self, batch):
+        word_ids = self.word_ids
+        relation_ids = self.relation_ids
+        new_words = []
+        new_relations = []
+        entries = []
+        targets = []
+        nbytes = 0
+
+        def word_id(word):
+            i = word_ids.get(word)
+            if i is None:
+                i = len(word_ids) + 1
+                word_ids[word] = i
+                new_words.append((i, word))
+            return i
+
+        def relation_id(name):
+            i = relation_ids.get(name)
+            if i is None:
+                i = len(relation_ids) + 1
+                relation_ids[name] = i
+                new_relations.append((i, name))
+            return i
+
+        entry_id = self.records
+        for data in batch:
+            entry_id += 1
+            wid = word_id(record_word(data))
+            text = dumps(data)
+            nbytes += len(text)
+            entries.append((entry_id, wid, data.get("lang"),
+                            data.get("pos"), text.decode("utf-8")))
+            for rel, target, sense, gloss, tags in record_targets(data):
+                targets.append((entry_id, wid, relation_id(rel),
+                                word_id(target), sense, gloss,
+                                json_encode(tags) if tags else None))
+
+        conn = self.conn
+        if new_words:
+            conn.executemany("INSERT INTO words VALUES (?, ?)", new_words)
+        if new_relations:
+            conn.executemany("INSERT INTO relations VALUES (?, ?)",
+                             new_relations)
+        conn.executemany("INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                         entries)
+        conn.executemany("INSERT INTO targets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         targets)
+        self.count(batch, nbytes)
+        self.uncommitted += len(batch)
+        if self.uncommitted >= self.commit_records:
+            self.flush()
+
+    def flush(self):
+        if self.conn is not None:
+            self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+            self.uncommitted = 0
+
+    def close(self):
+        if self.conn is None:
+            return
+        conn = self.conn
+        self.conn = None
+        conn.execute("COMMIT")
+        conn.executescript(sqlite_indexes)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+
+class GraphSink(Sink):
+    """Collects the relation targets of the records (see record_targets())
+    and, when closed, writes them into the directory ``path`` as a graph
+    in compressed sparse row form with a sorted string table (see
+    wiktextract.graph), which wiktextract.graph.Graph loads by
+    memory-mapping.  Source words are named as by record_word().  Edges
+    are kept in arrays of 32-bit ids until the sink is closed; the bytes
+    counted are those of the files written."""
+
+    def __init__(self, path, batch_size=10000, batch_time=None):
+        super(GraphSink, self).__init__(batch_size, batch_time)
+        assert isinstance(path, str)
+        self.path = path
+        self.word_ids = {}
+        self.edges = {}
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def write_batch(self, batch):
+        word_ids = self.word_ids
+        edges = self.edges
+        for data in batch:
+            word = record_word(data)
+            src = word_ids.setdefault(word, len(word_ids))
+            for rel, target, sense, gloss, tags in record_targets(data):
+                pair = edges.get(rel)
+                if pair is None:
+                    pair = edges[rel] = (array("I"), array("I"))
+                pair[0].append(src)
+                pair[1].append(word_ids.setdefault(target, len(word_ids)))
+        self.count(batch, 0)
+
+    def close(self):
+        if self.word_ids is None:
+            return
+        self.bytes += write_graph(self.path, self.word_ids, self.edges)
+        self.word_ids = None
+        self.edges = None
+
+
+class ArrowSink(Sink):
+    """Writes the relation targets of the records (see record_targets()) in
+    columnar form to ``path``: as a Parquet file if ``format`` is
+    "parquet", or as an Arrow IPC stream if it is "arrow".  There is a row
+    for each target, with the string columns ``word`` (as by
+    record_word()), ``relation``, ``target``, ``sense`` and ``lang`` (the
+    last two may be null; thesaurus entries are English).  Each batch of
+    records is converted into one Arrow record batch and written
+    immediately (as a row group in Parquet), so memory use is bounded by
+    the batch size.  The bytes counted are the size of the file written.
+    Requires pyarrow."""
+
+    def __init__(self, path, format="parquet", batch_size=10000,
+                 batch_time=None):
+        super(ArrowSink, self).__init__(batch_size, batch_time)
+        assert isinstance(path, str)
+        assert format in ("parquet", "arrow")
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for {} output"
+                              .format(format))
+        self.path = path
+        self.format = format
+        self.schema = pyarrow.schema([("word", pyarrow.string()),
+                                      ("relation", pyarrow.string()),
+                                      ("target", pyarrow.string()),
+                                      ("sense", pyarrow.string()),
+                                      ("lang", pyarrow.string())])
+        self.f = None
+        self.writer = None
+
+    def open(self):
+        if self.format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(self.path,
+                                                        self.schema)
+        else:
+            self.f = pyarrow.OSFile(self.path, "wb")
+            self.writer = pyarrow.ipc.new_stream(self.f, self.schema)
+
+    def write_batch(self, batch):
+        words = []
+        relations = []
+        targets = []
+        senses = []
+        langs = []
+        for data in batch:
+            word = record_word(data)
+            if data["word"].startswith("Thesaurus:"):
+                lang = "English"
+            else:
+                lang = data.get("lang")
+            for rel, target, sense, gloss, tags in record_targets(data):
+                words.append(word)
+                relations.append(rel)
+                targets.append(target)
+                senses.append(sense)
+                langs.append(lang)
+        if words:
+            self.writer.write_batch(pyarrow.record_batch(
+                [words, relations, targets, senses, langs],
+                schema=self.schema))
+        self.count(batch, 0)
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        self.bytes = os.path.getsize(self.path)
+
+
+# Characters not allowed in partition file names
+partition_name_re = re.compile(r"[^-\w.]")
+
+
+def relation_rows(data):
+    """Returns a list of dictionaries, one for each relation target in the
+    record ``data``, with the keys ``word`` (as by record_word()),
+    ``relation``, ``target`` and, when present, ``sense``, ``gloss``,
+    ``tags`` and ``lang``.  Thesaurus entries are English."""
+    word = record_word(data)
+    if data["word"].startswith("Thesaurus:"):
+        lang = "English"
+    else:
+        lang = data.get("lang")
+    ret = []
+    for rel, target, sense, gloss, tags in record_targets(data):
+        row = {"word": word, "relation": rel, "target": target}
+        if sense:
+            row["sense"] = sense
+        if gloss:
+            row["gloss"] = gloss
+        if tags:
+            row["tags"] = tags
+        if lang:
+            row["lang"] = lang
+        ret.append(row)
+    return ret
+
+
+class PartitionedSink(Sink):
+    """Writes records as JSON lines into files in the directory ``path``,
+    one file per partition, each through its own sink with its own buffer
+    (as created by make_sink() for ``prefix + name + suffix``, so a
+    ".json.gz" suffix gives compressed partitions).  ``partition`` selects
+    the partitioning:
+
+    * "lang": by the language of the record (thesaurus entries are
+      English; records without a language, i.e. redirects, go to "none")
+    * "char": by the first character of the word (as by record_word()),
+      lowercased; words not starting with an ASCII letter or digit go to
+      "other"
+    * "hash": into ``partitions`` buckets by a hash (CRC-32) of the word,
+      which is the same across runs and machines
+    * "relation": by relation; instead of records, this writes one row
+      per relation target (see relation_rows()), as a record may have
+      many relations.  Records without relations are not written.
+
+    When the sink is closed, ``manifest.json`` is written into the
+    directory, listing the partitions with their file names and record
+    and byte counts."""
+
+    def __init__(self, path, partition, partitions=16, suffix=".json",
+                 batch_size=1000, batch_time=None):
+        super(PartitionedSink, self).__init__(batch_size, batch_time)
+        assert isinstance(path, str)
+        assert partition in ("lang", "char", "hash", "relation")
+        assert isinstance(partitions, int) and partitions > 0
+        assert isinstance(suffix, str)
+        self.path = path
+        self.partition = partition
+        self.partitions = partitions
+        self.suffix = suffix
+        self.sinks = {}
+        self.in_foreground = False
+
+    def open(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def partition_name(self, data):
+        """Returns the name of the partition for the record ``data``."""
+        if self.partition == "lang":
+            if data["word"].startswith("Thesaurus:"):
+                return "English"
+            return data.get("lang") or "none"
+        word = record_word(data)
+        if self.partition == "char":
+            c = word[:1].lower()
+            if "a" <= c <= "z" or "0" <= c <= "9":
+                return c
+            return "other"
+        bucket = zlib.crc32(word.encode("utf-8")) % self.partitions
+        return "{:0{}d}".format(bucket, len(str(self.partitions - 1)))
+
+    def write_batch(self, batch):
+        parts = collections.defaultdict(list)
+        if self.partition == "relation":
+            for data in batch:
+                for row in relation_rows(data):
+                    parts[row["relation"]].append(row)
+        else:
+            for data in batch:
+                parts[self.partition_name(data)].append(data)
+        nbytes = 0
+        for name, records in parts.items():
+            sink = self.sinks.get(name)
+            if sink is None:
+                file_name = partition_name_re.sub("_", name) + self.suffix
+                sink = make_sink("jsonl:" + os.path.join(self.path,
+                                                         file_name))
+                sink.file_name = file_name
+                if self.in_foreground:
+                    sink.foreground()
+                sink.open()
+                self.sinks[name] = sink
+            old = sink.bytes
+            sink.write_batch(records)
+            nbytes += sink.bytes - old
+        self.count(batch, nbytes)
+
+    def flush(self):
+        for sink in self.sinks.values():
+            sink.flush()
+
+    def foreground(self):
+        self.in_foreground = True
+        for sink in self.sinks.values():
+            sink.foreground()
+
+    def close(self):
+        if self.sinks is None:
+            return
+        parts = []
+        for name, sink in sorted(self.sinks.items()):
+            sink.close()
+            parts.append({"name": name, "file": sink.file_name,
+                          "records": sink.records, "bytes": sink.bytes})
+        self.sinks = None
+        with open(os.path.join(self.path, "manifest.json"), "w") as f:
+            json.dump({"partition": self.partition, "partitions": parts},
+                      f, indent=1)
+
+
+def make_sink(spec):
+    """Creates a sink from the command-line specification ``spec``, which
+    is "stdout" (or "-"), "jsonl:PATH", "sqlite:PATH", "graph:DIR",
+    "parquet:PATH", "arrow:PATH" or "partition:KEY:DIR".  JSON lines are
+    compressed if PATH ends in ".gz", ".xz" or ".zst".  KEY is "lang",
+    "char", "relation" or "hash" optionally followed by the number of
+    partitions (e.g., "hash64"; the default is 16).  Raises ValueError
+    if ``spec`` is not recognized, and ImportError if the sink requires a
+    module that is not installed."""
+    assert isinstance(spec, str)
+    if spec in ("stdout", "-"):
+        return StdoutSink()
+    kind, sep, arg = spec.partition(":")
+    if kind == "jsonl" and arg:
+        method = compressed_suffixes.get(os.path.splitext(arg)[1])
+        if method is not None:
+            return CompressedJSONLSink(arg, method)
+        return JSONLFileSink(arg)
+    if kind == "sqlite" and arg:
+        return SQLiteSink(arg)
+    if kind == "graph" and arg:
+        return GraphSink(arg)
+    if kind in ("parquet", "arrow") and arg:
+        return ArrowSink(arg, kind)
+    if kind == "partition":
+        key, sep, path = arg.partition(":")
+        m = re.match(r"^hash(\d*)$", key)
+        if m and path and m.group(1) != "0":
+            return PartitionedSink(path, "hash", int(m.group(1) or 16))
+        if key in ("lang", "char", "relation") and path:
+            return PartitionedSink(path, key)
+    raise ValueError("invalid sink: {!r}".format(spec))
@@ -0,0 +1,68 @@
+import time
+import unittest
+from wiktextract import adversarial
+
+
+class AdversarialTests(unittest.TestCase):
+
+    def test_corpus(self):
+        corpus = adversarial.adversarial_corpus(sizes=(2, 8), fuzz_count=3)
+        self.assertEqual(corpus, adversarial.adversarial_corpus(sizes=(2, 8),
+                                                                fuzz_count=3))
+        names = set(x[0] for x in corpus)
+        self.assertIn("double-brackets {{w|", names)
+        self.assertIn("fuzz-2", names)
+        self.assertEqual(len(corpus),
+                         2 * (len(adversarial.corpus_patterns) *
+                              len(adversarial.corpus_prefixes) + 3))
+        self.assertIn(("double-brackets {{w|", 2, "{{w|[[a]][[a]]"), corpus)
+
+    def test_linear_passes(self):
+        failures = adversarial.check_linear(lambda x: x.split("|"))
+        self.assertEqual(failures, [])
+
+    def test_quadratic_fails(self):
+        def quadratic(text):
+            for i in range(len(text)):
+                for j in range(i):
+                    pass
+        corpus = [(name, n, text) for name, n, text in
+                  adversarial.adversarial_corpus(sizes=(16, 4096),
+                                                 fuzz_count=0)
+                  if name == "pipes {{w|"]
+        failures = adversarial.check_linear(quadratic, corpus=corpus)
+        self.assertTrue(failures)
+
+    def test_quadratic_default(self):
+        # Quadratic functions that are fast on short inputs fail with the
+        # default sizes and settings
+        corpus = [(name, n, text) for name, n, text in
+                  adversarial.adversarial_corpus()
+                  if name.startswith("double-brackets ")]
+        for fn in (lambda t: sum(t.count("a", 0, i) for i in range(len(t))),
+                   lambda t: [t[:i] for i in range(len(t))]):
+            failures = adversarial.check_linear(fn, corpus=corpus)
+            self.assertTrue(failures)
+            self.assertTrue(all(x["n"] >= 256 for x in failures))
+
+    def test_regex_timeout(self):
+        # clean_arg1_re backtracks exponentially on these inputs
+        corpus = [(name, n, text) for name, n, text in
+                  adversarial.adversarial_corpus(sizes=(4, 64), fuzz_count=0)
+                  if name == "double-brackets {{w|"]
+        start = time.time()
+        failures = adversarial.check_linear(
+            adversarial.clean_targets["clean_arg1_re"], corpus=corpus,
+            timeout=0.2)
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual([(x["n"], x["seconds"]) for x in failures],
+                         [(64, None)])
+
+    def test_clean_targets(self):
+        # The substitutions must keep the argument that clean_value() keeps
+        for name, text in (("clean_arg1_re", "x {{w|word}} y"),
+                           ("clean_arg2_re", "x {{l|en|word}} y"),
+                           ("clean_arg3_re", "x {{w2|a|b|word}} y")):
+            self.assertEqual(adversarial.clean_targets[name](text), "x word y")
+            self.assertEqual(adversarial.clean_targets["clean_value"](text),
+                             "x word y")
@@ -0,0 +1,467 @@
+import io
+import os
+import time
+import unittest
+import tempfile
+import itertools
+from lxml import etree
+from wiktextract import wiktionary
+from wiktextract import tokenizer
+from wiktextract import adversarial
+
+PAGE = """{{also|Test}}
+==English==
+===Etymology===
+From {{der|en|la|testum}}.
+
+===Pronunciation===
+* {{a|UK}} {{IPA|/tɛst/|lang=en}}
+* {{audio|en|en-us-test.ogg|Audio (US)}}
+* {{enPR|tĕst}}
+
+===Noun===
+{{en-noun}}
+
+# A [[challenge]], [[trial]].
+#* {{quote-book|year=2000|passage=A '''test'''.}}
+#: An example.
+# {{lb|en|education|_|chiefly}} An [[examination]].
+## A short examination.
+
+====Synonyms====
+* {{sense|challenge}} {{l|en|trial}}, [[exam]] {{q|informal}}
+* See also [[Thesaurus:test]].
+
+====Derived terms====
+{{der3|en|retest|pretest<q:rare>}}
+
+====Translations====
+{{trans-top|challenge}}
+* Finnish: {{t+|fi|koe}}, {{t|fi|testi|alt=testi-}}
+* Russian: {{t+|ru|тест|m|tr=test}}
+{{trans-bottom}}
+
+===Verb===
+{{en-verb}}
+
+# To [[challenge]].
+
+====Compounds====
+* {{l|en|test tube}}
+
+==Finnish==
+===Noun===
+{{fi-noun}}
+
+# [[test]]
+
+====Declension====
+{{fi-decl-valo|tes|t|t|a}}
+"""
+
+
+class EntryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.words = []
+
+    def make_ctx(self, languages=["English"], flags=False, glosses=None):
+        if glosses is None:
+            glosses = flags
+        return wiktionary.WiktionaryTarget(self.words.append, None,
+                                           languages, flags, flags,
+                                           flags, flags, False,
+                                           capture_glosses=glosses,
+                                           capture_conjugations=flags)
+
+    def test_sections(self):
+        sections = wiktionary.page_sections(PAGE)
+        self.assertEqual([x[:2] for x in sections[:4]],
+                         [(2, "English"), (3, "Etymology"),
+                          (3, "Pronunciation"), (3, "Noun")])
+        level, title, start, end = sections[1]
+        self.assertEqual(PAGE[start:end], "\nFrom {{der|en|la|testum}}.\n")
+        self.assertEqual(sections[-1][3], len(PAGE))
+
+    def test_sections_not_header(self):
+        text = "==A==\nx\n" + "=" * 2000 + "x\n=== B === \n"
+        self.assertEqual(wiktionary.page_sections(text),
+                         [(2, "A", 5, 2009), (3, "B", 2020, 2021)])
+
+    def test_sections_linear(self):
+        failures = adversarial.check_linear(wiktionary.page_sections)
+        self.assertEqual(failures, [])
+
+    def test_glosses_tokenized_once(self):
+        text = "# {{lb|en|rare}} A [[word]].\n#: An example.\n"
+        calls = []
+        orig = tokenizer.tokenize
+
+        def tokenize(*args):
+            calls.append(args)
+            return orig(*args)
+
+        tokenizer.tokenize = tokenize
+        try:
+            senses = wiktionary.parse_glosses(text, 0, len(text))
+        finally:
+            tokenizer.tokenize = orig
+        self.assertEqual(senses, [{"glosses": ["A word."],
+                                   "tags": ["rare"]}])
+        self.assertEqual(len(calls), 1)
+
+    def test_defaults(self):
+        ctx = self.make_ctx()
+        ret = wiktionary.parse_text("test", PAGE, ctx)
+        self.assertEqual(ret, self.words)
+        self.assertEqual(ret, [{"word": "test", "lang": "English",
+                                "pos": "noun"},
+                               {"word": "test", "lang": "English",
+                                "pos": "verb"}])
+
+    def test_glosses(self):
+        ctx = self.make_ctx(glosses=True)
+        ret = wiktionary.parse_text("test", PAGE, ctx)
+        self.assertEqual([(x["lang"], x["pos"]) for x in ret],
+                         [("English", "noun"), ("English", "verb")])
+        noun = ret[0]
+        self.assertEqual(noun["senses"],
+                         [{"glosses": ["A challenge, trial."]},
+                          {"glosses": ["An examination."],
+                           "tags": ["education", "chiefly"]},
+                          {"glosses": ["A short examination."]}])
+        for k in ("pronunciations", "synonyms", "derived", "translations"):
+            self.assertNotIn(k, noun)
+        self.assertNotIn("compounds", ret[1])
+
+    def test_languages(self):
+        ctx = self.make_ctx(languages=["Finnish"], flags=True)
+        ret = wiktionary.parse_text("test", PAGE, ctx)
+        self.assertEqual(len(ret), 1)
+        self.assertEqual(ret[0]["senses"], [{"glosses": ["test"]}])
+        self.assertEqual(ret[0]["conjugation"],
+                         [{"template_name": "fi-decl-valo", "1": "tes",
+                           "2": "t", "3": "t", "4": "a"}])
+        self.assertEqual(ctx.language_counts["English"], 1)
+
+    def test_all(self):
+        ctx = self.make_ctx(flags=True)
+        noun, verb = wiktionary.parse_text("test", PAGE, ctx)
+        self.assertEqual(noun["pronunciations"],
+                         [{"accent": ["UK"], "ipa": [("en", "/tɛst/")]},
+                          {"audios": [("en", "en-us-test.ogg",
+                                       "Audio (US)")]},
+                          {"enpr": ["tĕst"]}])
+        self.assertEqual(verb["pronunciations"], noun["pronunciations"])
+        self.assertEqual(noun["synonyms"],
+                         [{"word": "trial", "sense": "challenge",
+                           "tags": ["informal"]},
+                          {"word": "exam", "sense": "challenge",
+                           "tags": ["informal"]},
+                          {"word": "Thesaurus:test"}])
+        self.assertEqual(noun["derived"],
+                         [{"word": "retest"}, {"word": "pretest"}])
+        self.assertEqual(noun["translations"],
+                         [{"lang": "fi", "word": "koe",
+                           "sense": "challenge"},
+                          {"lang": "fi", "word": "testi",
+                           "sense": "challenge", "alt": "testi-"},
+                          {"lang": "ru", "word": "тест",
+                           "sense": "challenge", "roman": "test",
+                           "tags": ["m"]}])
+        self.assertEqual(verb["compounds"], [{"word": "test tube"}])
+        self.assertNotIn("translations", verb)
+
+    def test_skipped_sections(self):
+        # Only gloss lines and the sections of captured kinds are tokenized
+        ranges = []
+        orig = tokenizer.tokenize
+
+        def tokenize(text, pos=0, endpos=None):
+            ranges.append(text[pos:endpos])
+            return orig(text, pos, endpos)
+
+        tokenizer.tokenize = tokenize
+        try:
+            ctx = self.make_ctx(glosses=True)
+            wiktionary.parse_text("test", PAGE, ctx)
+            self.assertTrue(ranges)
+            self.assertFalse(any("{{t+|" in x or "quote-book" in x or
+                                 "{{IPA|" in x for x in ranges))
+            self.assertNotIn("fi-decl-valo", "".join(ranges))
+            # Nothing is tokenized with the defaults
+            del ranges[:]
+            ctx = self.make_ctx(languages=["English", "Finnish"])
+            wiktionary.parse_text("test", PAGE, ctx)
+            self.assertEqual(ranges, [])
+        finally:
+            tokenizer.tokenize = orig
+
+    def test_namespace(self):
+        ctx = self.make_ctx()
+        ctx.namespace_names.add("Wiktionary")
+        self.assertIsNone(wiktionary.parse_text("Wiktionary:test", PAGE,
+                                                ctx))
+        self.assertEqual(len(wiktionary.parse_text("A:B", PAGE, ctx)), 2)
+
+    def test_many(self):
+        ctx = self.make_ctx()
+        ret = wiktionary.parse_text_many([("test", PAGE)], ctx)
+        self.assertEqual(len(ret), 2)
+        self.assertEqual(self.words, [])
+        self.assertEqual(wiktionary.parse_text_many([("test", PAGE)]), [])
+
+
+XML = """<mediawiki><siteinfo><namespaces>
+<namespace key="0" />
+<namespace key="4">Wiktionary</namespace>
+<namespace key="110">Thesaurus</namespace>
+</namespaces></siteinfo>
+<page><title>test</title><id>1</id><revision><id>2</id>
+<model>wikitext</model><format>text/x-wiki</format>
+<text xml:space="preserve">{}</text></revision></page>
+<page><title>Wiktionary:test</title><id>3</id><revision><id>4</id>
+<model>wikitext</model><format>text/x-wiki</format>
+<text xml:space="preserve">{}</text></revision></page>
+<page><title>tests</title><id>5</id><revision><id>6</id>
+<model>wikitext</model><format>text/x-wiki</format>
+<text xml:space="preserve">  #REDIRECT [[test]]</text></revision></page>
+</mediawiki>
+""".format(PAGE.replace("&", "&amp;").replace("<", "&lt;"),
+           PAGE.replace("&", "&amp;").replace("<", "&lt;"))
+
+
+class PageTextTests(unittest.TestCase):
+
+    def test_page_text(self):
+        page = wiktionary.PageText(["  ", "\n#RED", "IRECT [[x]] ", "\n"])
+        self.assertEqual(page.prefix(5), "#REDI")
+        self.assertIsNone(page.text)
+        self.assertEqual(str(page), "#REDIRECT [[x]]")
+        self.assertIsNone(page.chunks)
+        self.assertEqual(page.prefix(3), "#RE")
+
+    def test_lazy(self):
+        words = []
+        joined = []
+        orig = wiktionary.PageText.__str__
+
+        def page_str(page):
+            if page.text is None:
+                joined.append(page.prefix(20))
+            return orig(page)
+
+        ctx = wiktionary.WiktionaryTarget(words.append, None, ["English"],
+                                          False, False, False, False, True)
+        wiktionary.PageText.__str__ = page_str
+        try:
+            parser = etree.XMLParser(target=ctx)
+            etree.parse(io.BytesIO(XML.encode("utf-8")), parser)
+        finally:
+            wiktionary.PageText.__str__ = orig
+        self.assertEqual([(x["word"], x.get("pos")) for x in words],
+                         [("test", "noun"), ("test", "verb"),
+                          ("tests", None)])
+        self.assertEqual(words[-1]["redirect"], "test")
+        # The Wiktionary: page was never joined
+        self.assertEqual(len(joined), 2)
+
+
+class DumpTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "pages.xml")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(XML)
+        self.files = []
+        self.orig = wiktionary.open_dump
+
+        def open_dump(path):
+            f = self.orig(path)
+            self.files.append(f)
+            return f
+
+        wiktionary.open_dump = open_dump
+
+    def tearDown(self):
+        wiktionary.open_dump = self.orig
+        self.tmpdir.cleanup()
+
+    def test_iter(self):
+        ret = list(wiktionary.iter_wiktionary(self.path, redirects=True,
+                                              chunk_size=100))
+        words = []
+        wiktionary.parse_wiktionary(self.path, words.append, redirects=True)
+        self.assertEqual(ret, words)
+        self.assertEqual(len(ret), 3)
+        self.assertTrue(all(f.closed for f in self.files))
+
+    def test_dump(self):
+        path = os.path.join(os.path.dirname(__file__),
+                            "test-pages-articles.xml.bz2")
+        words = []
+        wiktionary.parse_wiktionary(path, words.append, linkages=True)
+        self.assertEqual(list(wiktionary.iter_wiktionary(path,
+                                                         linkages=True)),
+                         words)
+
+    def test_early_close(self):
+        it = wiktionary.iter_wiktionary(self.path, chunk_size=100)
+        first = next(it)
+        self.assertEqual((first["word"], first["pos"]), ("test", "noun"))
+        f, = self.files
+        self.assertFalse(f.closed)
+        # The pages after the first one have not been read yet
+        self.assertLess(f.tell(), len(XML.encode("utf-8")))
+        for x in itertools.islice(it, 1):
+            pass
+        it.close()
+        self.assertTrue(f.closed)
+
+    def test_early_close_parser(self):
+        parsers = []
+
+        class Parser(etree.XMLParser):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+                self.closed = False
+                parsers.append(self)
+
+            def close(self):
+                self.closed = True
+                return super().close()
+
+        orig = wiktionary.etree.XMLParser
+        wiktionary.etree.XMLParser = Parser
+        try:
+            it = wiktionary.iter_wiktionary(self.path, chunk_size=100)
+            next(it)
+            it.close()
+            list(wiktionary.iter_wiktionary(self.path, chunk_size=100))
+        finally:
+            wiktionary.etree.XMLParser = orig
+        self.assertEqual([x.closed for x in parsers], [True, True])
+
+    def test_batch(self):
+        words = []
+        wiktionary.parse_wiktionary(self.path, words.append, redirects=True)
+        batches = []
+        wiktionary.parse_wiktionary(self.path, redirects=True,
+                                    batch_cb=batches.append, batch_size=2)
+        self.assertEqual([len(x) for x in batches], [2, 1])
+        self.assertEqual(batches[0] + batches[1], words)
+
+    def test_batch_time(self):
+        batches = []
+        batcher = wiktionary.RecordBatcher(batches.append, 100, 0)
+        batcher(1)
+        batcher(2)
+        batcher(3)
+        batcher.flush()
+        self.assertEqual(batches, [[1, 2], [3]])
+        self.assertEqual(batcher.batch_count, 2)
+        batcher.flush()
+        self.assertEqual(len(batches), 2)
+
+    def test_batch_tick(self):
+        # A batch is passed on at the next page even if that page produces
+        # no records
+        page = ("<page><title>{}</title><revision><model>wikitext</model>"
+                "<text>=={}==\n===Noun===\n# A word.</text>"
+                "</revision></page>")
+        with open(self.path, "w") as f:
+            f.write("<mediawiki>{}{}{}</mediawiki>".format(
+                page.format("w0", "English"), page.format("x", "Finnish"),
+                page.format("w1", "English")))
+        batches = []
+
+        def batch_cb(batch):
+            batches.append([x["word"] for x in batch])
+
+        wiktionary.parse_wiktionary(self.path, batch_cb=batch_cb,
+                                    batch_size=100, batch_time=0)
+        self.assertEqual(batches, [["w0"], ["w1"]])
+
+    def test_batch_error(self):
+        batches = []
+
+        def batch_cb(batch):
+            if not batches:
+                batches.append(None)
+                raise IOError("full")
+            batches.append(batch)
+
+        batcher = wiktionary.RecordBatcher(batch_cb, 2)
+        batcher(1)
+        with self.assertRaises(IOError):
+            batcher(2)
+        batcher(3)
+        self.assertEqual(batches, [None, [1, 2, 3]])
+
+    def test_slow_consumer(self):
+        # Time used by the consumer of the records is not charged to the
+        # page that happens to fill a batch
+        pages = "".join("<page><title>w{}</title><revision>"
+                        "<model>wikitext</model><text>==English==\n"
+                        "===Noun===\n# A word.</text></revision></page>"
+                        .format(i) for i in range(10))
+        with open(self.path, "w") as f:
+            f.write("<mediawiki>{}</mediawiki>".format(pages))
+        batches = []
+
+        def batch_cb(batch):
+            start = time.process_time()
+            while time.process_time() - start < 0.3:
+                pass
+            batches.append(batch)
+
+        ctx = wiktionary.parse_wiktionary(self.path, batch_cb=batch_cb,
+                                          batch_size=3, page_timeout=0.1)
+        self.assertEqual(ctx.quarantine_count, 0)
+        self.assertEqual([x["word"] for batch in batches for x in batch],
+                         ["w{}".format(i) for i in range(10)])
+
+
+class NormalizeTests(unittest.TestCase):
+
+    def test_ascii(self):
+        self.assertEqual(wiktionary.normalize_word(" a  b\tc "), "a b c")
+        self.assertEqual(wiktionary.normalize_word("abc"), "abc")
+        self.assertNotIn(" a ", wiktionary.normalize_cache)
+
+    def test_form_feed(self):
+        # ASCII and non-ASCII words have their whitespace collapsed alike
+        for x in ("\x0c", "\x0b", " \x0c ", "\x1f"):
+            self.assertEqual(wiktionary.normalize_word("a" + x + "b"), "a b")
+            self.assertEqual(wiktionary.normalize_word("\u00e4" + x + "b"),
+                             "\u00e4 b")
+
+    def test_nfc(self):
+        nfd = "cafe\u0301\u00a0au lait"
+        self.assertEqual(wiktionary.normalize_word(nfd), "caf\u00e9 au lait")
+        self.assertEqual(wiktionary.normalize_cache[nfd], "caf\u00e9 au lait")
+
+    def test_cache_bound(self):
+        old = wiktionary.normalize_cache_size
+        wiktionary.normalize_cache_size = 2
+        try:
+            for x in ("ä1", "ä2", "ä3"):
+                wiktionary.normalize_word(x)
+            self.assertLessEqual(len(wiktionary.normalize_cache), 2)
+        finally:
+            wiktionary.normalize_cache_size = old
+
+    def test_applied(self):
+        ctx = wiktionary.WiktionaryTarget(lambda x: None, None, ["English"],
+                                          False, False, True, False, False)
+        page = ("==English==\n===Noun===\n# x\n====Synonyms====\n"
+                "* {{l|en|cafe\u0301}}\n")
+        ret = wiktionary.parse_text("re\u0301sume\u0301 ", page, ctx)
+        self.assertEqual(ret[0]["word"], "r\u00e9sum\u00e9")
+        self.assertEqual(ret[0]["synonyms"], [{"word": "caf\u00e9"}])
+        rec = wiktionary.parse_thesaurus_record(
+            "Thesaurus:x", "==English==\n=====Synonyms=====\n"
+            "{{ws|cafe\u0301}}\n{{ws|caf\u00e9}}\n", {})
+        a, b = rec.senses[0][1]
+        self.assertIs(a[1], b[1])
@@ -2,6 +2,7 @@ import unittest
 import collections
 import wiktextract
 from wiktextract import wiktionary
+from wiktextract import adversarial
 
 class WiktExtractTests(unittest.TestCase):
 
@@ -161,6 +162,35 @@ class WiktExtractTests(unittest.TestCase):
         v = wiktionary.clean_value(v)
         self.assertEqual(v, "Run?")
 
+    def test_cv_br(self):
+        v = "foo<br/>bar<br>baz"
+        v = wiktionary.clean_value(v)
+        self.assertEqual(v, "foo, bar, baz")
+
+    def test_cv_category(self):
+        v = "This is a test.[[Category:Tests]]"
+        v = wiktionary.clean_value(v)
+        self.assertEqual(v, "This is a test.")
+
+    def test_cv_ref_selfclosing(self):
+        v = "This is<ref name=x/> a test."
+        v = wiktionary.clean_value(v)
+        self.assertEqual(v, "This is a test.")
+
+    def test_cv_unbalanced(self):
+        v = "This {{w|is [[a}} test]]."
+        v = wiktionary.clean_value(v)
+        self.assertEqual(v, "This is [[a test]].")
+
+    def test_cv_unclosed(self):
+        v = "This is {{w|a [[test"
+        v = wiktionary.clean_value(v)
+        self.assertEqual(v, "This is {{w|a [[test")
+
+    def test_cv_linear(self):
+        failures = adversarial.check_linear(wiktionary.clean_value)
+        self.assertEqual(failures, [])
+
     def test_long(self):
         # Just parse through the data and make sure that we find some words
         # This takes about 1.5 minutes.
@@ -207,7 +237,9 @@ class WiktExtractTests(unittest.TestCase):
                                      pronunciations=True,
                                      linkages=True,
                                      compounds=True,
-                                     redirects=True)
+                                     redirects=True,
+                                     glosses=True,
+                                     conjugations=True)
         print("Test data parsing complete")
         assert num_redirects > 0
         assert len(words) > 100
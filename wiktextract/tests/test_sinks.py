@@ -0,0 +1,592 @@
+import io
+import os
+import sys
+import gzip
+import json
+import lzma
+import zlib
+import unittest
+import sqlite3
+import tempfile
+import multiprocessing
+from array import array
+from wiktextract import wiktionary
+from wiktextract import sinks
+from wiktextract import serializer
+from wiktextract import graph
+from wiktextract import jsonlindex
+from wiktextract import extsort
+
+XML = """<mediawiki><siteinfo><namespaces>
+<namespace key="0" />
+<namespace key="110">Thesaurus</namespace>
+</namespaces></siteinfo>
+<page><title>walk</title><revision><model>wikitext</model>
+<text>==English==
+===Verb===
+# To move on foot.
+</text></revision></page>
+<page><title>walks</title><revision><model>wikitext</model>
+<text>#REDIRECT [[walk]]</text></revision></page>
+<page><title>Thesaurus:walk</title><revision><model>wikitext</model>
+<text>==English==
+=====Synonyms=====
+{{ws|stroll}}
+</text></revision></page>
+</mediawiki>
+"""
+
+
+class SinkTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "pages.xml")
+        with open(self.path, "w") as f:
+            f.write(XML)
+        self.words = []
+        wiktionary.parse_wiktionary(self.path, self.words.append,
+                                    redirects=True, glosses=True)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def parse(self, sink):
+        sink.open()
+        try:
+            wiktionary.parse_wiktionary(self.path, redirects=True,
+                                        glosses=True, sink=sink)
+        finally:
+            sink.close()
+        return sink.stats()
+
+    def test_jsonl(self):
+        path = os.path.join(self.tmpdir.name, "out.json")
+        stats = self.parse(sinks.JSONLFileSink(path, batch_size=2))
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual([json.loads(x) for x in data.splitlines()],
+                         self.words)
+        self.assertEqual(stats, {"records": 3, "bytes": len(data),
+                                 "batches": 2})
+
+    def test_stdout(self):
+        old = sys.stdout
+        sys.stdout = io.TextIOWrapper(io.BytesIO())
+        try:
+            print("header")
+            stats = self.parse(sinks.StdoutSink())
+            lines = sys.stdout.buffer.getvalue().splitlines()
+        finally:
+            sys.stdout = old
+        self.assertEqual(lines[0], b"header")
+        self.assertEqual([json.loads(x) for x in lines[1:]], self.words)
+        self.assertEqual(stats["batches"], 1)
+
+    def test_callable(self):
+        batches = []
+        stats = self.parse(sinks.CallableSink(batches.append, batch_size=1))
+        self.assertEqual(batches, [[x] for x in self.words])
+        self.assertEqual(stats, {"records": 3, "bytes": 0, "batches": 3})
+
+    def test_queue(self):
+        queue = multiprocessing.Queue()
+        stats = self.parse(sinks.QueueSink(queue))
+        records = []
+        while True:
+            data = queue.get(timeout=10)
+            if data is None:
+                break
+            records.extend(json.loads(x) for x in data.splitlines())
+        self.assertEqual(records, self.words)
+        self.assertEqual(stats["records"], 3)
+
+    def test_make_sink(self):
+        self.assertIsInstance(sinks.make_sink("-"), sinks.StdoutSink)
+        sink = sinks.make_sink("jsonl:a/b.json")
+        self.assertIsInstance(sink, sinks.JSONLFileSink)
+        self.assertEqual(sink.path, "a/b.json")
+        sink = sinks.make_sink("jsonl:a/b.json.gz")
+        self.assertIsInstance(sink, sinks.CompressedJSONLSink)
+        self.assertEqual(sink.method, "gzip")
+        for spec in ("jsonl:", "foo:bar", "x"):
+            with self.assertRaises(ValueError):
+                sinks.make_sink(spec)
+
+    def compressed(self, method, suffix):
+        path = os.path.join(self.tmpdir.name, "out.json" + suffix)
+        sink = sinks.CompressedJSONLSink(path, method, block_size=100,
+                                         threads=2, batch_size=1)
+        stats = self.parse(sink)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(stats["compressed_bytes"], len(data))
+        return data, stats
+
+    def test_gzip(self):
+        data, stats = self.compressed("gzip", ".gz")
+        text = gzip.decompress(data)
+        self.assertEqual([json.loads(x) for x in text.splitlines()],
+                         self.words)
+        self.assertEqual(stats["bytes"], len(text))
+        # Each block is a separate gzip member
+        d = zlib.decompressobj(31)
+        self.assertLess(len(d.decompress(data)), len(text))
+        self.assertTrue(d.unused_data)
+
+    def test_xz(self):
+        data, stats = self.compressed("xz", ".xz")
+        self.assertEqual([json.loads(x)
+                          for x in lzma.decompress(data).splitlines()],
+                         self.words)
+
+    @unittest.skipIf(sinks.zstandard is None, "zstandard not installed")
+    def test_zstd(self):
+        data, stats = self.compressed("zstd", ".zst")
+        d = sinks.zstandard.ZstdDecompressor()
+        text = d.stream_reader(io.BytesIO(data),
+                               read_across_frames=True).read()
+        self.assertEqual([json.loads(x) for x in text.splitlines()],
+                         self.words)
+
+    def test_foreground(self):
+        path = os.path.join(self.tmpdir.name, "out.json.gz")
+        sink = sinks.CompressedJSONLSink(path, "gzip", block_size=100,
+                                         threads=2, batch_size=1)
+        sink.open()
+        wiktionary.parse_wiktionary(self.path, redirects=True,
+                                    glosses=True, sink=sink,
+                                    page_timeout=10)
+        self.assertIsNone(sink.pool)
+        sink.close()
+        with gzip.open(path) as f:
+            self.assertEqual([json.loads(x) for x in f], self.words)
+
+    def test_block_kept(self):
+        # A block is not lost if waiting for it is interrupted
+        path = os.path.join(self.tmpdir.name, "out.json.gz")
+        sink = sinks.CompressedJSONLSink(path, "gzip", block_size=1,
+                                         threads=1)
+        sink.open()
+        sink.write_batch(self.words)
+
+        class Interrupted(object):
+            def __init__(self, future):
+                self.future = future
+
+            def result(self):
+                sink.blocks[0] = self.future
+                raise KeyboardInterrupt
+
+        sink.blocks[0] = Interrupted(sink.blocks[0])
+        with self.assertRaises(KeyboardInterrupt):
+            sink.write_block()
+        sink.close()
+        with gzip.open(path) as f:
+            self.assertEqual([json.loads(x) for x in f], self.words)
+
+    def partitioned(self, partition, **kwargs):
+        path = os.path.join(self.tmpdir.name, "parts")
+        stats = self.parse(sinks.PartitionedSink(path, partition, **kwargs))
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest["partition"], partition)
+        parts = {}
+        for part in manifest["partitions"]:
+            with open(os.path.join(path, part["file"]), "rb") as f:
+                data = f.read()
+            self.assertEqual(part["bytes"], len(data))
+            records = [json.loads(x) for x in data.splitlines()]
+            self.assertEqual(part["records"], len(records))
+            parts[part["name"]] = records
+        self.assertEqual(stats["bytes"], sum(x["bytes"]
+                                             for x in manifest["partitions"]))
+        return parts
+
+    def test_partition_lang(self):
+        parts = self.partitioned("lang")
+        self.assertEqual(parts, {"English": [self.words[0], self.words[2]],
+                                 "none": [self.words[1]]})
+
+    def test_partition_char(self):
+        parts = self.partitioned("char")
+        self.assertEqual(parts, {"w": self.words})
+
+    def test_partition_hash(self):
+        parts = self.partitioned("hash", partitions=100)
+        for name, records in parts.items():
+            self.assertEqual(len(name), 2)
+            for data in records:
+                word = sinks.record_word(data)
+                self.assertEqual(zlib.crc32(word.encode("utf-8")) % 100,
+                                 int(name))
+        self.assertEqual(sorted(x["word"] for v in parts.values()
+                                for x in v),
+                         sorted(x["word"] for x in self.words))
+
+    def test_partition_relation(self):
+        parts = self.partitioned("relation")
+        self.assertEqual(parts["redirect"],
+                         [{"word": "walks", "relation": "redirect",
+                           "target": "walk"}])
+        self.assertEqual(parts["Synonyms"],
+                         [{"word": "walk", "relation": "Synonyms",
+                           "target": "stroll", "lang": "English"}])
+
+    def test_make_partition_sink(self):
+        sink = sinks.make_sink("partition:hash64:out")
+        self.assertEqual((sink.path, sink.partition, sink.partitions),
+                         ("out", "hash", 64))
+        self.assertEqual(sinks.make_sink("partition:hash:out").partitions,
+                         16)
+        self.assertEqual(sinks.make_sink("partition:lang:out").partition,
+                         "lang")
+        for spec in ("partition:hash0:out", "partition:lang:",
+                     "partition:foo:out"):
+            with self.assertRaises(ValueError):
+                sinks.make_sink(spec)
+
+
+class SerializerTests(unittest.TestCase):
+
+    RECORDS = [{"word": "caf\u00e9", "pos": "noun",
+                "senses": [{"glosses": ["A \"coffee\" shop."]}]},
+               {"redirect": "test", "word": "tests"},
+               {"word": "x", "ipa": [("en", "/\u025bks/")]}]
+
+    def test_json(self):
+        data = serializer.json_dumps_batch(self.RECORDS)
+        lines = data.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(data.endswith(b"\n"))
+        self.assertEqual(json.loads(lines[1]), self.RECORDS[1])
+        self.assertEqual(lines[1], b'{"redirect":"test","word":"tests"}')
+        self.assertIn(b"caf\\u00e9", lines[0])
+        self.assertEqual(serializer.json_dumps(self.RECORDS[0]), lines[0])
+        self.assertEqual(serializer.json_dumps_batch([]), b"")
+
+    @unittest.skipIf(serializer.orjson is None, "orjson not installed")
+    def test_orjson(self):
+        self.assertEqual(serializer.BACKEND, "orjson")
+        data = serializer.orjson_dumps_batch(self.RECORDS)
+        self.assertIn("caf\u00e9".encode("utf-8"), data)
+        self.assertEqual([json.loads(x) for x in data.splitlines()],
+                         [json.loads(x) for x in
+                          serializer.json_dumps_batch(self.RECORDS)
+                          .splitlines()])
+        self.assertEqual(serializer.orjson_dumps_batch([]), b"")
+
+
+class SQLiteTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "pages.xml")
+        with open(path, "w") as f:
+            f.write(XML.replace("{{ws|stroll}}",
+                                "{{ws|stroll}}\n{{ws|tramp|q=informal}}")
+                    .replace("# To move on foot.",
+                             "# To move on foot.\n====Synonyms====\n"
+                             "* {{sense|move}} [[amble]]"))
+        self.db = os.path.join(self.tmpdir.name, "out.db")
+        sink = sinks.make_sink("sqlite:" + self.db)
+        sink.open()
+        try:
+            wiktionary.parse_wiktionary(path, redirects=True, linkages=True,
+                                        sink=sink)
+        finally:
+            sink.close()
+        self.stats = sink.stats()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_tables(self):
+        self.assertNotIn("out.db-wal", os.listdir(self.tmpdir.name))
+        conn = sqlite3.connect(self.db)
+        self.assertEqual(self.stats["records"], 3)
+        rows = conn.execute(
+            "SELECT e.pos, r.name, t.word, targets.sense, targets.tags "
+            "FROM targets "
+            "JOIN words w ON w.id = targets.word_id "
+            "JOIN words t ON t.id = targets.target_id "
+            "JOIN relations r ON r.id = targets.relation_id "
+            "JOIN entries e ON e.id = targets.entry_id "
+            "WHERE w.word = ? ORDER BY t.word", ("walk",)).fetchall()
+        self.assertEqual(rows, [("verb", "synonyms", "amble", "move", None),
+                                (None, "Synonyms", "stroll", None, None),
+                                (None, "Synonyms", "tramp", None,
+                                 '["informal"]')])
+        rows = conn.execute(
+            "SELECT w.word, r.name FROM targets "
+            "JOIN words w ON w.id = targets.word_id "
+            "JOIN relations r ON r.id = targets.relation_id "
+            "WHERE targets.target_id = "
+            "(SELECT id FROM words WHERE word = ?)", ("walk",)).fetchall()
+        self.assertEqual(rows, [("walks", "redirect")])
+        data, = conn.execute("SELECT data FROM entries JOIN words "
+                             "ON words.id = entries.word_id "
+                             "WHERE words.word = ?", ("walks",)).fetchone()
+        self.assertEqual(json.loads(data), {"redirect": "walk",
+                                            "word": "walks"})
+        indexes = [x[0] for x in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")]
+        self.assertIn("targets_target", indexes)
+        conn.close()
+
+
+
+class GraphTests(unittest.TestCase):
+
+    RECORDS = [
+        {"word": "Thesaurus:walk",
+         "senses": [{"Synonyms": [{"word": "stroll"}, {"word": "amble"}]},
+                    {"Synonyms": [{"word": "stroll"}],
+                     "Hypernyms": [{"word": "move"}]}]},
+        {"word": "walk", "lang": "English", "pos": "verb",
+         "synonyms": [{"word": "tramp", "tags": ["informal"]}]},
+        {"word": "walks", "redirect": "walk"},
+        {"word": "\u00e4", "lang": "Finnish", "pos": "intj"}]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "graph")
+        sink = sinks.make_sink("graph:" + path)
+        sink.open()
+        sink.write_batch(self.RECORDS)
+        sink.close()
+        self.stats = sink.stats()
+        self.graph = graph.Graph(path)
+
+    def tearDown(self):
+        self.graph.close()
+        self.tmpdir.cleanup()
+
+    def test_strings(self):
+        g = self.graph
+        words = ["amble", "move", "stroll", "tramp", "walk", "walks",
+                 "\u00e4"]
+        self.assertEqual([g.word(i) for i in range(len(g))], words)
+        for i, word in enumerate(words):
+            self.assertEqual(g.find(word), i)
+        for word in ("", "a", "walkz", "\u00e5"):
+            self.assertIsNone(g.find(word))
+        self.assertGreater(self.stats["bytes"], 0)
+
+    def test_relations(self):
+        g = self.graph
+        self.assertEqual(g.names, ["Hypernyms", "Synonyms", "redirect",
+                                   "synonyms"])
+        self.assertEqual(g.targets("Synonyms", "walk"), ["amble", "stroll"])
+        self.assertEqual(g.targets("Hypernyms", "walk"), ["move"])
+        self.assertEqual(g.targets("synonyms", "walk"), ["tramp"])
+        self.assertEqual(g.targets("redirect", "walks"), ["walk"])
+        self.assertEqual(g.targets("Synonyms", "stroll"), [])
+        self.assertEqual(g.targets("Antonyms", "walk"), [])
+        self.assertEqual(list(g.neighbors("Synonyms", g.find("walk"))),
+                         [0, 2])
+
+    def test_npy(self):
+        arr = array("I", [0, 1, 2 ** 32 - 1])
+        path = os.path.join(self.tmpdir.name, "a.npy")
+        size = graph.write_npy(path, arr)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.assertEqual(len(data), size)
+        self.assertEqual((data.index(b"\n") + 1) % 64, 0)
+        self.assertEqual(list(graph.npy_view(data)), list(arr))
+
+
+class IndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "out.json")
+        self.records = [{"word": "walk", "pos": "verb"},
+                        {"word": "Thesaurus:walk", "senses": []},
+                        {"word": "\u00e4iti", "pos": "noun"},
+                        {"word": "walk", "pos": "noun"},
+                        {"word": "b", "redirect": "walk"}]
+        sink = sinks.JSONLFileSink(self.path, batch_size=2,
+                                   index_path=self.path + ".idx")
+        sink.open()
+        for i in range(0, len(self.records), 2):
+            sink.write_batch(self.records[i:i + 2])
+        sink.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check(self, index_path=None):
+        r = jsonlindex.IndexedJSONL(self.path, index_path)
+        try:
+            self.assertEqual(len(r), 5)
+            self.assertEqual(r.get("walk"), [self.records[0],
+                                             self.records[3]])
+            self.assertEqual(r.get("\u00e4iti"), [self.records[2]])
+            self.assertEqual(r.get("Thesaurus:walk"), [self.records[1]])
+            self.assertEqual(r.get("b"), [self.records[4]])
+            self.assertEqual(r.get("c"), [])
+            self.assertEqual(r.get("wal"), [])
+            self.assertEqual(r.get("\u00e4"), [])
+            self.assertIn("b", r)
+            self.assertNotIn("z", r)
+            self.assertEqual(json.loads(r.raw("b")[0]), self.records[4])
+        finally:
+            r.close()
+
+    def test_sink(self):
+        self.check()
+
+    def test_build(self):
+        idx = os.path.join(self.tmpdir.name, "built.idx")
+        self.assertEqual(jsonlindex.build_index(self.path, idx), 5)
+        with open(idx, "rb") as f1, open(self.path + ".idx", "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+        self.check(idx)
+
+    def test_empty(self):
+        path = os.path.join(self.tmpdir.name, "empty.json")
+        open(path, "wb").close()
+        self.assertEqual(jsonlindex.build_index(path), 0)
+        r = jsonlindex.IndexedJSONL(path)
+        self.assertEqual(r.get("walk"), [])
+        r.close()
+
+    def test_stale(self):
+        with open(self.path, "ab") as f:
+            f.write(serializer.dumps_batch([{"word": "x"}]))
+        with self.assertRaises(ValueError):
+            jsonlindex.IndexedJSONL(self.path)
+        with self.assertRaises(ValueError):
+            jsonlindex.IndexedJSONL(self.path, self.path)
+
+
+class SortTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        words = ["w{}".format(i % 37) for i in range(500)]
+        words[10] = "\u00e4iti"
+        words[20] = "Thesaurus:w1"
+        self.records = [{"word": w, "n": i % 7} for i, w in enumerate(words)]
+        self.paths = []
+        for i, suffix in enumerate((".json", ".json.gz", ".json.xz")):
+            path = os.path.join(self.tmpdir.name, "in{}{}".format(i, suffix))
+            sink = sinks.make_sink("jsonl:" + path)
+            sink.open()
+            sink.write_batch(self.records[i::3])
+            sink.close()
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def expected(self, records):
+        return sorted(records, key=lambda x: (x["word"].encode("utf-8"),
+                                              serializer.dumps(x)))
+
+    def sort(self, **kwargs):
+        out = os.path.join(self.tmpdir.name, "out.json")
+        count = extsort.sort_jsonl(self.paths, out, **kwargs)
+        with open(out, "rb") as f:
+            records = [json.loads(x) for x in f]
+        self.assertEqual(count, len(records))
+        return records
+
+    def test_memory(self):
+        self.assertEqual(self.sort(), self.expected(self.records))
+
+    def test_spill(self):
+        # Runs of a few records, merged in several passes
+        self.assertEqual(self.sort(memory=1000, fan_in=3),
+                         self.expected(self.records))
+        self.assertEqual(os.listdir(self.tmpdir.name).count("out.json"), 1)
+
+    def test_unique(self):
+        records = self.sort(unique=True, memory=1000)
+        self.assertEqual(records, self.expected(
+            [dict(x) for x in set(tuple(sorted(x.items()))
+                                  for x in self.records)]))
+        self.assertEqual(len(records), 37 * 7 + 2)
+
+    def test_relation(self):
+        path = os.path.join(self.tmpdir.name, "rows.json")
+        rows = [{"word": "b", "relation": "x", "target": "1"},
+                {"word": "a", "relation": "y", "target": "2"},
+                {"word": "a", "relation": "x", "target": "3"},
+                {"word": "ab", "target": "4"},
+                {"word": "a", "target": "5"}]
+        with open(path, "wb") as f:
+            f.write(serializer.dumps_batch(rows))
+        self.paths = [path]
+        self.assertEqual([x["target"] for x in self.sort(by_relation=True)],
+                         ["5", "3", "2", "4", "1"])
+
+    def test_invalid(self):
+        with open(self.paths[0], "ab") as f:
+            f.write(b"\n{\"pos\": \"noun\"}\n")
+        with self.assertRaises(ValueError) as cm:
+            self.sort()
+        lineno = len(self.records[::3]) + 2
+        self.assertIn("{}:{}:".format(self.paths[0], lineno),
+                      str(cm.exception))
+
+    def test_index(self):
+        out = os.path.join(self.tmpdir.name, "out.json")
+        extsort.sort_jsonl(self.paths, out, memory=1000,
+                           index_path=out + ".idx")
+        r = jsonlindex.IndexedJSONL(out)
+        try:
+            self.assertEqual(r.get("w1"), self.expected(
+                [x for x in self.records if x["word"] == "w1"]))
+            self.assertEqual(len(r), len(self.records))
+        finally:
+            r.close()
+
+
+@unittest.skipIf(sinks.pyarrow is None, "pyarrow not installed")
+class ArrowTests(unittest.TestCase):
+
+    ROWS = {"word": ["walk", "walk", "walk", "walks"],
+            "relation": ["Synonyms", "Synonyms", "synonyms", "redirect"],
+            "target": ["stroll", "amble", "tramp", "walk"],
+            "sense": ["move", "move", None, None],
+            "lang": ["English", "English", "Finnish", None]}
+
+    RECORDS = [
+        {"word": "Thesaurus:walk",
+         "senses": [{"sense": "move",
+                     "Synonyms": [{"word": "stroll"}, {"word": "amble"}]}]},
+        {"word": "walk", "lang": "Finnish", "pos": "verb"},
+        {"word": "walk", "lang": "Finnish", "pos": "noun",
+         "synonyms": [{"word": "tramp"}]},
+        {"word": "walks", "redirect": "walk"}]
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, kind):
+        path = os.path.join(self.tmpdir.name, "out." + kind)
+        sink = sinks.make_sink(kind + ":" + path)
+        sink.open()
+        sink.write_batch(self.RECORDS[:2])
+        sink.write_batch(self.RECORDS[2:])
+        sink.close()
+        self.assertEqual(sink.stats()["bytes"], os.path.getsize(path))
+        return path
+
+    def test_parquet(self):
+        path = self.write("parquet")
+        f = sinks.pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(f.metadata.num_row_groups, 2)
+        self.assertEqual(f.read().to_pydict(), self.ROWS)
+
+    def test_arrow(self):
+        path = self.write("arrow")
+        with sinks.pyarrow.memory_map(path) as source:
+            table = sinks.pyarrow.ipc.open_stream(source).read_all()
+        self.assertEqual(table.to_pydict(), self.ROWS)
@@ -0,0 +1,255 @@
+import io
+import os
+import json
+import unittest
+import tempfile
+from lxml import etree
+from wiktextract import wiktionary
+
+PAGE = """{{ws header|lang=en}}
+==English==
+
+===Noun===
+====Sense: human being====
+{{ws sense|a human being}}
+
+=====Synonyms=====
+{{ws beginlist}}
+{{ws|human}}
+{{ws|individual|q=formal}}
+{{ws|person|a single human}}
+{{ws endlist}}
+
+=====Hypernyms=====
+{{ws beginlist}}
+{{ws|animal}}
+{{ws endlist}}
+
+====Sense: body====
+{{ws sense|en|the body of a human}}
+
+=====Synonyms=====
+{{ws beginlist}}
+{{ws|body|qq=anatomy, informal}}
+{{ws endlist}}
+
+=====Various=====
+{{ws beginlist}}
+{{ws|somebody}}
+{{ws endlist}}
+
+===See also===
+* [[people]]
+"""
+
+
+class ThesaurusTests(unittest.TestCase):
+
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.words = []
+        self.ctx = wiktionary.WiktionaryTarget(self.words.append, None,
+                                               ["English"], False, False,
+                                               False, False, False)
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        self.tmpdir.cleanup()
+
+    def test_flat(self):
+        ret = wiktionary.parse_text("Thesaurus:person", PAGE, self.ctx)
+        self.assertEqual(len(ret), 1)
+        data = ret[0]
+        self.assertEqual(data["word"], "Thesaurus:person")
+        self.assertEqual(data["Synonyms"],
+                         ["human", "individual", "person", "body"])
+        self.assertEqual(data["Hypernyms"], ["animal"])
+        self.assertEqual(data["Antonyms"], [])
+
+    def test_senses(self):
+        data = wiktionary.parse_text("Thesaurus:person", PAGE, self.ctx)[0]
+        senses = data["senses"]
+        self.assertEqual(len(senses), 2)
+        self.assertEqual(senses[0]["sense"], "a human being")
+        self.assertEqual(senses[0]["Synonyms"],
+                         [{"word": "human"},
+                          {"word": "individual", "tags": ["formal"]},
+                          {"word": "person", "gloss": "a single human"}])
+        self.assertEqual(senses[0]["Hypernyms"], [{"word": "animal"}])
+        self.assertEqual(senses[1]["sense"], "the body of a human")
+        self.assertEqual(senses[1]["Synonyms"],
+                         [{"word": "body", "tags": ["anatomy", "informal"]}])
+        self.assertNotIn("Hypernyms", senses[1])
+
+    def test_not_thesaurus(self):
+        # Outside the Thesaurus namespace the page is a regular entry
+        ret = wiktionary.parse_text("person", PAGE, self.ctx)
+        self.assertEqual(ret, [{"word": "person", "lang": "English",
+                                "pos": "noun"}])
+        self.assertEqual(self.words, ret)
+
+    def test_relation_aliases(self):
+        page = ("{{ws header|lang=en}}\n==English==\n===Verb===\n"
+                "{{ws sense|to walk}}\n"
+                "=====Troponyms=====\n{{ws|stroll}}\n"
+                "===== Coordinate terms =====\n{{ws|run}}\n"
+                "=====Related Terms=====\n{{ws|walker}}\n"
+                "=====Unknown header=====\n{{ws|ignored}}\n")
+        data = wiktionary.parse_text("Thesaurus:walk", page, self.ctx)[0]
+        self.assertEqual(data["Hyponyms"], ["stroll"])
+        self.assertEqual(data["Coordinate terms"], ["run"])
+        self.assertEqual(data["Related terms"], ["walker"])
+        self.assertEqual(data["Derived terms"], [])
+        self.assertNotIn("ignored", str(data))
+
+    def test_relations_table(self):
+        self.assertEqual(wiktionary.THESAURUS_RELATIONS[:7],
+                         ("Synonyms", "Antonyms", "Hyponyms", "Hypernyms",
+                          "Instances", "Meronyms", "Holonyms"))
+        self.assertIsNone(wiktionary.thesaurus_header_map["see also"])
+
+    def test_many(self):
+        pages = [("Thesaurus:person", PAGE),
+                 ("person", PAGE),
+                 ("Thesaurus:human", PAGE.replace("{{ws|human}}\n", ""))]
+        ret = wiktionary.parse_text_many(pages)
+        self.assertEqual([x["word"] for x in ret],
+                         ["Thesaurus:person", "Thesaurus:human"])
+        self.assertEqual(ret[0], wiktionary.parse_text("Thesaurus:person",
+                                                       PAGE, self.ctx)[0])
+        self.assertEqual(ret[1]["Synonyms"], ["individual", "person", "body"])
+        # Cached relation lines must not share mutable data between records
+        ret[0]["senses"][1]["Synonyms"][0]["tags"].append("x")
+        self.assertEqual(ret[1]["senses"][1]["Synonyms"][0]["tags"],
+                         ["anatomy", "informal"])
+        # Only the parse_text() call passed records to word_cb
+        self.assertEqual([x["word"] for x in self.words],
+                         ["Thesaurus:person"])
+        self.assertEqual(os.listdir("."), [])
+
+    def test_page_timeout(self):
+        ctx = wiktionary.WiktionaryTarget(self.words.append, None,
+                                          ["English"], False, False,
+                                          False, False, False,
+                                          page_timeout=0.05,
+                                          quarantine_path="quarantine.txt")
+        slow = PAGE.replace("{{ws|human}}\n",
+                            "".join("{{ws|human%d}}\n" % i
+                                    for i in range(100000)))
+        ret = wiktionary.parse_text_many([("Thesaurus:slow", slow),
+                                          ("Thesaurus:person", PAGE)],
+                                         ctx)
+        ctx.close()
+        self.assertEqual([x["word"] for x in ret], ["Thesaurus:person"])
+        self.assertEqual(ctx.quarantine_count, 1)
+        with open("quarantine.txt") as f:
+            lines = [json.loads(x) for x in f]
+        self.assertEqual(lines, [{"title": "Thesaurus:slow",
+                                  "length": len(slow),
+                                  "timeout": 0.05}])
+
+    def test_record(self):
+        rec = wiktionary.parse_thesaurus_record("Thesaurus:person", PAGE, {})
+        data = wiktionary.parse_thesaurus("Thesaurus:person", PAGE, {})
+        self.assertEqual(rec.to_dict(), data)
+        self.assertEqual(rec.to_json(), json.dumps(data))
+        self.assertFalse(hasattr(rec, "__dict__"))
+        syn = wiktionary.THESAURUS_RELATIONS.index("Synonyms")
+        self.assertEqual(rec.relations[:2], ((syn, "human"),
+                                             (syn, "individual")))
+        self.assertEqual(rec.senses[1],
+                         ("the body of a human",
+                          ((syn, "body", None, ("anatomy", "informal")),)))
+        back = wiktionary.ThesaurusRecord.from_dict(data)
+        self.assertEqual(back, rec)
+        self.assertEqual(back.to_dict(), data)
+
+    def test_many_compact(self):
+        ret = wiktionary.parse_text_many([("Thesaurus:person", PAGE)],
+                                         compact=True)
+        self.assertIsInstance(ret[0], wiktionary.ThesaurusRecord)
+        self.assertEqual(ret[0].to_dict(),
+                         wiktionary.parse_text_many(
+                             [("Thesaurus:person", PAGE)])[0])
+
+    def test_intern(self):
+        table = wiktionary.intern_table
+        before = table.stats()
+        head = "==English==\n=====Synonyms=====\n"
+        a = wiktionary.parse_thesaurus_record(
+            "Thesaurus:a", head + "{{ws|hum" + "an}}\n", {})
+        b = wiktionary.parse_thesaurus_record(
+            "Thesaurus:b", head + "{{ws|human|a person}}\n", {})
+        self.assertIs(a.senses[0][1][0][1], b.senses[0][1][0][1])
+        after = table.stats()
+        self.assertEqual(after["total"], before["total"] + 2)
+        self.assertGreaterEqual(after["hits"], before["hits"] + 1)
+
+    def test_intern_table(self):
+        table = wiktionary.InternTable(max_size=2)
+        x = table.intern("".join(["a", "b"]))
+        self.assertIs(table.intern("".join(["a", "b"])), x)
+        table.intern("c")
+        table.intern("d")
+        self.assertEqual(table.stats(), {"unique": 2, "total": 4, "hits": 1})
+        table.clear()
+        self.assertEqual(table.stats(), {"unique": 0, "total": 0, "hits": 0})
+
+    def test_chunks(self):
+        whole = wiktionary.parse_thesaurus_record("Thesaurus:person", PAGE,
+                                                  {})
+        for size in (1, 2, 7, 64):
+            parser = wiktionary.ThesaurusParser("Thesaurus:person", {})
+            for i in range(0, len(PAGE), size):
+                parser.feed(PAGE[i:i + size])
+                self.assertLessEqual(sum(len(x) for x in parser.carry), 40)
+            self.assertEqual(parser.close(), whole)
+            self.assertEqual(parser.length, len(PAGE))
+
+    def test_comment_lines(self):
+        page = ("\n  ==English==\n=====Synonyms=====\n{{ws|a}} <!-- x\n"
+                "{{ws|hidden}}\n-->{{ws|b}}\n<!-- y --> {{ws|c}}\n")
+        data = wiktionary.parse_thesaurus("Thesaurus:x", page, {})
+        self.assertEqual(data["Synonyms"], ["a", "b", "c"])
+
+    def xml(self, title, text):
+        return ("<mediawiki><page><title>{}</title><revision>"
+                "<model>wikitext</model><text>{}</text></revision></page>"
+                "</mediawiki>".format(title, text.replace("<", "&lt;")))
+
+    def test_stream(self):
+        xml = self.xml("Thesaurus:person", PAGE * 200)
+        parser = etree.XMLParser(target=self.ctx)
+        carry = []
+        feed = wiktionary.ThesaurusParser.feed
+
+        def stream_feed(stream, chunk):
+            feed(stream, chunk)
+            carry.append(sum(len(x) for x in stream.carry))
+
+        wiktionary.ThesaurusParser.feed = stream_feed
+        try:
+            etree.parse(io.BytesIO(xml.encode("utf-8")), parser)
+        finally:
+            wiktionary.ThesaurusParser.feed = feed
+        self.assertGreater(len(carry), 1)
+        self.assertLess(max(carry), 100)
+        data, = self.words
+        self.assertEqual(len(data["senses"]), 400)
+        self.assertEqual(data["Hypernyms"], ["animal"] * 200)
+
+    def test_stream_timeout(self):
+        ctx = wiktionary.WiktionaryTarget(self.words.append, None,
+                                          ["English"], False, False,
+                                          False, False, False,
+                                          page_timeout=0.05)
+        slow = PAGE.replace("{{ws|human}}\n",
+                            "".join("{{ws|human%d}}\n" % i
+                                    for i in range(100000)))
+        xml = self.xml("Thesaurus:slow", slow)
+        etree.parse(io.BytesIO(xml.encode("utf-8")),
+                    etree.XMLParser(target=ctx))
+        self.assertEqual(ctx.quarantine_count, 1)
+        self.assertEqual(self.words, [])
@@ -0,0 +1,88 @@
+import unittest
+from wiktextract import tokenizer
+from wiktextract import wiktionary
+
+
+class TokenizerTests(unittest.TestCase):
+
+    def kinds(self, text):
+        return [(kind, text[start:end]) for kind, start, end in
+                tokenizer.tokenize(text)]
+
+    def test_lines(self):
+        text = "==English==\n* {{ws|a}} [[b|c]]\n"
+        self.assertEqual(self.kinds(text),
+                         [(tokenizer.HEADER, "==English=="),
+                          (tokenizer.NEWLINE, "\n"),
+                          (tokenizer.LIST, "*"),
+                          (tokenizer.TEXT, " "),
+                          (tokenizer.TEMPLATE_START, "{{"),
+                          (tokenizer.TEXT, "ws"),
+                          (tokenizer.PIPE, "|"),
+                          (tokenizer.TEXT, "a"),
+                          (tokenizer.TEMPLATE_END, "}}"),
+                          (tokenizer.TEXT, " "),
+                          (tokenizer.LINK_START, "[["),
+                          (tokenizer.TEXT, "b"),
+                          (tokenizer.PIPE, "|"),
+                          (tokenizer.TEXT, "c"),
+                          (tokenizer.LINK_END, "]]"),
+                          (tokenizer.NEWLINE, "\n")])
+
+    def test_covers_text(self):
+        text = "a <!-- x --> <ref>r</ref><br/>''b'' [http://x y] {{{1}}} = *"
+        tokens = tokenizer.tokenize(text)
+        self.assertEqual("".join(text[s:e] for k, s, e in tokens), text)
+        self.assertEqual(tokens[0][1], 0)
+        for a, b in zip(tokens, tokens[1:]):
+            self.assertEqual(a[2], b[1])
+
+    def test_range(self):
+        text = "==A==\nfoo\n==B==\n"
+        tokens = tokenizer.tokenize(text, 6, 10)
+        self.assertEqual([text[s:e] for k, s, e in tokens], ["foo", "\n"])
+
+    def test_header_title(self):
+        text = "=== Sense: person ===  "
+        tokens = tokenizer.tokenize(text)
+        self.assertEqual(tokenizer.header_title(text, tokens[0]),
+                         (3, "Sense: person"))
+
+    def test_not_header(self):
+        text = "=a <!-- x\n--> b\n==\n= = \t\n==x"
+        tokens = tokenizer.tokenize(text)
+        self.assertEqual([(k, text[s:e]) for k, s, e in tokens],
+                         [(tokenizer.TEXT, "=a "),
+                          (tokenizer.COMMENT, "<!-- x\n-->"),
+                          (tokenizer.TEXT, " b"),
+                          (tokenizer.NEWLINE, "\n"),
+                          (tokenizer.HEADER, "=="),
+                          (tokenizer.NEWLINE, "\n"),
+                          (tokenizer.HEADER, "= = \t"),
+                          (tokenizer.NEWLINE, "\n"),
+                          (tokenizer.TEXT, "==x")])
+        self.assertEqual(tokenizer.header_title(text, tokens[4]), (1, ""))
+        self.assertEqual(tokenizer.header_title(text, tokens[6]), (1, ""))
+
+    def test_template_args(self):
+        text = "{{ws|{{l|en|a}}|[[b|c]]|q=d}} {{open|x"
+        tokens = tokenizer.tokenize(text)
+        match = tokenizer.pair_tokens(tokens)
+        self.assertEqual(tokenizer.template_args(text, tokens, match, 0),
+                         ["ws", "{{l|en|a}}", "[[b|c]]", "q=d"])
+        i = [x[0] for x in tokens].index(tokenizer.TEMPLATE_START, 1)
+        i = [x[0] for x in tokens].index(tokenizer.TEMPLATE_START, i + 1)
+        self.assertIsNone(tokenizer.template_args(text, tokens, match, i))
+
+    def test_pair_crossing(self):
+        text = "{{a[[b}}]]"
+        tokens = tokenizer.tokenize(text)
+        match = tokenizer.pair_tokens(tokens)
+        self.assertEqual(match, [4, -1, -1, -1, 0, -1])
+
+    def test_redirect(self):
+        self.assertEqual(wiktionary.redirect_target("#REDIRECT [[foo bar]]"),
+                         "foo bar")
+        self.assertEqual(wiktionary.redirect_target(" #redirect [[a|b]]\nx"),
+                         "a")
+        self.assertIsNone(wiktionary.redirect_target("# a [[definition]]"))
@@ -0,0 +1,156 @@
+# Tokenizer for Wikimedia page text.  This splits the text of a page into a
+# flat list of tokens (section headers, list markers, templates, links,
+# HTML, text runs, etc.) that is shared by all code that extracts
+# information from the page.  Tokens are (kind, start, end) tuples giving
+# offsets into the original text, so no substrings are copied until a
+# consumer asks for them.
+#
+# Copyright (c) 2018 Tatu Ylonen.  See file LICENSE and https://ylonen.org
+
+import re
+
+# Token kinds.  These are the numbers of the groups in token_re.
+(HEADER, LIST, NEWLINE, TEXT, COMMENT, REF, REF_START, REF_END, BR, TAG,
+ TEMPLATE_START, TEMPLATE_END, LINK_START, LINK_END, EXT_START, EXT_END,
+ PIPE, QUOTE, CHAR) = range(1, 20)
+
+# Opening token kind for each closing token kind.
+closer_map = {
+    TEMPLATE_END: TEMPLATE_START,
+    LINK_END: LINK_START,
+    EXT_END: EXT_START,
+    REF_END: REF_START,
+}
+
+# Regular expression for tokens.  Every character of the text is part of
+# some match.  All alternatives are written so that a failed attempt scans
+# at most to the end of the line or up to the next "<" or "]", which keeps
+# tokenizing linear even on unbalanced input (see adversarial.py).  The
+# HEADER alternative matches any line starting with "="; tokenize() checks
+# that it also ends in "=" (a pattern requiring both would backtrack over
+# runs of "=" in cubic time), and otherwise tokenizes the line with
+# body_re, which is the same without the HEADER alternative.
+token_alternatives = (
+    r"(^[*#:;]+)|"                           # LIST (markers at line start)
+    r"(\n)|"                                 # NEWLINE
+    r"([^<{}\[\]|'\n]+)|"                    # TEXT
+    r"(<!--(?s:.*?-->|.*))|"                 # COMMENT (to end if open)
+    r"(<ref\b[^<>]*/>)|"                     # REF (self-closing)
+    r"(<ref\b[^<>]*>)|"                      # REF_START
+    r"(</ref\s*>)|"                          # REF_END
+    r"(<br\s*/?>)|"                          # BR
+    r"(</?[a-z][^<>]*>)|"                    # TAG (other HTML tags)
+    r"(\{\{)|"                               # TEMPLATE_START
+    r"(\}\})|"                               # TEMPLATE_END
+    r"(\[\[)|"                               # LINK_START
+    r"(\]\])|"                               # LINK_END
+    r"(\[(?:https?:|mailto:)?//[^]\s]*\s*)|"  # EXT_START (external link)
+    r"(\])|"                                 # EXT_END
+    r"(\|)|"                                 # PIPE
+    r"(''+)|"                                # QUOTE (italic/bold)
+    r"(.)")                                  # CHAR (any other character)
+token_re = re.compile(r"(?mi)(^=[^\n]*)|" + token_alternatives, re.S)
+body_re = re.compile(r"(?mi)(?!)()|" + token_alternatives, re.S)
+
+
+def is_header(line):
+    """Returns True if ``line`` (which starts with "=") is a section
+    header, i.e., also ends in "=" (optionally followed by spaces and
+    tabs)."""
+    line = line.rstrip(" \t")
+    return len(line) >= 2 and line[-1] == "="
+
+
+def tokenize(text, pos=0, endpos=None):
+    """Splits ``text`` (or the part of it between ``pos`` and ``endpos``)
+    into a list of ``(kind, start, end)`` tokens, where ``start`` and
+    ``end`` are offsets into ``text``.  Runs in linear time."""
+    assert isinstance(text, str)
+    if endpos is None:
+        endpos = len(text)
+    ret = []
+    while True:
+        for m in token_re.finditer(text, pos, endpos):
+            if m.lastindex == HEADER and not is_header(m.group()):
+                # Not a header; take one ordinary token and continue
+                # from its end (which is not at the start of a line)
+                m = body_re.match(text, m.start(), endpos)
+                ret.append((m.lastindex, m.start(), m.end()))
+                pos = m.end()
+                break
+            ret.append((m.lastindex, m.start(), m.end()))
+        else:
+            return ret
+
+
+def pair_tokens(tokens):
+    """Pairs the opening and closing tokens of templates, links, external
+    links and references in ``tokens``.  Returns a list with, for each
+    token, the index of the token it pairs with, or -1.  A closing token
+    pairs with the nearest unpaired opening token of its type; any openers
+    between them are left unpaired.  Runs in linear time."""
+    match = [-1] * len(tokens)
+    stack = []
+    counts = {TEMPLATE_START: 0, LINK_START: 0, EXT_START: 0, REF_START: 0}
+    for i, (kind, start, end) in enumerate(tokens):
+        if kind in counts:
+            stack.append((kind, i))
+            counts[kind] += 1
+        elif kind in closer_map:
+            want = closer_map[kind]
+            if not counts[want]:
+                continue
+            while True:
+                opener, j = stack.pop()
+                counts[opener] -= 1
+                if opener == want:
+                    break
+            match[i] = j
+            match[j] = i
+    return match
+
+
+def template_args(text, tokens, match, i):
+    """Returns the name and arguments of the template (or link) whose
+    opening token is ``tokens[i]``, as a list of source strings split at
+    its top-level pipes, or None if the opening token is unpaired.
+    ``match`` is as returned by pair_tokens()."""
+    j = match[i]
+    if j < 0:
+        return None
+    ret = []
+    pos = tokens[i][2]
+    k = i + 1
+    while k < j:
+        kind, start, end = tokens[k]
+        if kind == PIPE:
+            ret.append(text[pos:start])
+            pos = end
+        elif match[k] > k:
+            # Skip nested constructs
+            k = match[k]
+            continue
+        k += 1
+    ret.append(text[pos:tokens[j][1]])
+    return ret
+
+
+def header_title(text, token):
+    """Returns ``(level, title)`` for a HEADER token."""
+    kind, start, end = token
+    assert kind == HEADER
+    return split_header(text[start:end])
+
+
+def split_header(line):
+    """Returns ``(level, title)`` for the section header ``line`` (see
+    is_header()).  The level is the number of "=" at the start of the
+    line, and the title is the text between the leading and trailing "="
+    without surrounding whitespace.  Runs in linear time."""
+    line = line.rstrip(" \t")
+    title = line.lstrip("=")
+    level = len(line) - len(title)
+    if not title:
+        # Only "=": the last one closes the header
+        return level - 1, ""
+    return level, title.rstrip("=").strip()
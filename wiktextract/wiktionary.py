@@ -8,10 +8,14 @@ import bz2
 import html
 import collections
 from lxml import etree
-import wikitextparser
 from wiktextract import wiktlangs
-import wikitextparser as wtp
+from wiktextract import tokenizer
 import json
+import time
+import signal
+import threading
+import contextlib
+import unicodedata
 
 # These XML tags are ignored when parsing.
 ignore_tags = set(["sha1", "comment", "username", "timestamp",
@@ -519,9 +523,8 @@ clean_arg3_tags = [
 
 # Templates that will be replaced by a value when cleaning up titles/values.
 # The replacements may refer to the first argument of the template using \1.
-#
-# Note that there is a non-zero runtime cost for each replacement in this
-# dictionary; keep its size reasonable.
+# These are looked up by template name (see clean_template_map), so the size
+# of this dictionary does not affect the speed of clean_value().
 clean_replace_map = {
     "en dash": " - ",
     "em dash": " - ",
@@ -553,6 +556,11 @@ clean_replace_map = {
     "gloss": r"(\1)",
 }
 
+# The regular expressions below describe the templates rewritten by
+# clean_value().  clean_value() itself does not use them (they backtrack
+# exponentially on some unbalanced inputs); they are kept as a reference
+# implementation for benchmarks and wiktextract/adversarial.py.
+#
 # Note: arg_re contains two sets of parenthesis
 arg_re = (r"(\|[-_a-zA-Z0-9]+=[^}|]+)*"
           r"\|(([^|{}]|\{\{[^}]*\}\}|\[\[[^]]+\]\]|\[[^]]+\])*)")
@@ -566,16 +574,188 @@ clean_arg1_re = re.compile(r"(?s)\{\{(" +
                            r")" +
                            arg_re + args_end_re)
 
-# Regular expression for replacing templates by their arg2.  arg2 is \4
+# Regular expression for replacing templates by their arg2.  arg2 is \6
 clean_arg2_re = re.compile(r"(?s)\{\{(" +
                            "|".join(re.escape(x) for x in clean_arg2_tags) +
                            r")" + arg_re + arg_re + args_end_re)
 
-# Regular expression for replacing templates by their arg3.  arg3 is \6
+# Regular expression for replacing templates by their arg3.  arg3 is \9
 clean_arg3_re = re.compile(r"(?s)\{\{(" +
                            "|".join(re.escape(x) for x in clean_arg3_tags) +
                            r")" + arg_re + arg_re + arg_re + args_end_re)
 
+# Mapping from template name to the ways in which clean_value() may rewrite
+# it, in order of preference.  Each entry is either an int k (replace the
+# template by its k-th positional argument, if it has at least k of them) or
+# a string (replacement from clean_replace_map).  Templates not in this
+# dictionary (or for which no entry applies) are removed.  This gives the
+# same precedence as applying clean_arg3_re, clean_arg2_re, clean_arg1_re
+# and clean_replace_map in that order.
+clean_template_map = collections.defaultdict(list)
+for x in clean_arg3_tags:
+    clean_template_map[x].append(3)
+for x in clean_arg2_tags:
+    clean_template_map[x].append(2)
+for x in clean_arg1_tags:
+    clean_template_map[x].append(1)
+for k, v in clean_replace_map.items():
+    clean_template_map[k].append(v)
+clean_template_map = dict(clean_template_map)
+
+# Opening token kinds that start a frame in clean_value().
+clean_openers = (tokenizer.TEMPLATE_START, tokenizer.LINK_START,
+                 tokenizer.EXT_START, tokenizer.REF_START)
+
+# Matches a named template argument (name=value).
+named_arg_re = re.compile(r"^\s*([-_a-zA-Z0-9]+)\s*=")
+
+# Characters whose presence means clean_value() must tokenize its input.
+clean_special_chars = set("{}[]<'|")
+
+# Tokens kept as text by clean_value().
+clean_text_tokens = set([tokenizer.TEXT, tokenizer.CHAR, tokenizer.NEWLINE,
+                         tokenizer.HEADER, tokenizer.LIST])
+
+# Whitespace sequences, and whitespace before punctuation, in clean_value().
+clean_space_re = re.compile(r"\s+")
+clean_punct_re = re.compile(r" ([.,;:!?)])")
+
+# Whitespace that clean_space_re would change: anything other than single
+# spaces.  Used by normalize_word() to skip the substitution.
+irregular_space_re = re.compile(r"[^\S ]| \s")
+
+
+def clean_template(args):
+    """Returns the replacement text for a template in clean_value().
+    ``args`` is the list of the template name and arguments, already
+    cleaned of any nested markup."""
+    handlers = clean_template_map.get(args[0].strip())
+    if handlers is None:
+        return ""
+    positional = [x for x in args[1:] if not named_arg_re.match(x)]
+    for h in handlers:
+        if isinstance(h, int):
+            if len(positional) >= h:
+                return positional[h - 1]
+        else:
+            return h.replace("\\1", positional[0] if positional else "")
+    return ""
+
+
+def clean_link(args):
+    """Returns the text for an internal link ``[[target|text]]`` in
+    clean_value().  Category, file and image links are removed."""
+    target = args[0].strip().lower()
+    if target.startswith(("category:", "file:", "image:")):
+        return ""
+    if len(args) > 1:
+        return "|".join(args[1:])
+    return args[0]
+
+
+def clean_unclosed(text, frames, out):
+    """Appends the frames in ``frames`` (templates, links, references
+    without a closing token) to the list of text pieces ``out`` as they
+    appeared in ``text``, except that references lose their tags.  Later
+    frames are always nested in the last argument of earlier ones, so they
+    can just be appended in order."""
+    for kind, args, start, end in frames:
+        if kind != tokenizer.REF_START:
+            out.append(text[start:end])
+        for i, pieces in enumerate(args):
+            if i:
+                out.append("|")
+            out.extend(pieces)
+
+
+def clean_value(title, tokens=None):
+    """Cleans a title or value into a normal string.  This should basically
+    remove any Wikimedia formatting from it: HTML tags, templates, links,
+    emphasis, etc.  This will also merge multiple whitespaces into one
+    normal space and will remove any surrounding whitespace.  ``tokens``
+    can be given if the caller has already tokenized ``title``.
+
+    The text is tokenized once (see tokenizer.py), and templates are
+    rewritten by template name (see clean_template_map) in a single
+    left-to-right pass.  A closing token matches the nearest unclosed
+    opening token of its type; any constructs left unclosed are kept as
+    text.  This runs in linear time even on unbalanced markup."""
+    if not clean_special_chars.isdisjoint(title):
+        # Stack of unclosed templates, links and references.  Each frame is
+        # (kind, args, start, end), where args is a list of lists of text
+        # pieces, one for each argument, and start and end are the offsets
+        # of the opening token.
+        frames = []
+        counts = dict.fromkeys(clean_openers, 0)
+        out = []
+        cur = out
+        text_tokens = clean_text_tokens
+        closer_map = tokenizer.closer_map
+        if tokens is None:
+            tokens = tokenizer.tokenize(title)
+        for kind, start, end in tokens:
+            if kind in text_tokens:
+                cur.append(title[start:end])
+            elif kind in counts:
+                cur = []
+                frames.append((kind, [cur], start, end))
+                counts[kind] += 1
+            elif kind == tokenizer.PIPE:
+                if frames and (frames[-1][0] == tokenizer.TEMPLATE_START or
+                               frames[-1][0] == tokenizer.LINK_START):
+                    cur = []
+                    frames[-1][1].append(cur)
+                else:
+                    cur.append("|")
+            elif kind in closer_map:
+                want = closer_map[kind]
+                if not counts[want]:
+                    # No matching opener; keep as text (but drop </ref>)
+                    if kind != tokenizer.REF_END:
+                        cur.append(title[start:end])
+                    continue
+                # Any frames opened after the matching one are unclosed;
+                # they become text in its last argument.
+                j = len(frames) - 1
+                while frames[j][0] != want:
+                    j -= 1
+                if j < len(frames) - 1:
+                    for x in frames[j + 1:]:
+                        counts[x[0]] -= 1
+                    clean_unclosed(title, frames[j + 1:], frames[j][1][-1])
+                    del frames[j + 1:]
+                kind, args = frames.pop()[:2]
+                counts[kind] -= 1
+                args = ["".join(x) for x in args]
+                if kind == tokenizer.TEMPLATE_START:
+                    value = clean_template(args)
+                elif kind == tokenizer.LINK_START:
+                    value = clean_link(args)
+                elif kind == tokenizer.EXT_START:
+                    value = args[0]
+                else:
+                    value = ""
+                if frames:
+                    cur = frames[-1][1][-1]
+                else:
+                    cur = out
+                cur.append(value)
+            elif kind == tokenizer.BR:
+                cur.append(", ")
+            # Other tokens (comments, HTML tags, emphasis) are removed
+        clean_unclosed(title, frames, out)
+        title = "".join(out)
+    if "&" in title:
+        title = html.unescape(title)
+    title = title.replace("\u2019", "'")
+    # Replace whitespace sequences by a single space.
+    title = clean_space_re.sub(" ", title)
+    # Remove whitespace before periods and commas etc
+    title = clean_punct_re.sub(r"\1", title)
+    # Strip surrounding whitespace.
+    return title.strip()
+
+
 # Mapping from German verb form arguments to "canonical" values in
 # word sense tags."""
 de_verb_form_map = {
@@ -693,115 +873,1044 @@ template_allowed_pos_map = {
 }
 
 
+# Mapping from section headers on Thesaurus pages to the relation under which
+# the targets listed in that section are stored.  Headers mapping to None end
+# the current relation without starting a new one.  Other headers also end
+# the current relation.  The keys are normalized when compiled into
+# thesaurus_header_map below, so case and punctuation do not matter here.
+thesaurus_relation_headers = {
+    "Synonyms": "Synonyms",
+    "Antonyms": "Antonyms",
+    "Hyponyms": "Hyponyms",
+    "Troponyms": "Hyponyms",
+    "Hypernyms": "Hypernyms",
+    "Instances": "Instances",
+    "Meronyms": "Meronyms",
+    "Holonyms": "Holonyms",
+    "Coordinate terms": "Coordinate terms",
+    "Related terms": "Related terms",
+    "Derived terms": "Derived terms",
+    "Various": None,
+    "See also": None,
+    "Further reading": None,
+}
+
+def thesaurus_header_key(title):
+    """Normalizes a section header title for looking it up in
+    thesaurus_header_map."""
+    return re.sub(r"[\W_]+", " ", title).strip().lower()
+
+
+# Normalized header title -> relation, compiled from
+# thesaurus_relation_headers.
+thesaurus_header_map = {thesaurus_header_key(k): v
+                        for k, v in thesaurus_relation_headers.items()}
+
+# Relations that may be extracted from Thesaurus pages, in output order.
+THESAURUS_RELATIONS = tuple(collections.OrderedDict.fromkeys(
+    x for x in thesaurus_relation_headers.values() if x))
+
+# Relation -> its index in THESAURUS_RELATIONS (the relation id used in
+# ThesaurusRecord).
+thesaurus_relation_ids = {x: i for i, x in enumerate(THESAURUS_RELATIONS)}
+
+
+def ws_sense_gloss(args):
+    """Returns the gloss of a ``{{ws sense|...}}`` template in a Thesaurus
+    page, given its name and arguments ``args``, or None if it has none.
+    Newer pages give the language code as the first argument
+    (``{{ws sense|en|gloss}}``), older ones only the gloss."""
+    args = [x.strip() for x in args[1:] if not named_arg_re.match(x)]
+    if len(args) >= 2 and args[0] in ("en", "mul"):
+        args = args[1:]
+    return args[0] if args and args[0] else None
+
+
+def ws_target(args):
+    """Returns ``(target, details)`` for a relation target given by a
+    template (normally ``{{ws|target|gloss|q=qualifier}}``) with name and
+    arguments ``args``, or None if it has no target.  ``details`` is a
+    dictionary in the linkage format: ``word``, and when present ``gloss``
+    (the second positional argument) and ``tags`` (from the ``q``/``qq``
+    qualifiers)."""
+    positional = []
+    tags = []
+    for arg in args[1:]:
+        m = named_arg_re.match(arg)
+        if m is None:
+            positional.append(arg.strip())
+            continue
+        if m.group(1) in ("q", "qq", "q2", "qq2"):
+            tags.extend(x.strip() for x in arg[m.end():].split(",")
+                        if x.strip())
+    if not positional or not positional[0]:
+        return None
+    target = positional[0]
+    ret = {"word": target}
+    if len(positional) > 1 and positional[1]:
+        ret["gloss"] = positional[1]
+    if tags:
+        ret["tags"] = tags
+    return target, ret
+
+
+class InternTable(object):
+    """Table of interned strings.  Equal strings passed to intern() are
+    replaced by a single shared object, so that records kept in memory do
+    not hold separate copies of common words, and comparing and hashing
+    them is faster.  Unlike sys.intern(), the table can be cleared, and it
+    counts the strings passed to it (``total``) and how many of them were
+    already in the table (``hits``).  At most ``max_size`` strings are kept;
+    after that, new strings are returned as they are."""
+
+    def __init__(self, max_size=1000000):
+        assert isinstance(max_size, int)
+        self.max_size = max_size
+        self.table = {}
+        self.total = 0
+        self.hits = 0
+
+    def intern(self, s):
+        """Returns the interned string equal to ``s``."""
+        self.total += 1
+        ret = self.table.get(s)
+        if ret is not None:
+            self.hits += 1
+            return ret
+        if len(self.table) < self.max_size:
+            self.table[s] = s
+        return s
+
+    def stats(self):
+        """Returns a dictionary with the number of ``unique`` strings in
+        the table, the ``total`` number of strings interned and the number
+        of ``hits``."""
+        return {"unique": len(self.table), "total": self.total,
+                "hits": self.hits}
+
+    def clear(self):
+        """Removes all strings from the table and resets its counts."""
+        self.table.clear()
+        self.total = 0
+        self.hits = 0
+
+
+# The per-process intern table for words, tags and language codes in
+# extracted data.  Each worker process has its own.
+intern_table = InternTable()
+intern_string = intern_table.intern
+
+
+# Maximum number of non-ASCII strings kept in normalize_cache (see
+# normalize_word()) before it is cleared.
+normalize_cache_size = 100000
+
+# Cache of normalized forms of non-ASCII words.
+normalize_cache = {}
+
+
+def normalize_word(word):
+    """Returns ``word`` in the form used for words and relation targets in
+    extracted data, so that they can be used as keys: in Unicode NFC, with
+    surrounding whitespace removed and other whitespace sequences replaced
+    by a single space.  Pure ASCII words (the vast majority) only need the
+    whitespace handling; the results for other words are cached."""
+    if word.isascii():
+        word = word.strip()
+        if irregular_space_re.search(word):
+            word = clean_space_re.sub(" ", word)
+        return word
+    ret = normalize_cache.get(word)
+    if ret is None:
+        ret = clean_space_re.sub(" ", unicodedata.normalize("NFC", word))
+        ret = ret.strip()
+        if len(normalize_cache) >= normalize_cache_size:
+            normalize_cache.clear()
+        normalize_cache[word] = ret
+    return ret
+
+
+# Maximum number of entries kept in a relation target cache (see
+# relation_target()) before it is cleared.
+line_cache_size = 100000
+
+
+def relation_target(rel_id, source, args, cache):
+    """Returns ``(rel_id, target, gloss, tags)`` for the template with
+    source text ``source`` and name and arguments ``args`` (see
+    ws_target()) in the relation with index ``rel_id`` in
+    THESAURUS_RELATIONS, or None if it has no target.  ``gloss`` is None and
+    ``tags`` a tuple or None if not given.  The same templates (e.g.,
+    ``{{ws|person}}``) occur on many pages, so results are memoized in
+    ``cache``; the returned tuple is shared by all records using it."""
+    key = (rel_id, source)
+    ret = cache.get(key)
+    if ret is None:
+        ret = ws_target(args)
+        if ret is None:
+            ret = ()
+        else:
+            target, details = ret
+            tags = details.get("tags")
+            if tags:
+                tags = tuple(intern_string(x) for x in tags)
+            ret = (rel_id, intern_string(normalize_word(target)),
+                   details.get("gloss"),
+                   tags or None)
+        if len(cache) >= line_cache_size:
+            cache.clear()
+        cache[key] = ret
+    return ret or None
+
+
+class ThesaurusRecord(object):
+    """Compact representation of the relations extracted from a Thesaurus
+    page, for keeping large numbers of them in memory.  ``word`` is the
+    page title.  ``senses`` is a tuple with ``(gloss, targets)`` for each
+    sense group on the page, where ``gloss`` is None if the sense has no
+    gloss and ``targets`` is a tuple of ``(relation_id, target, gloss,
+    tags)`` in page order, as returned by relation_target().  The flat
+    relation lists are not stored; to_dict() derives them from the
+    senses."""
+    __slots__ = ("word", "senses")
+
+    def __init__(self, word, senses):
+        assert isinstance(word, str)
+        assert isinstance(senses, tuple)
+        self.word = word
+        self.senses = senses
+
+    @property
+    def relations(self):
+        """All ``(relation_id, target)`` pairs of the record, in page
+        order."""
+        return tuple((x[0], x[1]) for gloss, targets in self.senses
+                     for x in targets)
+
+    def to_dict(self):
+        """Returns the record as a dictionary in the format returned by
+        parse_thesaurus() (see README.md)."""
+        data = {"word": self.word}
+        for x in THESAURUS_RELATIONS:
+            data[x] = []
+        senses = []
+        for gloss, targets in self.senses:
+            sense = {}
+            if gloss is not None:
+                sense["sense"] = gloss
+            for rel_id, target, target_gloss, tags in targets:
+                rel = THESAURUS_RELATIONS[rel_id]
+                data[rel].append(target)
+                details = {"word": target}
+                if target_gloss:
+                    details["gloss"] = target_gloss
+                if tags:
+                    details["tags"] = list(tags)
+                sense.setdefault(rel, []).append(details)
+            senses.append(sense)
+        data["senses"] = senses
+        return data
+
+    def to_json(self):
+        """Returns the record as a JSON string in the format written for
+        parse_thesaurus() dictionaries."""
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Creates a record from a dictionary returned by
+        parse_thesaurus(), such that to_dict() returns an equal dictionary.
+        Within a sense, targets of different relations are ordered by
+        relation, as the dictionary does not keep their page order."""
+        senses = []
+        for sense in data["senses"]:
+            targets = []
+            for rel, v in sense.items():
+                if rel == "sense":
+                    continue
+                rel_id = thesaurus_relation_ids[rel]
+                for details in v:
+                    tags = details.get("tags")
+                    targets.append((rel_id, details["word"],
+                                    details.get("gloss"),
+                                    tuple(tags) if tags else None))
+            senses.append((sense.get("sense"), tuple(targets)))
+        return cls(data["word"], tuple(senses))
+
+    def __eq__(self, other):
+        return (isinstance(other, ThesaurusRecord) and
+                self.word == other.word and self.senses == other.senses)
+
+    def __repr__(self):
+        return "ThesaurusRecord({!r}, {!r})".format(self.word, self.senses)
+
+
+class ThesaurusParser(object):
+    """Incremental parser for the text of a Thesaurus page.  The text can
+    be passed to feed() in arbitrary chunks (e.g., as they arrive from the
+    XML parser); only complete lines are parsed, and the partial line at
+    the end of a chunk is carried over to the next one, so memory use does
+    not depend on the size of the page.  close() parses the last line and
+    returns the ThesaurusRecord for the page, or None if it has no English
+    section.  Each line is parsed on its own: only the first template on a
+    line is used, and it must end on the same line.  ``line_cache`` is a
+    dictionary used for memoizing parsed relation targets across pages."""
+
+    def __init__(self, word, line_cache):
+        assert isinstance(word, str)
+        assert isinstance(line_cache, dict)
+        self.word = normalize_word(word)
+        self.line_cache = line_cache
+        # Number of characters fed
+        self.length = 0
+        # Pieces of the partial line carried over to the next chunk
+        self.carry = []
+        # Leading whitespace of the page is skipped until this is set
+        self.started = False
+        # The first line of the page (used for detecting redirects)
+        self.first_line = None
+        # Set when a line ends inside an HTML comment
+        self.in_comment = False
+        self.found = False
+        self.english = False
+        self.rel = None
+        # Sense groups, delimited by {{ws sense|...}}, as (gloss, targets)
+        # where targets is a list of the targets in the group
+        self.senses = []
+        self.sense = None
+
+    def feed(self, chunk):
+        """Parses the complete lines in ``chunk`` (preceded by any partial
+        line from earlier chunks)."""
+        self.length += len(chunk)
+        if not self.started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                return
+            self.started = True
+        idx = chunk.rfind("\n")
+        if idx < 0:
+            self.carry.append(chunk)
+            return
+        if self.carry:
+            self.carry.append(chunk[:idx])
+            text = "".join(self.carry)
+        else:
+            text = chunk[:idx]
+        self.carry = [chunk[idx + 1:]]
+        for line in text.split("\n"):
+            self.parse_line(line)
+
+    def close(self):
+        """Parses the last line and returns the ThesaurusRecord for the
+        page, or None if it has no English section."""
+        line = "".join(self.carry)
+        self.carry = []
+        if line:
+            self.parse_line(line)
+        if not self.found:
+            return None
+        return ThesaurusRecord(self.word,
+                               tuple((gloss, tuple(targets))
+                                     for gloss, targets in self.senses))
+
+    def parse_line(self, line):
+        """Parses one line of the page."""
+        if self.first_line is None:
+            self.first_line = line
+        pos = 0
+        if self.in_comment:
+            pos = line.find("-->")
+            if pos < 0:
+                return
+            pos += 3
+            self.in_comment = False
+        elif (not line.startswith("=") and "{{" not in line and
+              "<!--" not in line):
+            return
+        tokens = tokenizer.tokenize(line, pos)
+        if not tokens:
+            return
+        kind, start, end = tokens[-1]
+        if kind == tokenizer.COMMENT and (end - start < 7 or
+                                          not line.endswith("-->")):
+            self.in_comment = True
+        kind = tokens[0][0]
+        if kind == tokenizer.HEADER:
+            level, title = tokenizer.header_title(line, tokens[0])
+            if level == 2:
+                self.english = title == "English"
+                self.found = self.found or self.english
+                self.rel = None
+            else:
+                # Headers not in thesaurus_relation_headers (and those
+                # mapped to None there) stop collecting targets.
+                rel = thesaurus_header_map.get(thesaurus_header_key(title))
+                if rel is not None:
+                    rel = thesaurus_relation_ids[rel]
+                self.rel = rel
+            return
+        if not self.english:
+            return
+        match = tokenizer.pair_tokens(tokens)
+        for i, (kind, start, end) in enumerate(tokens):
+            if kind == tokenizer.TEMPLATE_START and match[i] > i:
+                break
+        else:
+            return
+        args = tokenizer.template_args(line, tokens, match, i)
+        name = args[0].strip()
+        if name == "ws sense":
+            self.sense = []
+            self.senses.append((ws_sense_gloss(args), self.sense))
+            self.rel = None
+        elif self.rel is not None and name not in ("ws beginlist",
+                                                   "ws endlist"):
+            ret = relation_target(self.rel, line[start:tokens[match[i]][2]],
+                                  args, self.line_cache)
+            if ret is not None:
+                if self.sense is None:
+                    self.sense = []
+                    self.senses.append((None, self.sense))
+                self.sense.append(ret)
+
+
+def parse_thesaurus_record(word, text, line_cache):
+    """Parses the text of a Thesaurus page and returns a ThesaurusRecord
+    with the relations in its English section, or None if the page is not a
+    Thesaurus page with an English section.  ``line_cache`` is a dictionary
+    used for memoizing parsed relation targets across pages.  See
+    ThesaurusParser."""
+    if "Thesaurus:" not in word:
+        return None
+    parser = ThesaurusParser(word, line_cache)
+    parser.feed(text)
+    return parser.close()
+
+
+def parse_thesaurus(word, text, line_cache):
+    """Parses the text of a Thesaurus page and returns a dictionary with
+    the relations in its English section (see README.md for the format),
+    or None if the page is not a Thesaurus page with an English section.
+    The arguments are as for parse_thesaurus_record()."""
+    record = parse_thesaurus_record(word, text, line_cache)
+    if record is None:
+        return None
+    return record.to_dict()
+
+
+# Matches the start of the text of a redirect page ("#REDIRECT [[target]]").
+redirect_re = re.compile(r"(?i)\s*#\s*redirect\b")
+
+
+def redirect_target(text):
+    """Returns the target of a redirect page given its text, or None if the
+    page is not a redirect.  Dumps normally mark redirects with a
+    ``<redirect>`` element; this is used when it is missing."""
+    m = redirect_re.match(text)
+    if m is None:
+        return None
+    eol = text.find("\n", m.end())
+    if eol < 0:
+        eol = len(text)
+    tokens = tokenizer.tokenize(text, m.end(), eol)
+    match = tokenizer.pair_tokens(tokens)
+    for i, (kind, start, end) in enumerate(tokens):
+        if kind == tokenizer.LINK_START and match[i] > i:
+            target = tokenizer.template_args(text, tokens, match, i)[0]
+            return target.strip() or None
+    return None
+
+
+def page_sections(text):
+    """Splits page text into sections at its header lines, without
+    tokenizing it.  Returns a list of ``(level, title, start, end)``, where
+    ``start`` and ``end`` are the offsets of the section body (the text
+    after the header line up to the next header line) in ``text``.  Text
+    before the first header is not included.  This scans the lines
+    starting with "=" with str.find() instead of a regular expression, as
+    patterns matching the leading and trailing "=" backtrack in cubic
+    time on long runs of "="."""
+    ret = []
+    prev = None
+    pos = 0
+    while True:
+        if not text.startswith("=", pos):
+            pos = text.find("\n=", pos)
+            if pos < 0:
+                break
+            pos += 1
+        end = text.find("\n", pos)
+        if end < 0:
+            end = len(text)
+        line = text[pos:end]
+        if tokenizer.is_header(line):
+            line = line.rstrip(" \t")
+            title = line.lstrip("=")
+            level = len(line) - len(title)
+            if title:
+                title = title.rstrip("=").strip(" \t")
+            else:
+                # Only "=": the last one closes the header
+                level -= 1
+            if prev is not None:
+                ret.append(prev + (pos - 1,))
+            prev = (level, title, end)
+        pos = end
+    if prev is not None:
+        ret.append(prev + (len(text),))
+    return ret
+
+
+# Mapping from section titles in word entries (in lowercase, see
+# entry_section_key()) to the kind of data in the section and the key under
+# which it is stored in the word's data.  Sections of a kind that is not
+# captured (see WiktionaryTarget.section_kinds) are skipped by offset
+# without tokenizing them, as are all sections not listed here.
+entry_section_map = {
+    "pronunciation": ("pronunciation", "pronunciations"),
+    "translations": ("translations", "translations"),
+    "synonyms": ("linkage", "synonyms"),
+    "antonyms": ("linkage", "antonyms"),
+    "hypernyms": ("linkage", "hypernyms"),
+    "hyponyms": ("linkage", "hyponyms"),
+    "troponyms": ("linkage", "hyponyms"),
+    "holonyms": ("linkage", "holonyms"),
+    "meronyms": ("linkage", "meronyms"),
+    "coordinate terms": ("linkage", "coordinate_terms"),
+    "derived terms": ("linkage", "derived"),
+    "related terms": ("linkage", "related"),
+    "compounds": ("compounds", "compounds"),
+    "conjugation": ("conjugation", "conjugation"),
+    "declension": ("conjugation", "conjugation"),
+    "inflection": ("conjugation", "conjugation"),
+}
+
+# Matches a trailing number in section titles (e.g., "Etymology 2").
+section_number_re = re.compile(r"\s+\d+$")
+
+
+def entry_section_key(title):
+    """Normalizes a section title in a word entry for looking it up in
+    pos_map and entry_section_map."""
+    return section_number_re.sub("", title.lower())
+
+
+def section_items(text, start, end, tokens=None):
+    """Tokenizes the section body ``text[start:end]`` and returns a list with,
+    for each line containing templates or links, a list of ``(kind, args)``
+    for the top-level templates (kind ``tokenizer.TEMPLATE_START``) and
+    links (kind ``tokenizer.LINK_START``) on that line, where ``args`` is
+    as returned by tokenizer.template_args().  A template spanning several
+    lines belongs to the line where it starts.  ``tokens`` can be given if
+    the caller has already tokenized the body."""
+    if tokens is None:
+        tokens = tokenizer.tokenize(text, start, end)
+    match = tokenizer.pair_tokens(tokens)
+    ret = []
+    line = []
+    i = 0
+    n = len(tokens)
+    while i < n:
+        kind = tokens[i][0]
+        if kind == tokenizer.NEWLINE:
+            if line:
+                ret.append(line)
+                line = []
+        elif ((kind == tokenizer.TEMPLATE_START or
+               kind == tokenizer.LINK_START) and match[i] > i):
+            line.append((kind, tokenizer.template_args(text, tokens,
+                                                       match, i)))
+            i = match[i]
+        i += 1
+    if line:
+        ret.append(line)
+    return ret
+
+
+def template_params(args):
+    """Splits the arguments of a template with name and arguments ``args``
+    into a list of positional arguments and a dictionary of named
+    arguments, with surrounding whitespace removed."""
+    positional = []
+    named = {}
+    for arg in args[1:]:
+        m = named_arg_re.match(arg)
+        if m is None:
+            positional.append(arg.strip())
+        else:
+            named[m.group(1)] = arg[m.end():].strip()
+    return positional, named
+
+
+def clean_word(value):
+    """Cleans a word given as a template argument or link target, dropping
+    any inline modifiers (``word<q:qualifier>``).  The result is
+    normalized (see normalize_word()) and interned."""
+    idx = value.find("<")
+    if idx > 0:
+        value = value[:idx]
+    if clean_special_chars.isdisjoint(value):
+        return intern_string(normalize_word(value))
+    return intern_string(normalize_word(clean_value(value)))
+
+
+# Matches gloss lines in a part-of-speech section.  Lines starting with
+# "#:" or "#*" contain examples and quotations.
+gloss_line_re = re.compile(r"(?m)^#+(?![#:*])[ \t]*([^\n]*)")
+
+# Templates giving labels (tags) for a gloss, and label arguments that only
+# join other labels.
+label_templates = set(["lb", "lbl", "label", "context", "cx"])
+label_joiners = set(["_", "and", "or", ""])
+
+# Matches the start of a label template, so that gloss lines without labels
+# need not be tokenized for them.
+label_template_re = re.compile(r"\{\{\s*(" +
+                               "|".join(sorted(label_templates)) +
+                               r")\s*\|")
+
+
+def parse_glosses(text, start, end):
+    """Returns the word senses from the gloss lines of a part-of-speech
+    section body ``text[start:end]``.  Only the gloss lines are tokenized;
+    examples, quotations and other lines are skipped."""
+    senses = []
+    for m in gloss_line_re.finditer(text, start, end):
+        line = m.group(1)
+        tokens = None
+        if label_template_re.search(line):
+            # The gloss and its tags are extracted from the same tokens
+            tokens = tokenizer.tokenize(line)
+        gloss = clean_value(line, tokens)
+        if not gloss:
+            continue
+        sense = {"glosses": [gloss]}
+        if tokens is not None:
+            tags = []
+            for items in section_items(line, 0, len(line), tokens):
+                for kind, args in items:
+                    if (kind == tokenizer.TEMPLATE_START and
+                        args[0].strip() in label_templates):
+                        positional = template_params(args)[0]
+                        tags.extend(intern_string(x)
+                                    for x in positional[1:]
+                                    if x not in label_joiners)
+            if tags:
+                sense["tags"] = tags
+        senses.append(sense)
+    return senses
+
+
+def pronunciation_lang(positional, named):
+    """Returns the language code given to a pronunciation template, removing
+    it from ``positional`` if it was given as the first argument (newer
+    style) instead of as ``lang=`` (older style).  The code is
+    interned."""
+    if "lang" in named:
+        return intern_string(named["lang"])
+    if positional:
+        return intern_string(positional.pop(0))
+    return None
+
+
+def parse_pronunciations(text, start, end):
+    """Returns the pronunciations in a Pronunciation section body
+    ``text[start:end]``, one dictionary for each line giving IPA, enPR,
+    audio or homophones (see README.md for the format)."""
+    ret = []
+    for items in section_items(text, start, end):
+        pron = {}
+        for kind, args in items:
+            if kind != tokenizer.TEMPLATE_START:
+                continue
+            name = args[0].strip()
+            positional, named = template_params(args)
+            if name == "IPA":
+                lang = pronunciation_lang(positional, named)
+                pron.setdefault("ipa", []).extend((lang, x)
+                                                  for x in positional if x)
+            elif name == "audio":
+                lang = pronunciation_lang(positional, named)
+                if positional and positional[0]:
+                    desc = positional[1] if len(positional) > 1 else ""
+                    pron.setdefault("audios", []).append(
+                        (lang, positional[0], desc))
+            elif name == "enPR":
+                pron.setdefault("enpr", []).extend(x for x in positional
+                                                   if x)
+            elif name in ("homophones", "homophone", "hmp"):
+                pronunciation_lang(positional, named)
+                pron.setdefault("homophones", []).extend(
+                    x for x in positional if x)
+            elif name in ("a", "accent"):
+                pron.setdefault("accent", []).extend(
+                    intern_string(x) for x in positional if x)
+        if "ipa" in pron or "audios" in pron or "enpr" in pron or \
+           "homophones" in pron:
+            ret.append(pron)
+    return ret
+
+
+# Templates for a single translation (the language code and the translated
+# word are the first two arguments; any further ones are gender/number).
+translation_templates = set(["t", "t+", "t-", "tt", "tt+", "t-check",
+                             "t+check", "t-simple"])
+
+# Templates that start and end a table of translations for one sense.
+translation_top_templates = set(["trans-top", "trans-top-also",
+                                 "checktrans-top"])
+
+# Mapping from named arguments of translation templates to keys in the
+# extracted translations.
+translation_arg_map = {
+    "alt": "alt",
+    "tr": "roman",
+    "sc": "script",
+}
+
+
+def parse_translations(text, start, end):
+    """Returns the translations in a Translations section body
+    ``text[start:end]`` (see README.md for the format)."""
+    ret = []
+    sense = None
+    for items in section_items(text, start, end):
+        for kind, args in items:
+            if kind != tokenizer.TEMPLATE_START:
+                continue
+            name = args[0].strip()
+            if name in translation_top_templates:
+                positional = template_params(args)[0]
+                sense = None
+                if positional and positional[0]:
+                    sense = clean_value(positional[0]) or None
+            elif name == "trans-bottom":
+                sense = None
+            elif name in translation_templates:
+                positional, named = template_params(args)
+                if len(positional) < 2 or not positional[0]:
+                    continue
+                word = clean_word(positional[1])
+                if not word:
+                    continue
+                tr = {"lang": intern_string(positional[0]), "word": word}
+                if sense:
+                    tr["sense"] = sense
+                for k, v in translation_arg_map.items():
+                    if named.get(k):
+                        tr[v] = named[k]
+                tags = [intern_string(x) for x in positional[2:] if x]
+                if tags:
+                    tr["tags"] = tags
+                ret.append(tr)
+    return ret
+
+
+# Templates linking to a single word (the second argument) in linkage
+# sections.
+linkage_link_templates = set(["l", "link", "l-self", "ll"])
+
+# Matches names of column templates listing linked words after the language
+# code (e.g., {{der3|en|word1|word2}}).
+linkage_column_re = re.compile(r"^(col|der|rel|hyp|syn|ant)[2-5]?(-u)?$")
+
+# Templates giving the sense or qualifiers of the words on a linkage line.
+linkage_sense_templates = set(["sense", "s"])
+linkage_qualifier_templates = set(["q", "qual", "qualifier", "i", "qf"])
+
+
+def parse_linkages(text, start, end):
+    """Returns the linked words in a linkage (or compounds) section body
+    ``text[start:end]``, each as a dictionary with ``word`` and optionally
+    ``sense`` and ``tags`` given on the same line (see README.md)."""
+    ret = []
+    for items in section_items(text, start, end):
+        sense = None
+        tags = []
+        words = []
+        for kind, args in items:
+            if kind == tokenizer.LINK_START:
+                target = args[0].strip()
+                if not target.lower().startswith(("category:", "file:",
+                                                  "image:")):
+                    words.append(target)
+                continue
+            name = args[0].strip()
+            positional = template_params(args)[0]
+            if name in linkage_link_templates:
+                if len(positional) >= 2:
+                    words.append(positional[1])
+            elif linkage_column_re.match(name):
+                words.extend(positional[1:])
+            elif name in linkage_sense_templates:
+                if positional:
+                    sense = clean_value(positional[0]) or None
+            elif name in linkage_qualifier_templates:
+                tags.extend(intern_string(x) for x in positional if x)
+        for word in words:
+            word = clean_word(word)
+            if not word:
+                continue
+            item = {"word": word}
+            if sense:
+                item["sense"] = sense
+            if tags:
+                item["tags"] = list(tags)
+            ret.append(item)
+    return ret
+
+
+# Matches names of declension/conjugation templates (e.g., fi-decl-valo,
+# fi-conj-sanoa, de-conj).
+conjugation_template_re = re.compile(r"-(conj|decl|infl)\b")
+
+
+def parse_conjugation(text, start, end):
+    """Returns the declension/conjugation templates in a section body
+    ``text[start:end]``, each as a dictionary of its arguments (positional
+    arguments under "1", "2", ...) with its name under "template_name"."""
+    ret = []
+    for items in section_items(text, start, end):
+        for kind, args in items:
+            if kind != tokenizer.TEMPLATE_START:
+                continue
+            name = args[0].strip()
+            if not conjugation_template_re.search(name):
+                continue
+            positional, named = template_params(args)
+            data = {"template_name": name}
+            for i, x in enumerate(positional):
+                data[str(i + 1)] = x
+            data.update(named)
+            ret.append(data)
+    return ret
+
+
+# Parsing function for each kind of section in entry_section_map.
+section_parsers = {
+    "pronunciation": parse_pronunciations,
+    "translations": parse_translations,
+    "linkage": parse_linkages,
+    "compounds": parse_linkages,
+    "conjugation": parse_conjugation,
+}
+
+
+def parse_entry(word, text, ctx):
+    """Parses the text of a regular dictionary page and returns a list of
+    dictionaries, one for each part-of-speech section in the languages in
+    ``ctx.capture_languages`` (see README.md for the format).  The page is
+    split into sections by scanning for header lines only.  The sections
+    of the kinds in ``ctx.section_kinds`` (and the gloss lines of
+    part-of-speech sections if it contains "glosses") are tokenized and
+    parsed; all other sections, and all sections of other languages, are
+    skipped by offset, so with nothing captured the cost is close to that
+    of page_sections().
+    Pronunciations apply to all parts-of-speech that follow them in the
+    same language or etymology; other sections apply to the last
+    part-of-speech before them."""
+    word = normalize_word(word)
+    languages = ctx.capture_languages
+    kinds = ctx.section_kinds
+    ret = []
+    lang = None
+    entry = None
+    prons = None
+    for level, title, start, end in page_sections(text):
+        if level <= 2:
+            ctx.language_counts[title] += 1
+            lang = intern_string(title) if title in languages else None
+            entry = None
+            prons = None
+            continue
+        if lang is None:
+            continue
+        key = entry_section_key(title)
+        pos = pos_map.get(key)
+        if pos is not None:
+            ctx.pos_counts[key] += 1
+            entry = {"word": word, "lang": lang, "pos": pos}
+            if "glosses" in kinds:
+                senses = parse_glosses(text, start, end)
+                if senses:
+                    entry["senses"] = senses
+            if prons:
+                entry["pronunciations"] = list(prons)
+            ret.append(entry)
+            continue
+        ctx.section_counts[key] += 1
+        if key == "etymology":
+            entry = None
+            prons = None
+            continue
+        v = entry_section_map.get(key)
+        if v is None or v[0] not in kinds:
+            continue
+        kind, field = v
+        if kind == "pronunciation":
+            prons = parse_pronunciations(text, start, end) or None
+        elif entry is not None:
+            items = section_parsers[kind](text, start, end)
+            if items:
+                entry.setdefault(field, []).extend(items)
+    return ret
+
+
+class PageTimeoutError(Exception):
+    """Raised when parsing a page takes more than its time budget."""
+    pass
+
+
+def page_timeout_handler(signum, frame):
+    """Signal handler for the per-page time budget."""
+    raise PageTimeoutError()
+
+
+@contextlib.contextmanager
+def page_time_budget(seconds):
+    """Raises PageTimeoutError inside the ``with`` block if it uses more than
+    ``seconds`` of CPU time.  This uses a SIGPROF interval timer, so it can
+    interrupt long regular expression matches, but only works in the main
+    thread on systems with ``signal.setitimer``; elsewhere (and if
+    ``seconds`` is None) the block runs without a budget."""
+    if (not seconds or not hasattr(signal, "setitimer") or
+        threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    if signal.getsignal(signal.SIGPROF) is not page_timeout_handler:
+        signal.signal(signal.SIGPROF, page_timeout_handler)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def entry_page(word, ctx):
+    """Returns True if the page titled ``word`` is in the main namespace,
+    i.e., may contain regular dictionary entries."""
+    idx = word.find(":")
+    return idx < 0 or word[:idx] not in ctx.namespace_names
+
+
 def parse_text(word, text, ctx):
     """Parses the text of a Wiktionary page and returns a list of dictionaries,
     one for each word/part-of-speech defined on the page for the languages
     specified by ``capture_languages``.  ``word`` is page title, and ``text``
     is page text in Wikimedia format.  Other arguments indicate what is
-    captured."""
+    captured.  The returned dictionaries are also passed to ``ctx.word_cb``."""
+    ret = extract_text(word, text, ctx)
+    if ret is not None:
+        for data in ret:
+            ctx.word_cb(data)
+    return ret
+
+
+def extract_text(word, text, ctx):
+    """Parses the text of a Wiktionary page like parse_text(), but does not
+    pass the dictionaries to ``ctx.word_cb``.  This is the part of
+    processing a page that runs within the page's time budget, so that
+    the time taken by the consumer of the records is not charged to the
+    page (and a timeout cannot interrupt the consumer)."""
     assert isinstance(word, str)
     assert isinstance(text, str)
     assert isinstance(ctx, WiktionaryTarget)
     if "Thesaurus:" not in word:
-        return
-    # print(word)
+        if not entry_page(word, ctx):
+            return None
+        return parse_entry(word, text, ctx)
+    record = parse_thesaurus_record(word, text, ctx.line_cache)
+    if record is None:
+        return None
+    return [record.to_dict()]
 
-    wordss=[s.strip() for s in text.splitlines() if s]
-    try:
-        if re.sub(r'[^\w]', ' ', wordss[1]).strip()!="English":
-            return
-    except:
-        print("error")
-    # print(wordss)
-    key = None
-    data = {}
-    data["word"]=word
-    syno=[]
-    anto=[]
-    hypo=[]
-    hyper=[]
-    inst=[]
-    mero=[]
-    holy=[]
-    for aword in wordss:
-        # aword=re.sub(r'[^\w]', ' ', aword).strip()
-        if "{{ws beginlist}}" == aword or "{{ws endlist}}" == aword:
-            continue
-        if "Synonyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="a"
-        elif "Antonyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="b"
-        elif "Hyponyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="c"
-        elif "Hypernyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="d"
-        elif "Instances" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="e"
-        elif "Meronyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="f"
-        elif "Holonyms" == re.sub(r'[^\w]', ' ', aword).strip():
-            key="g"
-        elif "=====Various====="==aword or "===See also==="==aword or "===Further reading==="==aword:
-            key="Dont care now"
-        if key=="a" and "Synonyms" != re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                syno.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
 
-        if key=="b" and "Antonyms" != re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                anto.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
-        if key=="c" and "Hyponyms"!= re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                hypo.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
-        if key=="d" and "Hypernyms" != re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                hyper.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
-        if key=="e" and "Instances" != re.sub(r'[^\w]', ' ', aword).strip():
-            try:
-                parsed = wtp.parse(aword)
-                inst.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
-        if key=="f" and "Meronyms" != re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                mero.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
-        if key=="g" and "Holonyms" != re.sub(r'[^\w]', ' ', aword).strip():
-            parsed = wtp.parse(aword)
-            try:
-                holy.append(parsed.templates[0].arguments[0].value)
-            except:
-                continue
+def parse_text_many(pages, ctx=None, compact=False):
+    """Parses a batch of pages and returns a list of the dictionaries
+    extracted from them, in page order.  ``pages`` is an iterable of
+    ``(title, text)`` pairs.  Unlike parse_text(), this does not write
+    anything or call ``word_cb``; the caller is responsible for the
+    returned records.  This is intended as the unit of work for worker
+    processes: per-call setup is done once per batch, and parsed relation
+    lines are memoized across the batch (and across batches in ``ctx``, if
+    given).  Regular entries are only extracted if ``ctx`` is given, for
+    its languages and capture flags.  If ``compact`` is True, Thesaurus
+    pages are returned as ThesaurusRecord objects instead of dictionaries,
+    for callers that keep many of them in memory.  If ``ctx`` has a
+    per-page time budget, pages exceeding it are quarantined by ``ctx``
+    and produce no records."""
+    assert ctx is None or isinstance(ctx, WiktionaryTarget)
+    if ctx is not None:
+        line_cache = ctx.line_cache
+    else:
+        line_cache = {}
+    ret = []
+    append = ret.append
 
-    data["Synonyms"]=syno
-    data["Antonyms"] = anto
-    data["Hyponyms"] = hypo
-    data["Hypernyms"] = hyper
-    data["Instances"] = inst
-    data["Meronyms"] = mero
-    data["Holonyms"] = holy
+    def parse_page(title, text):
+        if "Thesaurus:" in title:
+            if compact:
+                data = parse_thesaurus_record(title, text, line_cache)
+            else:
+                data = parse_thesaurus(title, text, line_cache)
+            if data is not None:
+                append(data)
+        elif ctx is not None and entry_page(title, ctx):
+            ret.extend(parse_entry(title, text, ctx))
+
+    if ctx is None or not ctx.page_timeout:
+        for title, text in pages:
+            parse_page(title, text)
+        return ret
+    for title, text in pages:
+        try:
+            with page_time_budget(ctx.page_timeout):
+                parse_page(title, text)
+        except PageTimeoutError:
+            ctx.quarantine_page(title, len(text))
+    return ret
 
-    with open("Output.txt", "a+") as text_file:
-        text_file.write(json.dumps(data))
-        text_file.write('\n')
 
+class PageText(object):
+    """Text of a page as received from the XML parser, as a list of chunks.
+    The chunks are joined (and surrounding whitespace removed) only when
+    the text is first converted to a string, so that pages skipped based on
+    their title or namespace never pay for copying their text.  (The XML
+    parser has already decoded any entities in the chunks.)"""
+    __slots__ = ("chunks", "text")
 
+    def __init__(self, chunks):
+        assert isinstance(chunks, list)
+        self.chunks = chunks
+        self.text = None
 
+    def __str__(self):
+        if self.text is None:
+            text = "".join(self.chunks)
+            if text[:1].isspace() or text[-1:].isspace():
+                text = text.strip()
+            self.text = text
+            self.chunks = None
+        return self.text
 
+    def prefix(self, n):
+        """Returns the first ``n`` characters of the text (fewer if the
+        text is shorter), without joining the rest of it."""
+        if self.text is not None:
+            return self.text[:n]
+        parts = []
+        size = 0
+        for chunk in self.chunks:
+            if not parts:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= n:
+                break
+        return "".join(parts)[:n]
 
 
 class WiktionaryTarget(object):
@@ -810,7 +1919,9 @@ class WiktionaryTarget(object):
     def __init__(self, word_cb, capture_cb,
                  capture_languages, capture_translations,
                  capture_pronunciation, capture_linkages,
-                 capture_compounds, capture_redirects):
+                 capture_compounds, capture_redirects,
+                 capture_glosses=False, capture_conjugations=False,
+                 page_timeout=None, quarantine_path=None):
         assert callable(word_cb)
         assert capture_cb is None or callable(capture_cb)
         assert isinstance(capture_languages, (list, tuple, set))
@@ -819,6 +1930,10 @@ class WiktionaryTarget(object):
         assert capture_translations in (True, False)
         assert capture_linkages in (True, False)
         assert capture_translations in (True, False)
+        assert capture_glosses in (True, False)
+        assert capture_conjugations in (True, False)
+        assert page_timeout is None or isinstance(page_timeout, (int, float))
+        assert quarantine_path is None or isinstance(quarantine_path, str)
         self.word_cb = word_cb
         self.capture_cb = capture_cb
         self.capture_languages = capture_languages
@@ -827,8 +1942,26 @@ class WiktionaryTarget(object):
         self.capture_linkages = capture_linkages
         self.capture_compounds = capture_compounds
         self.capture_redirects = capture_redirects
+        self.capture_glosses = capture_glosses
+        self.capture_conjugations = capture_conjugations
+        # Kinds of entry sections to parse (see entry_section_map), and
+        # "glosses" for the gloss lines of part-of-speech sections
+        self.section_kinds = set()
+        if capture_glosses:
+            self.section_kinds.add("glosses")
+        if capture_conjugations:
+            self.section_kinds.add("conjugation")
+        if capture_pronunciation:
+            self.section_kinds.add("pronunciation")
+        if capture_translations:
+            self.section_kinds.add("translations")
+        if capture_linkages:
+            self.section_kinds.add("linkage")
+        if capture_compounds:
+            self.section_kinds.add("compounds")
         self.tag = None
         self.namespaces = {}
+        self.namespace_names = set()
         self.stack = []
         self.text = None
         self.title = None
@@ -839,6 +1972,18 @@ class WiktionaryTarget(object):
         self.language_counts = collections.defaultdict(int)
         self.pos_counts = collections.defaultdict(int)
         self.section_counts = collections.defaultdict(int)
+        self.line_cache = {}
+        self.page_timeout = page_timeout
+        self.quarantine_path = quarantine_path
+        self.quarantine_f = None
+        self.quarantine_count = 0
+        # Incremental parser for the text of the current page, if it is
+        # being parsed as it arrives (see start()), and what is left of the
+        # page's time budget
+        self.stream = None
+        self.stream_budget = None
+        # Called at the start of every page (see RecordBatcher.tick())
+        self.tick = None
 
 
     def start(self, tag, attrs):
@@ -861,6 +2006,17 @@ class WiktionaryTarget(object):
             self.redirect = None
             self.model = None
             self.format = None
+            self.stream = None
+            if self.tick is not None:
+                self.tick()
+        elif (tag == "text" and self.title is not None and
+              "Thesaurus:" in self.title and self.capture_cb is None and
+              not self.redirect and self.model in (None, "wikitext")):
+            # Thesaurus pages are parsed as their text arrives, without
+            # collecting the whole text (the title precedes the text in
+            # the dump).  The capture callback needs the whole text.
+            self.stream = ThesaurusParser(self.title, self.line_cache)
+            self.stream_budget = self.page_timeout
 
     def end(self, tag):
         """This function is called whenever an XML end tag is encountered."""
@@ -871,6 +2027,11 @@ class WiktionaryTarget(object):
         ptag = self.stack.pop()
         assert tag == ptag
         attrs = self.attrs
+        if tag == "text":
+            # Page text is joined only if the page is used (see PageText)
+            self.text = PageText(self.data) if self.stream is None else None
+            self.data = []
+            return
         data = "".join(self.data).strip()
         self.data = []
         if tag in ignore_tags:
@@ -884,13 +2045,13 @@ class WiktionaryTarget(object):
             self.pageid = data
         elif tag == "title":
             self.title = data
-        elif tag == "text":
-            self.text = data
         elif tag == "redirect":
             self.redirect = attrs.get("title")
         elif tag == "namespace":
             key = attrs.get("key")
             self.namespaces[key] = data
+            if data:
+                self.namespace_names.add(data)
         elif tag == "model":
             self.model = data
             if data not in ("wikitext", "Scribunto", "css", "javascript",
@@ -904,44 +2065,221 @@ class WiktionaryTarget(object):
         elif tag == "page":
             pageid = self.pageid
             title = self.title
+            page = self.text
+            if page is None:
+                page = PageText([])
             redirect = self.redirect
             if self.model in ("css", "sanitized-css", "javascript",
                               "Scribunto"):
                 return
+            if self.stream is not None:
+                self.end_stream(title)
+                return
+            if (self.capture_cb is not None and
+                not self.capture_cb(title, str(page))):
+                return
+            if not redirect and redirect_re.match(page.prefix(100)):
+                redirect = redirect_target(str(page))
             if redirect:
                 if self.capture_redirects:
-                    data = {"redirect": redirect, "word": title}
+                    data = {"redirect": normalize_word(redirect),
+                            "word": normalize_word(title)}
                     self.word_cb(data)
-            else:
-                parse_text(title, self.text, self)
+            elif "Thesaurus:" in title or entry_page(title, self):
+                text = str(page)
+                try:
+                    with page_time_budget(self.page_timeout):
+                        ret = extract_text(title, text, self)
+                except PageTimeoutError:
+                    self.quarantine_page(title, len(text))
+                    return
+                # Records are delivered outside the page's time budget
+                if ret is not None:
+                    for data in ret:
+                        self.word_cb(data)
 
         else:
             print("UNSUPPORTED", tag, len(data), attrs)
 
     def data(self, data):
         """This function is called for data within an XML tag."""
+        if self.stream is not None and self.stack[-1] == "text":
+            if self.page_timeout and self.stream_budget <= 0:
+                self.stream.length += len(data)
+            else:
+                self.stream_call(self.stream.feed, data)
+            return
         self.data.append(data)
 
+    def stream_call(self, fn, *args):
+        """Calls ``fn(*args)`` for the incremental parser of the current
+        page within what is left of the page's time budget, and returns its
+        value.  If the budget runs out, returns None and leaves
+        ``stream_budget`` at zero or below."""
+        if not self.page_timeout:
+            return fn(*args)
+        start = time.process_time()
+        try:
+            with page_time_budget(self.stream_budget):
+                return fn(*args)
+        except PageTimeoutError:
+            self.stream_budget = 0
+            return None
+        finally:
+            self.stream_budget -= time.process_time() - start
+
+    def end_stream(self, title):
+        """Finishes parsing a page parsed as its text arrived."""
+        stream = self.stream
+        self.stream = None
+        record = None
+        if not self.page_timeout or self.stream_budget > 0:
+            record = self.stream_call(stream.close)
+        if self.page_timeout and self.stream_budget <= 0:
+            self.quarantine_page(title, stream.length)
+            return
+        if redirect_re.match(stream.first_line or ""):
+            redirect = redirect_target(stream.first_line)
+            if redirect:
+                if self.capture_redirects:
+                    self.word_cb({"redirect": normalize_word(redirect),
+                                  "word": normalize_word(title)})
+                return
+        self.save_thesaurus(record)
+
+    def save_thesaurus(self, record):
+        """Passes the dictionary for the ThesaurusRecord ``record`` of a page
+        (if not None) to ``word_cb`` like any other extracted record, and
+        returns it in a list as parse_text() does."""
+        if record is None:
+            return None
+        data = record.to_dict()
+        self.word_cb(data)
+        return [data]
+
+    def quarantine_page(self, title, length):
+        """Records a page whose parsing was aborted because it exceeded the
+        per-page time budget.  The page title and text length are written
+        as a JSON line to ``quarantine_path`` (if set)."""
+        self.quarantine_count += 1
+        print("PAGE TIMEOUT", title, length)
+        if self.quarantine_path is None:
+            return
+        if self.quarantine_f is None:
+            self.quarantine_f = open(self.quarantine_path, "a")
+        self.quarantine_f.write(json.dumps({"title": title,
+                                            "length": length,
+                                            "timeout": self.page_timeout}))
+        self.quarantine_f.write("\n")
+        self.quarantine_f.flush()
+
     def close(self):
         """This function is called when parsing is complete."""
+        if self.quarantine_f is not None:
+            self.quarantine_f.close()
+            self.quarantine_f = None
         return None
 
 
-def parse_wiktionary(path, word_cb, capture_cb=None,
+def open_dump(path):
+    """Opens the dump file ``path`` for reading in binary mode.  Files
+    whose names end in ".bz2" are decompressed while reading."""
+    if path.endswith(".bz2"):
+        return bz2.BZ2File(path, "r")
+    return open(path, "rb", buffering=(4 * 1024 * 1024))
+
+
+class RecordBatcher(object):
+    """Collects records passed to it one at a time (it is used as the
+    ``word_cb`` of a WiktionaryTarget) and passes them on to
+    ``batch_cb(records)`` in lists of ``batch_size`` records.  If
+    ``batch_time`` is given, a batch is also passed on when a record is
+    added or tick() is called (once per page by WiktionaryTarget) at least
+    that many seconds after the first record of the batch, so a slowly
+    filling batch does not hold records indefinitely.  The last, partial
+    batch is passed on by flush()."""
+    __slots__ = ("batch_cb", "batch_size", "batch_time", "batch",
+                 "started", "batch_count")
+
+    def __init__(self, batch_cb, batch_size, batch_time=None):
+        assert callable(batch_cb)
+        assert isinstance(batch_size, int) and batch_size > 0
+        assert batch_time is None or isinstance(batch_time, (int, float))
+        self.batch_cb = batch_cb
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        self.batch = []
+        self.started = None
+        self.batch_count = 0
+
+    def __call__(self, data):
+        batch = self.batch
+        batch.append(data)
+        if len(batch) >= self.batch_size:
+            self.flush()
+        elif self.batch_time is not None:
+            if len(batch) == 1:
+                self.started = time.monotonic()
+            elif time.monotonic() - self.started >= self.batch_time:
+                self.flush()
+
+    def tick(self):
+        """Passes on the collected records if ``batch_time`` has passed
+        since the first of them was added."""
+        if (self.batch and self.batch_time is not None and
+                time.monotonic() - self.started >= self.batch_time):
+            self.flush()
+
+    def flush(self):
+        """Passes any collected records to ``batch_cb``.  If ``batch_cb``
+        raises an exception, the records are kept for the next flush."""
+        batch = self.batch
+        if not batch:
+            return
+        self.batch_cb(batch)
+        self.batch = []
+        self.batch_count += 1
+
+
+def parse_wiktionary(path, word_cb=None, capture_cb=None,
                      languages=["English", "Translingual"],
                      translations=False,
                      pronunciations=False,
                      linkages=False,
                      compounds=False,
-                     redirects=False):
+                     redirects=False,
+                     glosses=False,
+                     conjugations=False,
+                     page_timeout=None,
+                     quarantine_path=None,
+                     batch_cb=None,
+                     batch_size=1000,
+                     batch_time=None,
+                     sink=None):
     """Parses Wiktionary from the dump file ``path`` (which should point
     to a "enwiktionary-<date>-pages-articles.xml.bz2" file.  This
-    calls ``capture_cb(title)`` for each raw page (if provided), and
+    calls ``capture_cb(title, text)`` for each raw page (if provided), and
     if it returns True, and calls ``word_cb(data)`` for all words
-    defined for languages in ``languages``.  The other keyword
-    arguments control what data is to be extracted."""
+    defined for languages in ``languages``.  Alternatively, ``batch_cb``
+    can be given instead of ``word_cb``; it is called with lists of up to
+    ``batch_size`` records (see RecordBatcher for ``batch_time``), which
+    amortizes the per-call cost for consumers that serialize, store or
+    send records in bulk.  ``word_cb`` is the special case of batches of
+    one record, and is called directly.  Records can also be written to
+    ``sink`` (see wiktextract.sinks), which is batched according to its
+    own ``batch_size`` and ``batch_time`` and flushed at the end; the
+    caller opens and closes the sink (with ``page_timeout``, the sink is
+    told to do its work in the foreground, see Sink.foreground()).  The
+    other keyword arguments control what data is to be extracted
+    (``glosses`` and ``conjugations`` included); sections for data that
+    is not extracted are skipped without parsing.  If ``page_timeout``
+    is given, parsing of any page using more than that many seconds of CPU
+    time is aborted and the page is written to ``quarantine_path`` (if
+    given) instead; the number of such pages is in
+    ``ctx.quarantine_count`` of the returned context."""
     assert isinstance(path, str)
-    assert callable(word_cb)
+    assert [word_cb, batch_cb, sink].count(None) == 2
+    assert word_cb is None or callable(word_cb)
     assert capture_cb is None or callable(capture_cb)
     assert isinstance(languages, (list, tuple, set))
     for x in languages:
@@ -952,23 +2290,124 @@ def parse_wiktionary(path, word_cb, capture_cb=None,
     assert linkages in (True, False)
     assert compounds in (True, False)
     assert redirects in (True, False)
+    assert glosses in (True, False)
+    assert conjugations in (True, False)
+    assert page_timeout is None or isinstance(page_timeout, (int, float))
+    assert quarantine_path is None or isinstance(quarantine_path, str)
+
+    # Collect the records into batches if requested.
+    batcher = None
+    if sink is not None:
+        batch_cb = sink.write_batch
+        batch_size = sink.batch_size
+        batch_time = sink.batch_time
+        if page_timeout:
+            # The page budget counts CPU time of all threads
+            sink.foreground()
+    if batch_cb is not None:
+        batcher = RecordBatcher(batch_cb, batch_size, batch_time)
+        word_cb = batcher
 
     # Open the input file.
-    if path.endswith(".bz2"):
-        wikt_f = bz2.BZ2File(path, "r", buffering=(4 * 1024 * 1024))
-    else:
-        wikt_f = open(path, "rb", buffering=(4 * 1024 * 1024))
+    wikt_f = open_dump(path)
 
+    # Create parsing context.
+    ctx = WiktionaryTarget(word_cb, capture_cb,
+                           languages, translations,
+                           pronunciations, linkages, compounds,
+                           redirects, capture_glosses=glosses,
+                           capture_conjugations=conjugations,
+                           page_timeout=page_timeout,
+                           quarantine_path=quarantine_path)
+    if batcher is not None and batch_time is not None:
+        ctx.tick = batcher.tick
     try:
-        # Create parsing context.
-        ctx = WiktionaryTarget(word_cb, capture_cb,
-                               languages, translations,
-                               pronunciations, linkages, compounds,
-                               redirects)
         # Parse the XML file.
         parser = etree.XMLParser(target=ctx)
         etree.parse(wikt_f, parser)
+        if batcher is not None:
+            batcher.flush()
+        if sink is not None:
+            sink.flush()
     finally:
         wikt_f.close()
+        ctx.close()
+
+    return ctx
+
 
-    return ctx
\ No newline at end of file
+def iter_wiktionary(path, capture_cb=None,
+                    languages=["English", "Translingual"],
+                    translations=False,
+                    pronunciations=False,
+                    linkages=False,
+                    compounds=False,
+                    redirects=False,
+                    glosses=False,
+                    conjugations=False,
+                    page_timeout=None,
+                    quarantine_path=None,
+                    chunk_size=(1024 * 1024)):
+    """Parses Wiktionary from the dump file ``path`` like
+    parse_wiktionary(), but returns a generator that yields the extracted
+    records instead of passing them to a callback.  The dump is read and
+    fed to the XML parser ``chunk_size`` bytes at a time, only when the
+    records parsed from the previous chunk have all been consumed, so at
+    most one chunk's worth of records is buffered and nothing beyond the
+    records taken is parsed.  When the generator is closed (e.g., when the
+    caller breaks out of a loop over it) or garbage collected, the file is
+    closed and parsing stops.  Parsing runs in the caller's thread, so
+    ``page_timeout`` works as in parse_wiktionary()."""
+    assert isinstance(path, str)
+    assert capture_cb is None or callable(capture_cb)
+    assert isinstance(languages, (list, tuple, set))
+    for x in languages:
+        assert isinstance(x, str)
+        assert x in wiktlangs.languages
+    assert translations in (True, False)
+    assert pronunciations in (True, False)
+    assert linkages in (True, False)
+    assert compounds in (True, False)
+    assert redirects in (True, False)
+    assert glosses in (True, False)
+    assert conjugations in (True, False)
+    assert page_timeout is None or isinstance(page_timeout, (int, float))
+    assert quarantine_path is None or isinstance(quarantine_path, str)
+    assert isinstance(chunk_size, int) and chunk_size > 0
+
+    records = collections.deque()
+    popleft = records.popleft
+    wikt_f = open_dump(path)
+    ctx = WiktionaryTarget(records.append, capture_cb,
+                           languages, translations,
+                           pronunciations, linkages, compounds,
+                           redirects, capture_glosses=glosses,
+                           capture_conjugations=conjugations,
+                           page_timeout=page_timeout,
+                           quarantine_path=quarantine_path)
+    parser = None
+    try:
+        parser = etree.XMLParser(target=ctx)
+        while True:
+            chunk = wikt_f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            while records:
+                yield popleft()
+        feed_parser = parser
+        parser = None
+        feed_parser.close()
+        while records:
+            yield popleft()
+    finally:
+        wikt_f.close()
+        if parser is not None:
+            # Stopped in the middle of the document; release the parser's
+            # partial document.  It complains that the document is
+            # incomplete.
+            try:
+                parser.close()
+            except etree.XMLSyntaxError:
+                pass
+        ctx.close()